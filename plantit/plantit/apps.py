@@ -4,3 +4,6 @@ from django.apps.config import AppConfig
 class PlantITConfig(AppConfig):
     name = 'plantit'
 
+    def ready(self):
+        # connect cache invalidation and usage rollup receivers
+        import plantit.signals
@@ -0,0 +1,321 @@
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+from plantit.redis import RedisClient, get_many
+
+logger = logging.getLogger(__name__)
+
+# writes to the workflow cache should go through `put_workflow(s)` and `remove_workflow(s)`, to keep these consistent
+INDEX_ALL = 'workflows_index/all'
+INDEX_PUBLIC = 'workflows_index/public'
+INDEX_FEATURED = 'workflows_index/featured'
+INDEX_OWNERS = 'workflows_index/owners'
+INDEX_BUILT = 'workflows_index/built'
+INDEX_VERSION = 'workflows_index/version'
+INDEX_UPDATED = 'workflows_index/updated'  # sorted set of workflow keys, scored by when they were last cached
+PUBLIC_CATALOG = 'workflows_catalog/public'
+
+
+def workflow_key(owner: str, name: str, branch: str) -> str:
+    return f"workflows/{owner}/{name}/{branch}"
+
+
+def owner_index(owner: str) -> str:
+    return f"workflows_index/owner/{owner}"
+
+
+def project_index(guid: str) -> str:
+    return f"workflows_index/project/{guid}"
+
+
+def get_indexes(key: str, workflow: dict) -> List[str]:
+    """
+    Determines which indexes the given workflow belongs to.
+
+    Args:
+        key: The workflow's cache key
+        workflow: The workflow
+
+    Returns:
+        The index keys
+    """
+
+    owner = key.split('/')[1]
+    config = workflow.get('config', None) or {}
+    indexes = [INDEX_ALL, owner_index(owner)]
+    if config.get('public', False): indexes.append(INDEX_PUBLIC)
+    if workflow.get('featured', False): indexes.append(INDEX_FEATURED)
+    indexes.extend([project_index(guid) for guid in (config.get('projects', None) or [])])
+    return indexes
+
+
+def get_cached_workflow(key: str) -> Optional[dict]:
+    cached = RedisClient.get().get(key)
+    return None if cached is None else json.loads(cached)
+
+
+def put_workflow(key: str, workflow: dict):
+    """
+    Caches the given workflow and (re)indexes it.
+
+    Args:
+        key: The workflow's cache key
+        workflow: The workflow
+    """
+
+    put_workflows({key: workflow})
+
+
+def put_workflows(workflows: Dict[str, dict]):
+    """
+    Caches the given workflows and (re)indexes them, in two round trips however many there are.
+
+    Args:
+        workflows: The workflows, keyed by cache key
+    """
+
+    if len(workflows) == 0: return
+    keys = list(workflows.keys())
+    olds = get_many(keys)
+    now = time.time()
+
+    pipeline = RedisClient.pipeline()
+    for key, old in zip(keys, olds):
+        workflow = workflows[key]
+        old_indexes = get_indexes(key, old) if old is not None else []
+        new_indexes = get_indexes(key, workflow)
+        for index in set(old_indexes) - set(new_indexes): pipeline.srem(index, key)
+        pipeline.set(key, json.dumps(workflow))
+        for index in new_indexes: pipeline.sadd(index, key)
+        pipeline.sadd(INDEX_OWNERS, key.split('/')[1])
+    pipeline.zadd(INDEX_UPDATED, {key: now for key in keys})
+    pipeline.incr(INDEX_VERSION)
+    pipeline.execute()
+
+
+def remove_workflow(key: str):
+    """
+    Removes the given workflow from the cache and from every index.
+
+    Args:
+        key: The workflow's cache key
+    """
+
+    remove_workflows([key])
+
+
+def remove_workflows(keys: List[str]):
+    """
+    Removes the given workflows from the cache and from every index, in a few round trips however many there are.
+
+    Args:
+        keys: The workflows' cache keys
+    """
+
+    if len(keys) == 0: return
+    olds = get_many(keys)
+    owners = set([key.split('/')[1] for key in keys])
+
+    pipeline = RedisClient.pipeline()
+    for key, old in zip(keys, olds):
+        if old is not None:
+            for index in get_indexes(key, old): pipeline.srem(index, key)
+        else:
+            # nothing to tell us which indexes it was in, so check the unconditional ones
+            for index in [INDEX_ALL, INDEX_PUBLIC, INDEX_FEATURED, owner_index(key.split('/')[1])]: pipeline.srem(index, key)
+    pipeline.delete(*keys)
+    pipeline.zrem(INDEX_UPDATED, *keys)
+    pipeline.incr(INDEX_VERSION)
+    pipeline.execute()
+
+    # owners no longer count as developers once their last workflow is gone
+    owners = list(owners)
+    pipeline = RedisClient.pipeline(transaction=False)
+    for owner in owners: pipeline.scard(owner_index(owner))
+    gone = [owner for owner, count in zip(owners, pipeline.execute()) if count == 0]
+    if len(gone) > 0: RedisClient.get().srem(INDEX_OWNERS, *gone)
+
+
+def rebuild_index():
+    """
+    Rebuilds every index (and invalidates the public catalog) from the workflow cache.
+    When each workflow was last cached is kept (except for workflows no longer cached), so they don't all turn stale.
+    """
+
+    redis = RedisClient.get()
+    keys = [key.decode('utf-8') for key in redis.scan_iter(match='workflows/*')]
+    stale = [key for key in redis.scan_iter(match='workflows_index/*') if key.decode('utf-8') not in [INDEX_VERSION, INDEX_UPDATED]]
+    cached_keys = set(keys)
+    gone = [key for key in redis.zrange(INDEX_UPDATED, 0, -1) if key.decode('utf-8') not in cached_keys]
+
+    pipeline = redis.pipeline()
+    if len(stale) > 0: pipeline.delete(*stale)
+    if len(gone) > 0: pipeline.zrem(INDEX_UPDATED, *gone)
+    for key, cached in zip(keys, redis.mget(keys) if len(keys) > 0 else []):
+        if cached is None: continue
+        for index in get_indexes(key, json.loads(cached)): pipeline.sadd(index, key)
+        pipeline.sadd(INDEX_OWNERS, key.split('/')[1])
+    pipeline.set(INDEX_BUILT, 1)
+    pipeline.incr(INDEX_VERSION)
+    pipeline.execute()
+    logger.info(f"Rebuilt workflow index ({len(keys)} workflow(s))")
+
+
+def ensure_index():
+    if not RedisClient.get().exists(INDEX_BUILT): rebuild_index()
+
+
+def get_workflow_age(key: str) -> Optional[float]:
+    """
+    Determines how long ago the given workflow was cached.
+
+    Args:
+        key: The workflow's cache key
+
+    Returns:
+        The age in seconds, or None if unknown (e.g., cached before the index was rebuilt)
+    """
+
+    updated = RedisClient.get().zscore(INDEX_UPDATED, key)
+    return None if updated is None else time.time() - updated
+
+
+def list_indexed_workflows(index: str) -> List[dict]:
+    """
+    Retrieves the workflows in the given index.
+
+    Args:
+        index: The index key
+
+    Returns:
+        The workflows
+    """
+
+    ensure_index()
+    redis = RedisClient.get()
+    keys = sorted(redis.smembers(index))
+    if len(keys) == 0: return []
+    return [json.loads(cached) for cached in redis.mget(keys) if cached is not None]
+
+
+def list_public_catalog() -> List[dict]:
+    """
+    Retrieves the public workflow catalog, rebuilding it from the public index if any workflow changed since it was computed.
+
+    Returns:
+        The public workflows
+    """
+
+    redis = RedisClient.get()
+    built, version, catalog = redis.pipeline().exists(INDEX_BUILT).get(INDEX_VERSION).get(PUBLIC_CATALOG).execute()
+    version = int(version) if version is not None else 0
+
+    if built and catalog is not None:
+        catalog = json.loads(catalog)
+        if catalog['version'] == version: return catalog['workflows']
+
+    # read the version before the workflows, so a concurrent write leaves the catalog stale rather than mislabeled
+    ensure_index()
+    version = int(redis.get(INDEX_VERSION) or 0)
+    workflows = list_indexed_workflows(INDEX_PUBLIC)
+    redis.set(PUBLIC_CATALOG, json.dumps({'version': version, 'workflows': workflows}))
+    return workflows
+
+
+def count_workflows() -> int:
+    ensure_index()
+    return RedisClient.get().scard(INDEX_ALL)
+
+
+def count_developers() -> int:
+    ensure_index()
+    return RedisClient.get().scard(INDEX_OWNERS)
+
+
+def list_owner_keys(owner: str, name: str = None) -> List[str]:
+    """
+    Lists the cache keys of the given owner's workflows (optionally only those in the given repository).
+
+    Args:
+        owner: The GitHub user or organization name
+        name: The repository name
+
+    Returns:
+        The workflow cache keys
+    """
+
+    ensure_index()
+    keys = [key.decode('utf-8') for key in RedisClient.get().smembers(owner_index(owner))]
+    return keys if name is None else [key for key in keys if key.startswith(f"workflows/{owner}/{name}/")]
+
+
+# users' last submission configs, indexed per repository so they can be invalidated without scanning the keyspace
+def config_key(username: str, owner: str, name: str, branch: str) -> str:
+    return f"workflow_configs/{username}/{owner}/{name}/{branch}"
+
+
+def config_index(owner: str, name: str) -> str:
+    return f"workflow_configs_index/{owner}/{name}"
+
+
+def get_config(username: str, owner: str, name: str, branch: str) -> Optional[dict]:
+    cached = RedisClient.get().get(config_key(username, owner, name, branch))
+    return None if cached is None else json.loads(cached)
+
+
+def put_config(username: str, owner: str, name: str, branch: str, config: dict):
+    """
+    Caches the given user's last submission config for a workflow and indexes it under the workflow's repository.
+
+    Args:
+        username: The user's username
+        owner: The repository owner
+        name: The repository name
+        branch: The branch
+        config: The submission config
+    """
+
+    key = config_key(username, owner, name, branch)
+    pipeline = RedisClient.pipeline()
+    pipeline.set(key, json.dumps(config))
+    pipeline.sadd(config_index(owner, name), key)
+    pipeline.execute()
+
+
+def list_config_keys(owner: str, name: str, branch: str = None) -> List[str]:
+    """
+    Lists the cache keys of every user's last submission config for the given repository (optionally only one of its branches).
+
+    Args:
+        owner: The repository owner
+        name: The repository name
+        branch: The branch
+
+    Returns:
+        The config cache keys
+    """
+
+    keys = [key.decode('utf-8') for key in RedisClient.get().smembers(config_index(owner, name))]
+    return keys if branch is None else [key for key in keys if key.endswith(f"/{owner}/{name}/{branch}")]
+
+
+def remove_configs(keys: List[str]) -> int:
+    """
+    Removes the given submission configs from the cache and from their repositories' indexes.
+
+    Args:
+        keys: The config cache keys
+
+    Returns:
+        The number of configs removed
+    """
+
+    if len(keys) == 0: return 0
+    pipeline = RedisClient.pipeline()
+    pipeline.delete(*keys)
+    for key in keys:
+        _, _, owner, name, _ = key.split('/', 4)
+        pipeline.srem(config_index(owner, name), key)
+    return pipeline.execute()[0]
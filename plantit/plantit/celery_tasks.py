@@ -1,23 +1,28 @@
 import json
 import os
+import time
 import traceback
 from pathlib import Path
 from os import environ
 from os.path import join
 from datetime import datetime
+from typing import List
 
 from asgiref.sync import async_to_sync
 from celery import group
 from celery.schedules import crontab
 from celery.utils.log import get_task_logger
 from django.contrib.auth.models import User
-from django.core.cache import cache
 from django.utils import timezone
 from pycyapi.clients import TerrainClient
 
 import plantit.healthchecks
+import plantit.locks as locks
 import plantit.mapbox
 import plantit.queries as q
+import plantit.ratelimit as ratelimit
+import plantit.sessions as sessions
+import plantit.userstats as userstats
 import plantit.utils.agents
 import plantit.migration as mig
 from plantit.ssh import SSH
@@ -811,29 +816,18 @@ def tidy_up(guid: str):
 # Miscellaneous Tasks
 #
 # These should only run one at a time (i.e., should not overlap).
-# To prevent overlap we use the Django cache as a lock mechanism,
-# as described here:
-# https://docs.celeryproject.org/en/2.4/tutorials/task-cookbook.html#cookbook-task-serial
-
-LOCK_EXPIRE = 60 * 5  # Lock expires in 5 minutes
-
-
-def __acquire_lock(name):
-    return cache.add(name, True, LOCK_EXPIRE)
-
-
-def __release_lock(name):
-    return cache.delete(name)
+# To prevent overlap we take a distributed lock (see `plantit.locks`),
+# scoped per user (etc) where runs for different users may overlap.
 
 
 @app.task()
 def find_stranded():
     task_name = find_stranded.name
-    if not __acquire_lock(task_name):
-        logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
-        return
+    with locks.lock(task_name) as acquired:
+        if not acquired:
+            logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
+            return
 
-    try:
         # check if any tasks haven't been updated in a while
         running = Task.objects.filter(status=TaskStatus.RUNNING)
         for task in running:
@@ -844,155 +838,193 @@ def find_stranded():
                     logger.warning(f"Checking stranded task: {task.guid}")
                     (test_results.s(task.guid) | test_push.s() | unshare_data.s()).apply_async(
                         soft_time_limit=int(settings.TASKS_STEP_TIME_LIMIT_SECONDS))
-    finally:
-        __release_lock(task_name)
 
 
 @app.task()
 def refresh_all_users_stats():
     task_name = refresh_all_users_stats.name
-    if not __acquire_lock(task_name):
-        logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
-        return
+    with locks.lock(task_name) as acquired:
+        if not acquired:
+            logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
+            return
 
-    try:
-        # TODO: move caching to query layer
-        redis = RedisClient.get()
+        # only users whose tasks changed since the last refresh
+        usernames = userstats.take_dirty()
+        if len(usernames) == 0:
+            logger.info(f"No users' tasks changed, not refreshing statistics")
+            return
 
-        for user in User.objects.all():
-            logger.info(f"Computing statistics for {user.username}")
+        group([refresh_user_stats.s(username) for username in usernames])()
+        logger.info(f"Scheduled statistics refresh for {len(usernames)} user(s)")
 
+        logger.info(f"Computing aggregate statistics")
+        q.get_aggregate_timeseries(True)
+
+
+@app.task()
+def refresh_user_stats(username: str):
+    task_name = f"{refresh_user_stats.name}/{username}"
+    with locks.lock(task_name) as acquired:
+        if not acquired:
+            # the refresh in progress may have read the user's tasks before they last changed
+            logger.warning(f"Task '{task_name}' is already running, marking {username} for the next refresh")
+            userstats.mark_dirty(username)
+            return
+
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            logger.warning(f"User {username} not found, removing their contribution to statistics totals")
+            userstats.apply_contribution(username, None)
+            return
+
+        logger.info(f"Aggregating statistics for {user.username}")
+
+        try:
             # overall statistics (no need to save result, just trigger reevaluation)
             async_to_sync(q.get_user_statistics)(user, True)
 
             # timeseries (no need to save result, just trigger reevaluation)
             q.get_user_timeseries(user, invalidate=True)
 
-        logger.info(f"Computing aggregate statistics")
-        redis.set("stats_counts", json.dumps(q.get_total_counts(True)))
-        redis.set("total_timeseries", json.dumps(q.get_aggregate_timeseries(True)))
-    finally:
-        __release_lock(task_name)
+            # the user's share of aggregate counts
+            userstats.apply_contribution(username, userstats.count_contribution(user))
+        except:
+            userstats.mark_dirty(username)
+            raise
 
 
 @app.task()
-def refresh_user_stats(username: str):
-    task_name = refresh_user_stats.name
-    if not __acquire_lock(task_name):
-        logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
-        return
+def refresh_user_workflows(owner: str):
+    task_name = f"{refresh_user_workflows.name}/{owner}"
+    with locks.lock(task_name) as acquired:
+        if not acquired:
+            logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
+            return
 
-    try:
-        user = User.objects.get(username=username)
-    except:
-        logger.warning(f"User {username} not found: {traceback.format_exc()}")
-        __release_lock(task_name)
-        return
+        try:
+            with ratelimit.background(): async_to_sync(refresh_user_workflow_cache)(owner)
+        except ratelimit.RateLimited as e:
+            logger.warning(f"Deferring workflow cache refresh for GitHub user {owner} by {e.retry_after}s")
+            refresh_user_workflows.s(owner).apply_async(countdown=e.retry_after)
 
-    try:
-        logger.info(f"Aggregating statistics for {user.username}")
 
-        # overall statistics (no need to save result, just trigger reevaluation)
-        async_to_sync(q.get_user_statistics)(user, True)
-
-        # timeseries (no need to save result, just trigger reevaluation)
-        q.get_user_timeseries(user, invalidate=True)
-    finally:
-        __release_lock(task_name)
+@app.task()
+def refresh_org_workflows(org_name: str, usernames: List[str]):
+    with ratelimit.background(): deferred = async_to_sync(q.refresh_orgs_workflow_cache)({org_name: usernames})
+    for org, (retry_after, members) in deferred.items(): refresh_org_workflows.s(org, members).apply_async(countdown=retry_after)
 
 
 @app.task()
-def refresh_user_workflows(owner: str):
-    task_name = refresh_user_workflows.name
-    if not __acquire_lock(task_name):
-        logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
-        return
+def refresh_workflow(owner: str, name: str, branch: str = None, org: bool = False, sender: str = None):
+    # prefer the token of the user who triggered the event, then the repository owner's
+    token = q.get_github_token(sender, owner)
 
     try:
-        async_to_sync(refresh_user_workflow_cache)(owner)
-    finally:
-        __release_lock(task_name)
+        with ratelimit.background():
+            if branch is None: async_to_sync(q.refresh_workflow_repo_cache)(owner, name, token, org)
+            else: async_to_sync(q.refresh_workflow_branch_cache)(owner, name, branch, token, org)
+    except ratelimit.RateLimited as e:
+        logger.warning(f"Deferring refresh of workflow {owner}/{name}" + (f"/{branch}" if branch else '') + f" by {e.retry_after}s")
+        refresh_workflow.s(owner, name, branch, org, sender).apply_async(countdown=e.retry_after)
+    except:
+        logger.error(f"Failed to refresh workflow {owner}/{name}" + (f"/{branch}" if branch else '') + f": {traceback.format_exc()}")
+
+
+@app.task()
+def remove_workflow(owner: str, name: str, branch: str = None):
+    q.remove_workflow_cache(owner, name, branch)
 
 
 @app.task()
 def refresh_all_workflows():
     task_name = refresh_all_workflows.name
-    if not __acquire_lock(task_name):
-        logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
-        return
+    with locks.lock(task_name) as acquired:
+        if not acquired:
+            logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
+            return
 
-    try:
-        async_to_sync(refresh_online_users_workflow_cache)()
-        async_to_sync(refresh_online_user_orgs_workflow_cache)()
-    finally:
-        __release_lock(task_name)
+        with ratelimit.background():
+            deferred_users = async_to_sync(refresh_online_users_workflow_cache)()
+            deferred_orgs = async_to_sync(refresh_online_user_orgs_workflow_cache)()
+
+        # pick up where we left off once each token's rate limit budget resets
+        for owner, retry_after in deferred_users.items(): refresh_user_workflows.s(owner).apply_async(countdown=retry_after)
+        for org, (retry_after, members) in deferred_orgs.items(): refresh_org_workflows.s(org, members).apply_async(countdown=retry_after)
 
 
 @app.task()
 def refresh_user_institutions():
     task_name = refresh_user_institutions.name
-    if not __acquire_lock(task_name):
-        logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
-        return
+    with locks.lock(task_name) as acquired:
+        if not acquired:
+            logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
+            return
+
+        q.get_institutions(True)
 
-    try:
-        # TODO: move caching to query layer
-        redis = RedisClient.get()
-        institutions = q.get_institutions(True)
-        for name, institution in institutions.items(): redis.set(f"institutions/{name}", json.dumps(institution))
-    finally:
-        __release_lock(task_name)
+
+def get_cyverse_token_refresh_horizon() -> float:
+    # refresh tokens expiring within two scheduling intervals, so each is caught at least once before it expires
+    return time.time() + 2 * int(settings.CYVERSE_TOKEN_REFRESH_MINUTES) * 60
 
 
 @app.task()
 def refresh_cyverse_tokens(username: str):
-    task_name = refresh_cyverse_tokens.name
-    if not __acquire_lock(task_name):
-        logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
-        return
+    # one refresh per user at a time, but refreshes for different users may run concurrently
+    task_name = f"{refresh_cyverse_tokens.name}/{username}"
+    with locks.lock(task_name) as acquired:
+        if not acquired:
+            logger.warning(f"CyVerse tokens for {username} are already being refreshed, aborting")
+            return
 
-    try:
-        user = User.objects.get(username=username)
-    except:
-        logger.warning(f"User {username} not found: {traceback.format_exc()}")
-        __release_lock(task_name)
-        return
+        # another refresh may have finished between scheduling and now
+        expiry = sessions.get_expiry(username)
+        if expiry is not None and expiry > get_cyverse_token_refresh_horizon():
+            logger.info(f"CyVerse tokens for {username} already refreshed, skipping")
+            return
+
+        try:
+            user = User.objects.get(username=username)
+        except:
+            logger.warning(f"User {username} not found: {traceback.format_exc()}")
+            return
 
-    try:
         refresh_user_cyverse_tokens(user)
-    finally:
-        __release_lock(task_name)
 
 
 @app.task()
 def refresh_all_user_cyverse_tokens():
     task_name = refresh_all_user_cyverse_tokens.name
-    if not __acquire_lock(task_name):
-        logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
-        return
+    with locks.lock(task_name) as acquired:
+        if not acquired:
+            logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
+            return
 
-    try:
-        tasks = Task.objects.filter(status=TaskStatus.RUNNING)
-        users = [task.user for task in list(tasks)]
+        # only users whose tokens expire soon and who have running tasks (which need the tokens to push results)
+        expiring = sessions.list_expiring(get_cyverse_token_refresh_horizon())
+        usernames = list(Task.objects
+                         .filter(status=TaskStatus.RUNNING, user__username__in=expiring)
+                         .order_by()
+                         .values_list('user__username', flat=True)
+                         .distinct())
 
-        if len(users) == 0:
-            logger.info(f"No users with running tasks, not refreshing CyVerse tokens")
+        if len(usernames) == 0:
+            logger.info(f"No users with running tasks have CyVerse tokens expiring soon, not refreshing")
             return
 
-        group([refresh_cyverse_tokens.s(user.username) for user in users])()
-        logger.info(f"Refreshed CyVerse tokens for {len(users)} user(s)")
-    finally:
-        __release_lock(task_name)
+        group([refresh_cyverse_tokens.s(username) for username in usernames])()
+        logger.info(f"Scheduled CyVerse token refresh for {len(usernames)} user(s)")
 
 
 @app.task()
 def agents_healthchecks():
     task_name = agents_healthchecks.name
-    if not __acquire_lock(task_name):
-        logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
-        return
+    with locks.lock(task_name) as acquired:
+        if not acquired:
+            logger.warning(f"Task '{task_name}' is already running, aborting (maybe consider a longer scheduling interval?)")
+            return
 
-    try:
         for agent in Agent.objects.all():
             healthy, output = is_healthy(agent)
             plantit.healthchecks.is_healthy = healthy
@@ -1008,8 +1040,6 @@ def agents_healthchecks():
                 'output': output
             }
             redis.lpush(f"healthchecks/{agent.name}", json.dumps(check))
-    finally:
-        __release_lock(task_name)
 
 
 # DIRT migration
@@ -1327,9 +1357,10 @@ def setup_periodic_tasks(sender, **kwargs):
     hourly = crontab(day_of_week="*", hour="*", minute=0)
 
     sender.add_periodic_task(daily, refresh_user_institutions.s(), name='refresh user institutions')
-    sender.add_periodic_task(hourly, refresh_all_users_stats.s(), name='refresh user statistics')
+    sender.add_periodic_task(int(settings.USERS_STATS_REFRESH_MINUTES) * 60, refresh_all_users_stats.s(), name='refresh user statistics')
     sender.add_periodic_task(hourly, agents_healthchecks.s(), name='check agent connections')
-    sender.add_periodic_task(hourly, refresh_all_workflows.s(), name='refresh workflows cache')
+    sender.add_periodic_task(int(settings.WORKFLOWS_REFRESH_MINUTES) * 60, refresh_all_workflows.s(), name='refresh workflows cache')
+    sender.add_periodic_task(int(settings.CYVERSE_TOKEN_REFRESH_MINUTES) * 60, refresh_all_user_cyverse_tokens.s(), name='refresh expiring CyVerse tokens')
 
     if settings.FIND_STRANDED_TASKS:
         sender.add_periodic_task(hourly, find_stranded, name='check for stranded tasks')
@@ -1,42 +1,42 @@
 import json
 import logging
 
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import WebsocketConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
 
 
-class UserEventConsumer(WebsocketConsumer):
+class UserEventConsumer(AsyncWebsocketConsumer):
     logger = logging.getLogger(__name__)
 
-    def connect(self):
+    async def connect(self):
         self.username = self.scope['url_route']['kwargs']['username']
         self.logger.info(f"Socket connected for user {self.username}")
-        async_to_sync(self.channel_layer.group_add)(f"{self.username}", self.channel_name)
-        self.accept()
+        await self.channel_layer.group_add(f"{self.username}", self.channel_name)
+        await self.accept()
 
-    def disconnect(self, code):
+    async def disconnect(self, code):
         self.logger.info(f"Socket disconnected for user {self.username}")
-        async_to_sync(self.channel_layer.group_discard)(f"{self.username}", self.channel_name)
+        await self.channel_layer.group_discard(f"{self.username}", self.channel_name)
 
-    def push_notification(self, event):
+    async def push_notification(self, event):
         notification = event['notification']
         self.logger.info(f"Received notification for user {self.username}: {notification}")
-        self.send(text_data=json.dumps({'notification': notification,}))
+        await self.send(text_data=json.dumps({'notification': notification,}))
 
-    def task_event(self, event):
+    async def task_event(self, event):
         task = event['task']
         self.logger.info(f"Sending user {self.username} task {task['name']} event (status {task['status']}) to client")
-        self.send(text_data=json.dumps({'task': task}))
+        await self.send(text_data=json.dumps({'task': task}))
 
-    def migration_event(self, event):
+    async def migration_event(self, event):
         migration = event['migration']
         data = {'migration': migration}
         file = event.get('file', None)
         msg = f"DIRT migration status for user {self.username}: {migration})"
 
         if file is not None:
-            msg += (f"(file {file.name})" if file is not None else "")
+            # files are pushed as dicts (see `plantit.migration.push_migration_event`)
+            msg += f"(file {file['name']})"
             data['file'] = file
 
         self.logger.info(msg)
-        self.send(text_data=json.dumps(data))
+        await self.send(text_data=json.dumps(data))
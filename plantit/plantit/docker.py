@@ -1,20 +1,30 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+import httpx
 import requests
 
+from django.conf import settings
 from requests import RequestException, ReadTimeout, Timeout, HTTPError
 from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
 
+from plantit.redis import RedisClient
 
-@retry(
-    wait=wait_exponential(multiplier=1, min=4, max=10),
-    stop=stop_after_attempt(3),
-    retry=(retry_if_exception_type(ConnectionError) | retry_if_exception_type(
-        RequestException) | retry_if_exception_type(ReadTimeout) | retry_if_exception_type(
-        Timeout) | retry_if_exception_type(HTTPError)))
-def image_exists(name, owner=None, tag=None):
+logger = logging.getLogger(__name__)
+
+# (owner, name, tag) -> in-flight lookup
+__image_lookups: Dict[Tuple[str, str, Optional[str]], asyncio.Task] = dict()
+
+
+def get_image_url(name, owner=None, tag=None):
     url = f"https://hub.docker.com/v2/repositories/{owner if owner is not None else 'library'}/{name}/"
     if tag is not None:
         url += f"tags/{tag}/"
-    response = requests.get(url)
+    return url
+
+
+def parse_image_response(response, name, owner=None, tag=None):
     try:
         content = response.json()
         if 'user' not in content and 'name' not in content:
@@ -26,6 +36,125 @@ def image_exists(name, owner=None, tag=None):
         return False
 
 
+def get_image_cache_key(name, owner=None, tag=None) -> str:
+    return f"docker_images/{owner if owner is not None else 'library'}/{name}/{tag if tag is not None else ''}"
+
+
+def get_image_cache_ttl(exists: bool) -> int:
+    # missing images are cached for less time, since they may well be pushed soon
+    return (int(settings.DOCKER_IMAGE_CACHE_MINUTES) if exists else int(settings.DOCKER_IMAGE_MISSING_CACHE_MINUTES)) * 60
+
+
+def is_cacheable(status_code: int, exists: bool) -> bool:
+    # only a definite 404 means the image is missing (rate limiting or server errors say nothing either way)
+    return exists or status_code == 404
+
+
+def get_cached_image(name, owner=None, tag=None) -> Optional[bool]:
+    cached = RedisClient.get().get(get_image_cache_key(name, owner, tag))
+    return None if cached is None else cached == b'1'
+
+
+def cache_image(name, owner=None, tag=None, exists=True):
+    RedisClient.get().set(get_image_cache_key(name, owner, tag), int(exists), ex=get_image_cache_ttl(exists))
+
+
+async def get_cached_image_async(name, owner=None, tag=None) -> Optional[bool]:
+    cached = await RedisClient.get_async().get(get_image_cache_key(name, owner, tag))
+    return None if cached is None else cached == b'1'
+
+
+async def cache_image_async(name, owner=None, tag=None, exists=True):
+    await RedisClient.get_async().set(get_image_cache_key(name, owner, tag), int(exists), ex=get_image_cache_ttl(exists))
+
+
+@retry(
+    wait=wait_exponential(multiplier=1, min=4, max=10),
+    stop=stop_after_attempt(3),
+    retry=(retry_if_exception_type(ConnectionError) | retry_if_exception_type(
+        RequestException) | retry_if_exception_type(ReadTimeout) | retry_if_exception_type(
+        Timeout) | retry_if_exception_type(HTTPError)))
+def image_exists(name, owner=None, tag=None):
+    cached = get_cached_image(name, owner, tag)
+    if cached is not None: return cached
+
+    response = requests.get(get_image_url(name, owner, tag))
+    exists = parse_image_response(response, name, owner, tag)
+    if is_cacheable(response.status_code, exists): cache_image(name, owner, tag, exists)
+    return exists
+
+
+@retry(
+    reraise=True,
+    wait=wait_exponential(multiplier=1, min=4, max=10),
+    stop=stop_after_attempt(3),
+    retry=retry_if_exception_type(httpx.TransportError))
+async def __lookup_image(name, owner=None, tag=None, client: httpx.AsyncClient = None):
+    if client is None:
+        async with httpx.AsyncClient(timeout=int(settings.HTTP_TIMEOUT)) as client:
+            response = await client.get(get_image_url(name, owner, tag))
+    else:
+        response = await client.get(get_image_url(name, owner, tag))
+
+    exists = parse_image_response(response, name, owner, tag)
+    logger.debug(f"Image {owner if owner is not None else 'library'}/{name}{':' + tag if tag else ''} {'found' if exists else 'not found'} on Docker Hub ({response.status_code})")
+    if is_cacheable(response.status_code, exists): await cache_image_async(name, owner, tag, exists)
+    return exists
+
+
+async def image_exists_async(name, owner=None, tag=None, client: httpx.AsyncClient = None):
+    """
+    Checks whether the given image exists on Docker Hub without blocking the event loop. Results are cached
+    in Redis (so shared by every process), and concurrent lookups of the same image share a single request.
+    Missing images are only cached if Docker Hub says so definitively (with a 404).
+
+    Args:
+        name: The image name
+        owner: The image owner (defaults to `library`)
+        tag: The image tag
+        client: The HTTP client to send requests with (optional)
+
+    Returns:
+        True if the image exists, otherwise False
+    """
+
+    cached = await get_cached_image_async(name, owner, tag)
+    if cached is not None: return cached
+
+    key = (owner if owner is not None else 'library', name, tag)
+    lookup = __image_lookups.get(key, None)
+
+    # lookups can only be shared within the same event loop
+    if lookup is None or lookup.get_loop() is not asyncio.get_running_loop():
+        lookup = asyncio.ensure_future(__lookup_image(name, owner, tag, client))
+        __image_lookups[key] = lookup
+        lookup.add_done_callback(lambda _: __image_lookups.pop(key, None) if __image_lookups.get(key, None) is lookup else None)
+
+    return await asyncio.shield(lookup)
+
+
+async def resolve_images(images: Iterable[str], client: httpx.AsyncClient = None) -> Dict[str, bool]:
+    """
+    Checks which of the given images exist on Docker Hub, concurrently and at most once per distinct image.
+    Only images hosted on Docker Hub (i.e., containing `docker`) are checked.
+
+    Args:
+        images: The image references (as they appear in a `plantit.yaml` file)
+        client: The HTTP client to send requests with (optional)
+
+    Returns:
+        A dictionary mapping each image reference to whether it exists
+    """
+
+    async def resolve(image):
+        owner, name, tag = parse_image_components(image)
+        return await image_exists_async(name, owner, tag, client)
+
+    images = list(set([image for image in images if isinstance(image, str) and 'docker' in image]))
+    results = await asyncio.gather(*[resolve(image) for image in images])
+    return dict(zip(images, results))
+
+
 def parse_image_components(value):
     container_split = value.split('#', 1)[0].strip().split('/')  # get rid of comments first
     container_name = container_split[-1]
@@ -37,4 +166,4 @@ def parse_image_components(value):
     else:
         container_tag = None
 
-    return container_owner, container_name, container_tag
\ No newline at end of file
+    return container_owner, container_name, container_tag
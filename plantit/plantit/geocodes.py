@@ -0,0 +1,57 @@
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+
+import plantit.mapbox as mapbox
+from plantit.redis import RedisClient
+
+logger = logging.getLogger(__name__)
+
+GEOCODES_KEY = 'institution_geocodes'
+
+
+def to_entry(name: str, result: dict) -> dict:
+    # Mapbox echoes the query's (lowercase) terms, which only match the name if it was parsed as we expect
+    matched = ' '.join(result['query']) == name
+    feature = result['features'][0] if matched and len(result['features']) > 0 else None
+    return {'matched': matched, 'feature': feature, 'updated': time.time()}
+
+
+def is_expired(entry: dict) -> bool:
+    if entry['feature'] is not None: return False
+    return time.time() - entry['updated'] > int(settings.MAPBOX_NEGATIVE_CACHE_DAYS) * 24 * 60 * 60
+
+
+def get_cached(names: List[str]) -> Dict[str, dict]:
+    if len(names) == 0: return dict()
+    entries = RedisClient.get().hmget(GEOCODES_KEY, names)
+    cached = {name: json.loads(entry) for name, entry in zip(names, entries) if entry is not None}
+    return {name: entry for name, entry in cached.items() if not is_expired(entry)}
+
+
+def geocode(names: List[str], token: str) -> Dict[str, Optional[dict]]:
+    """
+    Geocodes the given institutions, asking Mapbox (concurrently) only about those not already cached.
+
+    Args:
+        names: The (lowercase) institution names
+        token: The Mapbox authentication token
+
+    Returns:
+        Entries with whether Mapbox matched each institution's name and its top feature (if any), keyed by name
+        (omitting institutions whose lookup failed)
+    """
+
+    entries = get_cached(names)
+    missing = [name for name in names if name not in entries]
+    if len(missing) == 0: return entries
+
+    logger.info(f"Geocoding {len(missing)} institution(s) ({len(entries)} cached)")
+    results = async_to_sync(mapbox.get_institutions)(missing, token)
+    looked_up = {name: to_entry(name, result) for name, result in results.items()}
+    if len(looked_up) > 0: RedisClient.get().hset(GEOCODES_KEY, mapping={name: json.dumps(entry) for name, entry in looked_up.items()})
+    return {**entries, **looked_up}
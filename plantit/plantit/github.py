@@ -1,14 +1,22 @@
 import asyncio
+import hashlib
+import json
 import logging
-from typing import List
+from typing import List, Optional, Tuple
 
 import httpx
 import requests
 import traceback
 import yaml
+from django.conf import settings
 from requests import RequestException, ReadTimeout, Timeout, HTTPError
 from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
 
+from plantit import docker as docker
+from plantit import metrics as metrics
+from plantit import ratelimit as ratelimit
+from plantit import singleflight as singleflight
+from plantit.redis import RedisClient
 from plantit.validation import validate_workflow_configuration
 
 logger = logging.getLogger(__name__)
@@ -22,8 +30,7 @@ logger = logging.getLogger(__name__)
         RequestException) | retry_if_exception_type(ReadTimeout) | retry_if_exception_type(
         Timeout) | retry_if_exception_type(HTTPError)))
 async def get_profile(owner: str, token: str, timeout: int = 15) -> dict:
-    headers = {'Authorization': f"Bearer {token}"}
-    async with httpx.AsyncClient(headers=headers, timeout=timeout) as client:
+    async with get_client(token, timeout) as client:
         response = await client.get(f"https://api.github.com/users/{owner}")
         if response.status_code != 200: raise ValueError(f"Bad response from GitHub for user {owner}: {response.status_code}")
 
@@ -40,17 +47,8 @@ async def get_profile(owner: str, token: str, timeout: int = 15) -> dict:
         RequestException) | retry_if_exception_type(ReadTimeout) | retry_if_exception_type(
         Timeout) | retry_if_exception_type(HTTPError)))
 async def get_repo(owner: str, name: str, token: str, timeout: int = 15) -> dict:
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.mercy-preview+json"  # so repo topics will be returned
-    }
-    async with httpx.AsyncClient(headers=headers, timeout=timeout) as client:
-        response = await client.get(
-            f"https://api.github.com/repos/{owner}/{name}",
-            headers={
-                "Authorization": f"token {token}",
-                "Accept": "application/vnd.github.mercy-preview+json"  # so repo topics will be returned
-            })
+    async with get_client(token, timeout) as client:
+        response = await client.get(f"https://api.github.com/repos/{owner}/{name}")
         repo = response.json()
         if 'message' in repo and repo['message'] == 'Not Found': raise ValueError(f"Repo {owner}/{name} not found")
         logger.info(f"Retrieved repo {owner}/{name}:\n{repo}")
@@ -64,14 +62,12 @@ async def get_repo(owner: str, name: str, token: str, timeout: int = 15) -> dict
     retry=(retry_if_exception_type(ConnectionError) | retry_if_exception_type(
         RequestException) | retry_if_exception_type(ReadTimeout) | retry_if_exception_type(
         Timeout) | retry_if_exception_type(HTTPError)))
-async def list_repo_branches(owner: str, name: str, token: str, timeout: int = 15) -> list:
-    headers = {
-        "Authorization": f"token {token}",
-    }
-    async with httpx.AsyncClient(headers=headers, timeout=timeout) as client:
-        response = await client.get(f"https://api.github.com/repos/{owner}/{name}/branches")
-        branches = response.json()
-        return branches
+async def list_repo_branches(owner: str, name: str, token: str, timeout: int = 15, client: httpx.AsyncClient = None) -> list:
+    url = f"https://api.github.com/repos/{owner}/{name}/branches"
+    if client is not None: return await get_paginated(client, url, {'per_page': 100}, token)
+
+    async with get_client(token, timeout) as client:
+        return await get_paginated(client, url, {'per_page': 100}, token)
 
 
 @retry(
@@ -81,17 +77,17 @@ async def list_repo_branches(owner: str, name: str, token: str, timeout: int = 1
     retry=(retry_if_exception_type(ConnectionError) | retry_if_exception_type(
         RequestException) | retry_if_exception_type(ReadTimeout) | retry_if_exception_type(
         Timeout) | retry_if_exception_type(HTTPError)))
-async def list_repositories(owner: str, token: str, timeout: int = 15) -> list:
-    headers = {
-        "Authorization": f"token {token}",
-    }
-    async with httpx.AsyncClient(headers=headers, timeout=timeout) as client:
-        response = await client.get(f"https://api.github.com/users/{owner}/repos")
-        jsn = response.json()
-        if 'message' in jsn and 'OAuth App access restrictions' in jsn['message']:
-            logger.warning(jsn['message'])
-            return []
-        return jsn
+async def list_repositories(owner: str, token: str, timeout: int = 15, client: httpx.AsyncClient = None) -> list:
+    url = f"https://api.github.com/users/{owner}/repos"
+    if client is not None: jsn = await get_paginated(client, url, {'per_page': 100}, token)
+    else:
+        async with get_client(token, timeout) as client:
+            jsn = await get_paginated(client, url, {'per_page': 100}, token)
+
+    if 'message' in jsn and 'OAuth App access restrictions' in jsn['message']:
+        logger.warning(jsn['message'])
+        return []
+    return jsn
 
 
 @retry(
@@ -105,8 +101,7 @@ async def get_repo_readme(owner: str, name: str, token: str, timeout: int = 15)
     # TODO: are there any other readme variants that GitHub recognizes?
     url1 = f"https://api.github.com/repos/{owner}/{name}/contents/README"
     url2 = f"https://api.github.com/repos/{owner}/{name}/contents/README.md"
-    headers = {"Authorization": f"token {token}"}
-    async with httpx.AsyncClient(headers=headers, timeout=timeout) as client:
+    async with get_client(token, timeout) as client:
         tasks = [client.get(url).json() for url in [url1, url2]]
         results = await asyncio.gather(*tasks)
         response1 = results[0]
@@ -131,11 +126,7 @@ async def get_repo_readme(owner: str, name: str, token: str, timeout: int = 15)
         RequestException) | retry_if_exception_type(ReadTimeout) | retry_if_exception_type(
         Timeout) | retry_if_exception_type(HTTPError)))
 async def get_repo_config(owner: str, name: str, token: str, branch: str = 'master', timeout: int = 15) -> dict:
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.mercy-preview+json"  # so repo topics will be returned
-    }
-    async with httpx.AsyncClient(headers=headers, timeout=timeout) as client:
+    async with get_client(token, timeout) as client:
         response = await client.get(f"https://raw.githubusercontent.com/{owner}/{name}/{branch}/plantit.yaml")
         response.raise_for_status()
         config = response.text
@@ -148,7 +139,8 @@ async def get_repo_bundle(owner: str, name: str, branch: str, github_token: str,
     responses = await asyncio.gather(*tasks, return_exceptions=True)
     repo = responses[0]
     config = responses[1]
-    valid, errors = validate_workflow_configuration(config)
+    images = await docker.resolve_images([config.get('image', None)]) if isinstance(config, dict) else None
+    valid, errors = validate_workflow_configuration(config, images)
     return {
         'repo': repo,
         'config': config,
@@ -159,6 +151,553 @@ async def get_repo_bundle(owner: str, name: str, branch: str, github_token: str,
     }
 
 
+def get_http_cache_key(url: str, token: str) -> str:
+    # responses (and their validators) depend on what the token can see, so key on both
+    return f"github_http/{hashlib.sha256(f'{token}:{url}'.encode('utf-8')).hexdigest()}"
+
+
+async def get_conditional(client: httpx.AsyncClient, url: str, token: str) -> Tuple[httpx.Response, Optional[dict]]:
+    """
+    Sends a conditional GET, using any ETag or Last-Modified validators cached from a previous response to the same URL.
+    A 304 doesn't count against the GitHub rate limit and means the cached entry is still current.
+
+    Args:
+        client: The HTTP client to send requests with
+        url: The full URL (including query parameters)
+        token: The GitHub authentication token the request is sent with
+
+    Returns:
+        The response, and the cached entry if the response was a 304 (otherwise None)
+    """
+
+    redis = RedisClient.get_async()
+    key = get_http_cache_key(url, token)
+    cached = await redis.get(key)
+    entry = json.loads(cached) if cached is not None else None
+
+    headers = {}
+    if entry is not None:
+        if entry.get('etag', None) is not None: headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified', None) is not None: headers['If-Modified-Since'] = entry['last_modified']
+
+    response = await client.get(url, headers=headers)
+    if response.status_code == 304 and entry is not None:
+        logger.debug(f"Cached response for {url} is still current")
+        await redis.expire(key, int(settings.GITHUB_HTTP_CACHE_DAYS) * 24 * 60 * 60)
+        return response, entry
+
+    return response, None
+
+
+async def cache_response(response: httpx.Response, token: str) -> dict:
+    """
+    Caches the given response's body and validators (if it has any).
+
+    Args:
+        response: The response
+        token: The GitHub authentication token the request was sent with
+
+    Returns:
+        The cache entry
+    """
+
+    entry = {
+        'etag': response.headers.get('ETag', None),
+        'last_modified': response.headers.get('Last-Modified', None),
+        'next': response.links.get('next', {}).get('url', None),
+        'body': response.text,
+    }
+
+    # without validators we can't send a conditional request next time, so there's no point caching
+    if entry['etag'] is None and entry['last_modified'] is None: return entry
+
+    key = get_http_cache_key(str(response.request.url), token)
+    await RedisClient.get_async().set(key, json.dumps(entry), ex=int(settings.GITHUB_HTTP_CACHE_DAYS) * 24 * 60 * 60)
+    return entry
+
+
+async def get_paginated(client: httpx.AsyncClient, url: str, params: dict = None, token: str = None) -> list:
+    """
+    Retrieves every page of a GitHub list endpoint by following the `Link` header's `next` relation.
+    If a token is provided, pages are requested conditionally and unchanged pages are read from the cache.
+
+    Args:
+        client: The HTTP client to send requests with
+        url: The URL of the first page
+        params: Query parameters for the first page (subsequent page URLs already include them)
+        token: The GitHub authentication token the client sends (enables conditional requests)
+
+    Returns:
+        The concatenated items from all pages
+    """
+
+    items = []
+    next_page = str(httpx.URL(url, params=params))
+    while next_page is not None:
+        if token is None:
+            response = await client.get(next_page)
+            jsn = response.json()
+            next_page = response.links.get('next', {}).get('url', None)
+        else:
+            response, entry = await get_conditional(client, next_page, token)
+            if entry is None:
+                jsn = response.json()
+                if response.status_code == 200: entry = await cache_response(response, token)
+                next_page = response.links.get('next', {}).get('url', None)
+            else:
+                jsn = json.loads(entry['body'])
+                next_page = entry['next']
+
+        if not isinstance(jsn, list): return jsn  # error payloads aren't paginated, let the caller inspect them
+        items.extend(jsn)
+    return items
+
+
+def get_client(token: str, timeout: int = 15, concurrency: int = None) -> httpx.AsyncClient:
+    """
+    Creates an HTTP client suitable for sharing between many concurrent GitHub requests.
+    Every request sent with it draws on the token's shared rate limit budget (see `plantit.ratelimit`).
+
+    Args:
+        token: The GitHub authentication token
+        timeout: The request timeout (in seconds)
+        concurrency: The maximum number of open connections (defaults to the `GITHUB_CONCURRENCY` setting)
+
+    Returns:
+        The client (the caller is responsible for closing it)
+    """
+
+    concurrency = int(settings.GITHUB_CONCURRENCY) if concurrency is None else concurrency
+    return httpx.AsyncClient(
+        headers={
+            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github.mercy-preview+json"  # so repo topics will be returned
+        },
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        event_hooks=ratelimit.EVENT_HOOKS)
+
+
+def get_config_cache_key(text: str) -> str:
+    return f"workflow_config_cache/{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+async def parse_config(text: str) -> Tuple[dict, dict]:
+    """
+    Parses and validates the given `plantit.yaml` content. Results are cached by content hash, so identical
+    files (e.g., on different branches, or unchanged between refreshes) are only parsed and validated once.
+    Since validation depends on whether the image exists, cached results are only reused while that doesn't change.
+
+    Args:
+        text: The file content
+
+    Returns:
+        The parsed configuration and the validation result
+    """
+
+    redis = RedisClient.get_async()
+    key = get_config_cache_key(text)
+    computed = False
+
+    async def reload():
+        cached = await redis.get(key)
+        return None if cached is None else json.loads(cached)
+
+    async def compute():
+        nonlocal computed
+        computed = True
+        try:
+            config = yaml.safe_load(text)
+            # resolve the image up front so validation doesn't block the event loop
+            images = await docker.resolve_images([config.get('image', None)]) if isinstance(config, dict) else None
+            valid, errors = validate_workflow_configuration(config, images)
+            entry = {'config': config, 'images': images, 'validation': {'is_valid': valid, 'errors': errors}}
+        except Exception:
+            entry = {'config': {}, 'images': None, 'validation': {'is_valid': False, 'errors': [traceback.format_exc()]}}
+        await redis.set(key, json.dumps(entry), ex=int(settings.WORKFLOW_CONFIG_CACHE_MINUTES) * 60)
+        return entry
+
+    entry = await reload()
+    if entry is not None:
+        config = entry['config']
+        images = await docker.resolve_images([config.get('image', None)]) if isinstance(config, dict) and len(config) > 0 else entry['images']
+        if images != entry['images']: entry = None
+
+    # identical content being parsed concurrently (e.g., in several branches of the same repository) is only parsed once
+    if entry is None: entry = await singleflight.do(key, compute)
+
+    await metrics.record_async('workflow_config', hit=not computed)
+    return entry['config'], entry['validation']
+
+
+def to_workflow(owner: str, repository: dict, branch: dict, config: dict, validation: dict, org: bool = False) -> dict:
+    workflow = {
+        'repo': repository,
+        'config': config,
+        'branch': branch,
+        'validation': validation
+    }
+
+    if org:
+        repository['organization'] = owner
+        workflow['example'] = bool(config) and owner == 'Computational-Plant-Science' and 'example' in repository['name'].lower()
+
+    return workflow
+
+
+async def get_branch_workflow(
+        client: httpx.AsyncClient,
+        owner: str,
+        repository: dict,
+        branch: dict,
+        token: str,
+        org: bool = False) -> Optional[dict]:
+    """
+    Retrieves, parses and validates the `plantit.yaml` file on the given branch, if one exists.
+
+    Args:
+        client: The HTTP client to send requests with
+        owner: The GitHub user or organization name
+        repository: The repository (as returned by the GitHub REST API)
+        branch: The branch (as returned by the GitHub REST API)
+        token: The GitHub authentication token
+        org: Whether the owner is an organization
+
+    Returns:
+        The workflow, or None if the branch has no `plantit.yaml`
+    """
+
+    url = f"https://raw.githubusercontent.com/{owner}/{repository['name']}/{branch['name']}/plantit.yaml"
+    response, entry = await get_conditional(client, url, token)
+
+    # unchanged since the last scrape, so parsing is cached too (but the image is rechecked, in case it's since gone)
+    if entry is not None:
+        logger.debug(f"plantit.yaml in {owner}/{repository['name']}/{branch['name']} unchanged")
+        config, validation = await parse_config(entry['body'])
+        return to_workflow(owner, repository, branch, config, validation, org)
+
+    if response.status_code == 404:
+        logger.debug(f"No plantit.yaml in {owner}/{repository['name']}/{branch['name']}")
+        return None
+    if response.status_code != 200:
+        logger.warning(f"Failed to retrieve plantit.yaml from {owner}/{repository['name']}/{branch['name']}")
+        return None
+
+    logger.debug(f"Found plantit.yaml in {owner}/{repository['name']}/{branch['name']}")
+    config, validation = await parse_config(response.text)
+    await cache_response(response, token)
+    return to_workflow(owner, repository, branch, config, validation, org)
+
+
+async def get_connectable_repo_branch(owner: str, name: str, branch: str, token: str, org: bool = False, timeout: int = 15) -> Optional[dict]:
+    """
+    Retrieves the workflow on a single repository branch (e.g., in response to a push webhook).
+
+    Args:
+        owner: The GitHub user or organization name
+        name: The repository name
+        branch: The branch name
+        token: The GitHub authentication token
+        org: Whether the owner is an organization
+        timeout: The request timeout (in seconds)
+
+    Returns:
+        The workflow, or None if the branch doesn't exist or has no `plantit.yaml`
+    """
+
+    async with get_client(token, timeout) as client:
+        repo_response, branch_response = await asyncio.gather(
+            client.get(f"https://api.github.com/repos/{owner}/{name}"),
+            client.get(f"https://api.github.com/repos/{owner}/{name}/branches/{branch}"))
+        if repo_response.status_code != 200 or branch_response.status_code != 200:
+            logger.warning(f"Failed to retrieve {owner}/{name}/{branch}: {repo_response.status_code}, {branch_response.status_code}")
+            return None
+        return await get_branch_workflow(client, owner, repo_response.json(), branch_response.json(), token, org)
+
+
+async def list_connectable_repo_branches(
+        owner: str,
+        name: str,
+        token: str,
+        org: bool = False,
+        timeout: int = 15,
+        concurrency: int = None) -> List[dict]:
+    """
+    Retrieves the workflows on every branch of a single repository (e.g., in response to a repository webhook).
+
+    Args:
+        owner: The GitHub user or organization name
+        name: The repository name
+        token: The GitHub authentication token
+        org: Whether the owner is an organization
+        timeout: The request timeout (in seconds)
+        concurrency: The maximum number of concurrent requests (defaults to the `GITHUB_CONCURRENCY` setting)
+
+    Returns:
+        A workflow for each branch containing a `plantit.yaml` file
+    """
+
+    concurrency = int(settings.GITHUB_CONCURRENCY) if concurrency is None else concurrency
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def get_config(repository: dict, branch: dict):
+        async with semaphore:
+            return await get_branch_workflow(client, owner, repository, branch, token, org)
+
+    async with get_client(token, timeout, concurrency) as client:
+        response = await client.get(f"https://api.github.com/repos/{owner}/{name}")
+        if response.status_code != 200:
+            logger.warning(f"Failed to retrieve repo {owner}/{name}: {response.status_code}")
+            return []
+
+        repository = response.json()
+        branches = await list_repo_branches(owner, name, token, client=client)
+        if not isinstance(branches, list): return []
+        workflows = await asyncio.gather(*[get_config(repository, branch) for branch in branches])
+        return [workflow for workflow in workflows if workflow is not None]
+
+
+REPOSITORY_FIELDS = """
+    name
+    nameWithOwner
+    description
+    url
+    isPrivate
+    isArchived
+    isFork
+    stargazerCount
+    forkCount
+    createdAt
+    updatedAt
+    pushedAt
+    owner { __typename login avatarUrl url }
+    defaultBranchRef { name }
+    repositoryTopics(first: 20) { nodes { topic { name } } }
+"""
+
+REF_FIELDS = """
+    pageInfo { hasNextPage endCursor }
+    nodes {
+        name
+        target {
+            ... on Commit {
+                oid
+                file(path: "plantit.yaml") { object { ... on Blob { text } } }
+            }
+        }
+    }
+"""
+
+LIST_REPOSITORIES_QUERY = """
+query($owner: String!, $cursor: String, $repos: Int!, $refs: Int!) {
+    repositoryOwner(login: $owner) {
+        repositories(first: $repos, after: $cursor, privacy: PUBLIC, ownerAffiliations: [OWNER], orderBy: {field: NAME, direction: ASC}) {
+            pageInfo { hasNextPage endCursor }
+            nodes {
+                %s
+                refs(first: $refs, refPrefix: "refs/heads/") { %s }
+            }
+        }
+    }
+}
+""" % (REPOSITORY_FIELDS, REF_FIELDS)
+
+LIST_REFS_QUERY = """
+query($owner: String!, $name: String!, $cursor: String, $refs: Int!) {
+    repository(owner: $owner, name: $name) {
+        refs(first: $refs, after: $cursor, refPrefix: "refs/heads/") { %s }
+    }
+}
+""" % REF_FIELDS
+
+
+class GraphQLUnavailable(Exception):
+    pass
+
+
+async def query_graphql(client: httpx.AsyncClient, query: str, variables: dict) -> dict:
+    """
+    Sends a GraphQL query to the GitHub API.
+
+    Args:
+        client: The HTTP client to send requests with
+        query: The query
+        variables: The query variables
+
+    Returns:
+        The response's `data`
+
+    Raises:
+        GraphQLUnavailable: If the token can't be used with the GraphQL API (e.g., it lacks the necessary scopes)
+    """
+
+    response = await client.post('https://api.github.com/graphql', json={'query': query, 'variables': variables})
+    if response.status_code != 200:
+        raise GraphQLUnavailable(f"Bad response from GitHub GraphQL API: {response.status_code}")
+
+    jsn = response.json()
+    errors = jsn.get('errors', None) or []
+    if any(error.get('type', None) in ('INSUFFICIENT_SCOPES', 'FORBIDDEN') for error in errors) or jsn.get('data', None) is None:
+        raise GraphQLUnavailable(f"GitHub GraphQL API query failed: {errors}")
+    if len(errors) > 0: logger.warning(f"GitHub GraphQL API query returned partial data: {errors}")
+    return jsn['data']
+
+
+def to_rest_repository(node: dict) -> dict:
+    # mimic the fields of the REST API's repository representation that we (and the front end) rely on
+    owner = node['owner']
+    return {
+        'name': node['name'],
+        'full_name': node['nameWithOwner'],
+        'description': node['description'],
+        'html_url': node['url'],
+        'private': node['isPrivate'],
+        'archived': node['isArchived'],
+        'fork': node['isFork'],
+        'stargazers_count': node['stargazerCount'],
+        'forks_count': node['forkCount'],
+        'created_at': node['createdAt'],
+        'updated_at': node['updatedAt'],
+        'pushed_at': node['pushedAt'],
+        'default_branch': node['defaultBranchRef']['name'] if node['defaultBranchRef'] is not None else None,
+        'topics': [topic['topic']['name'] for topic in node['repositoryTopics']['nodes']],
+        'owner': {
+            'login': owner['login'],
+            'type': owner['__typename'],
+            'avatar_url': owner['avatarUrl'],
+            'html_url': owner['url'],
+        },
+    }
+
+
+def to_rest_branch(node: dict) -> dict:
+    return {'name': node['name'], 'commit': {'sha': (node['target'] or {}).get('oid', None)}}
+
+
+def get_config_text(ref: dict) -> Optional[str]:
+    file = (ref['target'] or {}).get('file', None)
+    return None if file is None or file['object'] is None else file['object'].get('text', None)
+
+
+async def list_connectable_repos_graphql(
+        client: httpx.AsyncClient,
+        owner: str,
+        org: bool = False,
+        repos: int = 50,
+        refs: int = 100) -> List[dict]:
+    """
+    Scrapes the given user's or organization's repositories for `plantit.yaml` files via the GitHub GraphQL API,
+    retrieving repositories, their branches and each branch's `plantit.yaml` together, a page of repositories at a time.
+
+    Args:
+        client: The HTTP client to send requests with
+        owner: The GitHub user or organization name
+        org: Whether the owner is an organization
+        repos: The number of repositories to retrieve per page
+        refs: The number of branches to retrieve per repository (per page)
+
+    Returns:
+        A workflow for each branch containing a `plantit.yaml` file, in repository and branch order
+
+    Raises:
+        GraphQLUnavailable: If the token can't be used with the GraphQL API
+    """
+
+    nodes = []
+    cursor = None
+    while True:
+        data = await query_graphql(client, LIST_REPOSITORIES_QUERY, {'owner': owner, 'cursor': cursor, 'repos': repos, 'refs': refs})
+        if data['repositoryOwner'] is None:
+            logger.warning(f"GitHub user or organization {owner} not found")
+            return []
+
+        page = data['repositoryOwner']['repositories']
+        nodes.extend(page['nodes'])
+        if not page['pageInfo']['hasNextPage']: break
+        cursor = page['pageInfo']['endCursor']
+
+    # repositories with more branches than fit in the first query need follow-up queries
+    for node in nodes:
+        page_info = node['refs']['pageInfo']
+        while page_info['hasNextPage']:
+            data = await query_graphql(client, LIST_REFS_QUERY, {'owner': owner, 'name': node['name'], 'cursor': page_info['endCursor'], 'refs': refs})
+            node['refs']['nodes'].extend(data['repository']['refs']['nodes'])
+            page_info = data['repository']['refs']['pageInfo']
+
+    async def get_workflow(repository: dict, ref: dict, text: str):
+        config, validation = await parse_config(text)
+        return to_workflow(owner, repository, to_rest_branch(ref), config, validation, org)
+
+    tasks = []
+    for node in nodes:
+        repository = to_rest_repository(node)
+        for ref in node['refs']['nodes']:
+            text = get_config_text(ref)
+            if text is not None: tasks.append(get_workflow(repository, ref, text))
+
+    workflows = await asyncio.gather(*tasks)
+    logger.info(f"Found {len(workflows)} workflow(s) in {len(nodes)} repositories for {owner} via GraphQL")
+    return list(workflows)
+
+
+async def list_connectable_repos(
+        owner: str,
+        token: str,
+        org: bool = False,
+        timeout: int = 15,
+        concurrency: int = None,
+        client: httpx.AsyncClient = None,
+        graphql: bool = None) -> List[dict]:
+    """
+    Scrapes the given user's or organization's repositories for `plantit.yaml` files. The GraphQL API is tried first
+    (if enabled), otherwise (or if the token can't use it) we fall back to the REST API, fanning out branch listings
+    and config file requests over a single shared HTTP client, with at most `concurrency` requests in flight.
+
+    Args:
+        owner: The GitHub user or organization name
+        token: The GitHub authentication token
+        org: Whether the owner is an organization
+        timeout: The request timeout (in seconds)
+        concurrency: The maximum number of concurrent requests (defaults to the `GITHUB_CONCURRENCY` setting)
+        client: An optional HTTP client to use (one is created and closed if not provided)
+        graphql: Whether to try the GraphQL API first (defaults to the `GITHUB_GRAPHQL` setting)
+
+    Returns:
+        A workflow for each branch containing a `plantit.yaml` file, in repository and branch order
+    """
+
+    concurrency = int(settings.GITHUB_CONCURRENCY) if concurrency is None else concurrency
+    semaphore = asyncio.Semaphore(concurrency)
+    shared = client if client is not None else get_client(token, timeout, concurrency)
+
+    async def get_config(repository: dict, branch: dict):
+        async with semaphore:
+            return await get_branch_workflow(shared, owner, repository, branch, token, org)
+
+    async def list_workflows(repository: dict):
+        async with semaphore:
+            branches = await list_repo_branches(owner, repository['name'], token, client=shared)
+        if not isinstance(branches, list):
+            logger.warning(f"Failed to list branches for {owner}/{repository['name']}: {branches}")
+            return []
+        return await asyncio.gather(*[get_config(repository, branch) for branch in branches])
+
+    graphql = settings.GITHUB_GRAPHQL if graphql is None else graphql
+
+    try:
+        if graphql:
+            try:
+                return await list_connectable_repos_graphql(shared, owner, org)
+            except GraphQLUnavailable as e:
+                logger.info(f"Falling back to REST API to scrape {owner}'s repositories: {e}")
+
+        repositories = await list_repositories(owner, token, client=shared)
+        results = await asyncio.gather(*[list_workflows(repository) for repository in repositories])
+        return [workflow for workflows in results for workflow in workflows if workflow is not None]
+    finally:
+        if client is None: await shared.aclose()
+
+
 @retry(
     reraise=True,
     wait=wait_exponential(multiplier=1, min=4, max=10),
@@ -166,63 +705,8 @@ async def get_repo_bundle(owner: str, name: str, branch: str, github_token: str,
     retry=(retry_if_exception_type(ConnectionError) | retry_if_exception_type(
         RequestException) | retry_if_exception_type(ReadTimeout) | retry_if_exception_type(
         Timeout) | retry_if_exception_type(HTTPError)))
-async def list_connectable_repos_by_org(owner: str, token: str, timeout: int = 15) -> List[dict]:
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.mercy-preview+json"  # so repo topics will be returned
-    }
-    async with httpx.AsyncClient(headers=headers, timeout=timeout) as client:
-        workflows = []
-        org_repos = await list_repositories(owner, token)
-
-        # TODO refactor to send reqs in parallel
-        for repository in org_repos:
-            branches = await list_repo_branches(owner, repository['name'], token)
-            for branch in branches:
-                response = await client.get(
-                    f"https://raw.githubusercontent.com/{owner}/{repository['name']}/{branch['name']}/plantit.yaml",
-                    headers={
-                        "Authorization": f"token {token}",
-                        "Accept": "application/vnd.github.mercy-preview+json"  # so repo topics will be returned
-                    })
-
-                if response.status_code == 404:
-                    logger.debug(f"No plantit.yaml in {owner}/{repository['name']}/{branch['name']}")
-                    continue
-                if response.status_code != 200:
-                    logger.warning(f"Failed to retrieve plantit.yaml from {owner}/{repository['name']}/{branch['name']}")
-                    continue
-                else: logger.debug(f"Found plantit.yaml in {owner}/{repository['name']}/{branch['name']}")
-
-
-                repository['organization'] = owner
-
-                try:
-                    config = yaml.safe_load(response.text)
-                    valid, errors = validate_workflow_configuration(config)
-                    workflows.append({
-                        'repo': repository,
-                        'config': config,
-                        'branch': branch,
-                        'validation': {
-                            'is_valid': valid,
-                            'errors': errors
-                        },
-                        'example': owner == 'Computational-Plant-Science' and 'example' in repository['name'].lower()
-                    })
-                except Exception:
-                    workflows.append({
-                        'repo': repository,
-                        'config': {},
-                        'branch': branch,
-                        'validation': {
-                            'is_valid': False,
-                            'errors': [traceback.format_exc()]
-                        },
-                        'example': False
-                    })
-
-        return workflows
+async def list_connectable_repos_by_org(owner: str, token: str, timeout: int = 15, concurrency: int = None) -> List[dict]:
+    return await list_connectable_repos(owner, token, org=True, timeout=timeout, concurrency=concurrency)
 
 
 @retry(
@@ -232,55 +716,8 @@ async def list_connectable_repos_by_org(owner: str, token: str, timeout: int = 1
     retry=(retry_if_exception_type(ConnectionError) | retry_if_exception_type(
         RequestException) | retry_if_exception_type(ReadTimeout) | retry_if_exception_type(
         Timeout) | retry_if_exception_type(HTTPError)))
-async def list_connectable_repos_by_owner(owner: str, token: str, timeout: int = 15) -> List[dict]:
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.mercy-preview+json"  # so repo topics will be returned
-    }
-    async with httpx.AsyncClient(headers=headers, timeout=timeout) as client:
-        workflows = []
-        owned_repos = await list_repositories(owner, token)
-        for repository in owned_repos:
-            branches = await list_repo_branches(owner, repository['name'], token)
-            for branch in branches:
-                response = await client.get(
-                    f"https://raw.githubusercontent.com/{owner}/{repository['name']}/{branch['name']}/plantit.yaml",
-                    headers={
-                        "Authorization": f"token {token}",
-                        "Accept": "application/vnd.github.mercy-preview+json"  # so repo topics will be returned
-                    })
-
-                if response.status_code == 404:
-                    logger.debug(f"No plantit.yaml in {owner}/{repository['name']}/{branch['name']}")
-                    continue
-                if response.status_code != 200:
-                    logger.warning(f"Failed to retrieve plantit.yaml from {owner}/{repository['name']}/{branch['name']}")
-                    continue
-
-                try:
-                    config = yaml.safe_load(response.text)
-                    valid, errors = validate_workflow_configuration(config)
-                    workflows.append({
-                        'repo': repository,
-                        'config': config,
-                        'branch': branch,
-                        'validation': {
-                            'is_valid': valid,
-                            'errors': errors
-                        }
-                    })
-                except Exception:
-                    workflows.append({
-                        'repo': repository,
-                        'config': {},
-                        'branch': branch,
-                        'validation': {
-                            'is_valid': False,
-                            'errors': [traceback.format_exc()]
-                        }
-                    })
-
-        return workflows
+async def list_connectable_repos_by_owner(owner: str, token: str, timeout: int = 15, concurrency: int = None) -> List[dict]:
+    return await list_connectable_repos(owner, token, org=False, timeout=timeout, concurrency=concurrency)
 
 
 @retry(
@@ -291,11 +728,7 @@ async def list_connectable_repos_by_owner(owner: str, token: str, timeout: int =
         RequestException) | retry_if_exception_type(ReadTimeout) | retry_if_exception_type(
         Timeout) | retry_if_exception_type(HTTPError)))
 async def list_user_organizations(username: str, token: str, timeout: int = 15) -> List[dict]:
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.mercy-preview+json"  # so repo topics will be returned
-    }
-    async with httpx.AsyncClient(headers=headers, timeout=timeout) as client:
+    async with get_client(token, timeout) as client:
         response = await client.get(f"https://api.github.com/users/{username}/orgs")
         if response.status_code != 200: logger.error(f"Failed to retrieve organizations for {username}")
         jsn = response.json()
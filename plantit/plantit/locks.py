@@ -0,0 +1,126 @@
+import logging
+import threading
+from contextlib import contextmanager
+from uuid import uuid4
+
+from django.conf import settings
+
+from plantit.redis import RedisClient
+
+logger = logging.getLogger(__name__)
+
+# delete the lock only if we still own it
+RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+# extend the lock only if we still own it
+RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('PEXPIRE', KEYS[1], ARGV[2]) end
+return 0
+"""
+
+
+def get_lock_key(name: str) -> str:
+    return f"locks/{name}"
+
+
+class Lock:
+    def __init__(self, name: str, ttl: int = None):
+        """
+        Args:
+            name: The lock name
+            ttl: How long the lock is held unless renewed or released, in seconds (defaults to `LOCKS_TTL_SECONDS`)
+        """
+
+        self.name = name
+        self.key = get_lock_key(name)
+        self.ttl = int(ttl or settings.LOCKS_TTL_SECONDS)
+        self.token = uuid4().hex
+        self.__stop = threading.Event()
+        self.__renewer = None
+
+    def acquire(self, renew: bool = False) -> bool:
+        """
+        Attempts to acquire the lock, without waiting.
+
+        Args:
+            renew: Whether to keep renewing the lock in the background until it's released
+
+        Returns:
+            True if the lock was acquired, otherwise False
+        """
+
+        acquired = bool(RedisClient.get().set(self.key, self.token, nx=True, px=self.ttl * 1000))
+        if acquired and renew:
+            self.__stop.clear()
+            self.__renewer = threading.Thread(target=self.__keep_alive, name=f"lock-renewer-{self.name}", daemon=True)
+            self.__renewer.start()
+        return acquired
+
+    def renew(self) -> bool:
+        """
+        Resets the lock's TTL.
+
+        Returns:
+            True if the lock is still held, otherwise False
+        """
+
+        return bool(RedisClient.get().eval(RENEW, 1, self.key, self.token, self.ttl * 1000))
+
+    def release(self) -> bool:
+        """
+        Releases the lock (and stops renewing it).
+
+        Returns:
+            True if the lock was still held, otherwise False (i.e., it expired)
+        """
+
+        self.__stop.set()
+        if self.__renewer is not None and self.__renewer is not threading.current_thread(): self.__renewer.join()
+        self.__renewer = None
+        released = bool(RedisClient.get().eval(RELEASE, 1, self.key, self.token))
+        if not released: logger.warning(f"Lock '{self.name}' expired before it was released")
+        return released
+
+    def locked(self) -> bool:
+        return bool(RedisClient.get().exists(self.key))
+
+    async def acquire_async(self) -> bool:
+        return bool(await RedisClient.get_async().set(self.key, self.token, nx=True, px=self.ttl * 1000))
+
+    async def release_async(self) -> bool:
+        released = bool(await RedisClient.get_async().eval(RELEASE, 1, self.key, self.token))
+        if not released: logger.warning(f"Lock '{self.name}' expired before it was released")
+        return released
+
+    async def locked_async(self) -> bool:
+        return bool(await RedisClient.get_async().exists(self.key))
+
+    def __keep_alive(self):
+        # renew well before expiry, so a slow round trip doesn't let the lock lapse
+        while not self.__stop.wait(self.ttl / 3):
+            if not self.renew():
+                logger.warning(f"Lost lock '{self.name}' while renewing it")
+                return
+
+
+@contextmanager
+def lock(name: str, ttl: int = None, renew: bool = True):
+    """
+    Attempts to acquire the given lock for the duration of the context, yielding whether it was acquired.
+    The lock is renewed in the background (unless `renew` is False) and released on exit.
+
+    Args:
+        name: The lock name
+        ttl: How long the lock is held unless renewed, in seconds (defaults to `LOCKS_TTL_SECONDS`)
+        renew: Whether to renew the lock until the context exits
+    """
+
+    held = Lock(name, ttl)
+    acquired = held.acquire(renew)
+    try:
+        yield acquired
+    finally:
+        if acquired: held.release()
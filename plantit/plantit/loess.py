@@ -56,9 +56,10 @@ def get_weights(distances: np.ndarray, band: np.ndarray) -> np.ndarray:
     return weights
 
 
-def regress(data: pd.DataFrame, bandwidth: int, num_pts: int) -> pd.DataFrame:
+def regress_wls(data: pd.DataFrame, bandwidth: int, num_pts: int) -> pd.DataFrame:
     """
-    Performs LOESS regression.
+    Performs LOESS regression, fitting a separate weighted least squares model for each output point.
+    Superseded by the (equivalent) vectorized `regress`, kept as its reference implementation.
 
     :param data: The data frame or matrix, with the predictor in the first column and the response in the second
     :param bandwidth: The bandwidth (lambda)
@@ -113,3 +114,62 @@ def regress(data: pd.DataFrame, bandwidth: int, num_pts: int) -> pd.DataFrame:
     # rescale the response to the original interval
     output_ys = [y for yy in np.interp(output_ys, (0, 1), (y_min, y_max)) for y in yy]
     return pd.DataFrame({'X': output_xs, 'Y': output_ys})
+
+
+def get_kernel(width: int) -> np.ndarray:
+    """
+    Calculates the weights of band points by position (band points are evenly spaced over [-1, 1] standard deviations
+    of a normal distribution, so the weights don't depend on the points' distances, only on their rank in the band)
+
+    :param width: The band width
+    :return: The (unnormalized) weights
+    """
+
+    z = np.linspace(-1, 1, width)
+    return np.exp(-z ** 2 / 2)
+
+
+def regress(data: pd.DataFrame, bandwidth: int, num_pts: int) -> pd.DataFrame:
+    """
+    Performs LOESS regression, fitting every output point at once rather than one by one.
+    Each point's band is the window of `bandwidth` consecutive (sorted) predictor values nearest to it, found with a
+    binary search over window midpoints. Since the band weights depend only on position, the weighted sums for every
+    window are sliding dot products with the same kernel, and each band's (no-intercept) fit is their ratio.
+
+    :param data: The data frame or matrix, with the predictor in the first column and the response in the second
+    :param bandwidth: The bandwidth (lambda)
+    :param num_pts: The number of points to predict over
+    :return: The output matrix, with x values in the first column and predictions in the second
+    """
+
+    # extract the predictor and response (sorted by predictor) and compute their respective min and max values
+    xs = data.iloc[:,0].to_numpy(dtype=float)
+    ys = data.iloc[:,1].to_numpy(dtype=float)
+    order = np.argsort(xs, kind='stable')
+    xs, ys = xs[order], ys[order]
+    x_min, x_max = np.min(xs), np.max(xs)
+    y_min, y_max = np.min(ys), np.max(ys)
+
+    # scale the predictor and response to unit interval
+    normed_xs = np.interp(xs, (x_min, x_max), (0, 1))
+    normed_ys = np.interp(ys, (y_min, y_max), (0, 1))
+
+    # predict n evenly spaced points over the output range
+    output_xs = np.linspace(x_min, x_max, num_pts)
+    normed_output_xs = rescale(output_xs, x_min, x_max)
+
+    # find each output point's band: the window [start, start + width) moves right past every window whose
+    # rightmost point is at least as close as its leftmost, i.e. whose midpoint is at or left of the output point
+    width = max(1, min(int(bandwidth), len(xs)))
+    midpoints = (normed_xs[:len(xs) - width] + normed_xs[width:]) / 2
+    starts = np.searchsorted(midpoints, normed_output_xs, side='right')
+
+    # weighted sums over every window, then a no-intercept weighted least squares fit (beta = sum(wxy) / sum(wx^2)) per band
+    kernel = get_kernel(width)
+    sum_wxy = np.correlate(normed_xs * normed_ys, kernel, mode='valid')[starts]
+    sum_wxx = np.correlate(normed_xs * normed_xs, kernel, mode='valid')[starts]
+    betas = np.divide(sum_wxy, sum_wxx, out=np.zeros_like(sum_wxy), where=sum_wxx != 0)
+
+    # rescale the response to the original interval
+    output_ys = np.interp(betas * normed_output_xs, (0, 1), (y_min, y_max))
+    return pd.DataFrame({'X': output_xs, 'Y': output_ys})
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from plantit import usage as usage
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the daily task usage rollups from the task table"
+
+    def handle(self, *args, **options):
+        rows = usage.backfill()
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {rows} task usage rollup(s)"))
@@ -1,3 +1,7 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List
 from urllib.parse import quote_plus
 
 import httpx
@@ -5,6 +9,26 @@ from django.conf import settings
 from requests import RequestException, ReadTimeout, Timeout, HTTPError
 from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
 
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Spaces out requests (across concurrent callers) to stay under the given rate.
+    """
+
+    def __init__(self, per_second: float):
+        self.interval = 1 / per_second
+        self.next = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next - now
+            self.next = max(now, self.next) + self.interval
+        if delay > 0: await asyncio.sleep(delay)
+
 
 @retry(
     reraise=True,
@@ -12,21 +36,57 @@ from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_excep
     stop=stop_after_attempt(3),
     retry=(retry_if_exception_type(ConnectionError) | retry_if_exception_type(
         RequestException) | retry_if_exception_type(ReadTimeout) | retry_if_exception_type(
-        Timeout) | retry_if_exception_type(HTTPError)))
-async def get_institution(name: str, token: str) -> dict:
+        Timeout) | retry_if_exception_type(HTTPError) | retry_if_exception_type(httpx.HTTPError)))
+async def get_institution(name: str, token: str, client: httpx.AsyncClient = None) -> dict:
     """
     Queries the Mapbox geocoding API for information about an institution.
 
     Args:
         name: The institution name
         token: The authentication token
+        client: The HTTP client to use (optional, one is created if not provided)
 
     Returns:
         Potential matches for the institution with geocoding info
     """
 
     url = f"https://api.mapbox.com/geocoding/v5/mapbox.places/{quote_plus(name)}.json?access_token={token}"
-    async with httpx.AsyncClient(timeout=15) as client:
+    owned = client is None
+    if owned: client = httpx.AsyncClient(timeout=15)
+    try:
         response = await client.get(url)
         response.raise_for_status()
         return response.json()
+    finally:
+        if owned: await client.aclose()
+
+
+async def get_institutions(names: List[str], token: str, concurrency: int = None, per_second: float = None) -> Dict[str, dict]:
+    """
+    Queries the Mapbox geocoding API for information about each of the given institutions, concurrently
+    (up to `MAPBOX_CONCURRENCY` requests at once and `MAPBOX_REQUESTS_PER_SECOND` per second).
+
+    Args:
+        names: The institution names
+        token: The authentication token
+        concurrency: The max number of requests in flight
+        per_second: The max number of requests per second
+
+    Returns:
+        Potential matches for each institution with geocoding info, keyed by name (omitting any that failed)
+    """
+
+    semaphore = asyncio.Semaphore(int(concurrency or settings.MAPBOX_CONCURRENCY))
+    limiter = RateLimiter(float(per_second or settings.MAPBOX_REQUESTS_PER_SECOND))
+
+    async def query(client: httpx.AsyncClient, name: str):
+        async with semaphore:
+            await limiter.wait()
+            try: return name, await get_institution(name, token, client)
+            except Exception as e:
+                logger.warning(f"Failed to geocode institution {name}: {e}")
+                return name, None
+
+    async with httpx.AsyncClient(timeout=15) as client:
+        results = await asyncio.gather(*[query(client, name) for name in names])
+    return {name: result for name, result in results if result is not None}
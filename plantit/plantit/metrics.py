@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+from plantit.redis import RedisClient
+
+METRICS_KEY = 'cache_metrics'
+FLUSH_INTERVAL_SECONDS = 5
+
+__pending: Counter = Counter()
+__pending_lock = threading.Lock()
+__flushed = time.monotonic()
+
+
+def __drain() -> Dict[str, int]:
+    global __flushed
+    with __pending_lock:
+        pending = dict(__pending)
+        __pending.clear()
+        __flushed = time.monotonic()
+    return pending
+
+
+def __count(cache: str, hit: bool, count: int) -> bool:
+    with __pending_lock:
+        __pending[f"{cache}/{'hits' if hit else 'misses'}"] += count
+        return time.monotonic() - __flushed > FLUSH_INTERVAL_SECONDS
+
+
+def flush():
+    pending = __drain()
+    if len(pending) == 0: return
+    pipeline = RedisClient.get().pipeline()
+    for field, count in pending.items(): pipeline.hincrby(METRICS_KEY, field, count)
+    pipeline.execute()
+
+
+async def flush_async():
+    pending = __drain()
+    if len(pending) == 0: return
+    pipeline = RedisClient.get_async().pipeline()
+    for field, count in pending.items(): pipeline.hincrby(METRICS_KEY, field, count)
+    await pipeline.execute()
+
+
+def record(cache: str, hit: bool, count: int = 1):
+    """
+    Counts a lookup (or several) against the given cache.
+
+    Args:
+        cache: The cache name
+        hit: Whether the lookup was served from the cache
+        count: The number of lookups
+    """
+
+    if __count(cache, hit, count): flush()
+
+
+async def record_async(cache: str, hit: bool, count: int = 1):
+    """
+    Counts a lookup (or several) against the given cache, flushing without blocking the event loop.
+
+    Args:
+        cache: The cache name
+        hit: Whether the lookup was served from the cache
+        count: The number of lookups
+    """
+
+    if __count(cache, hit, count): await flush_async()
+
+
+def get_cache_metrics() -> Dict[str, dict]:
+    """
+    Retrieves hit and miss counts (and the hit rate) for each cache.
+
+    Returns:
+        A dictionary mapping cache names to their metrics
+    """
+
+    flush()
+    metrics = dict()
+    for field, value in RedisClient.get().hgetall(METRICS_KEY).items():
+        cache, _, kind = field.decode('utf-8').rpartition('/')
+        metrics.setdefault(cache, {'hits': 0, 'misses': 0})[kind] = int(value)
+
+    for cache in metrics.values():
+        total = cache['hits'] + cache['misses']
+        cache['hit_rate'] = cache['hits'] / total if total > 0 else None
+    return metrics
@@ -3,8 +3,8 @@ import concurrent.futures
 import json
 import logging
 import traceback
-from collections import Counter, namedtuple, OrderedDict
-from datetime import datetime, timedelta
+from collections import Counter, OrderedDict
+from datetime import date, datetime, timedelta
 from pathlib import Path
 from typing import List, Tuple, Dict
 
@@ -12,29 +12,38 @@ import jwt
 import numpy as np
 import pandas as pd
 from asgiref.sync import sync_to_async, async_to_sync
+from django import db
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.exceptions import MultipleObjectsReturned
 from django.core.paginator import Paginator
-from django.db.models import Count
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Max, Q, Sum
 from django.utils import timezone
 
 from pycyapi.clients import TerrainClient
+from requests import HTTPError
 
 import plantit.migration
 import plantit.migration as migration
 from pycyapi.exceptions import Unauthorized
-import plantit.mapbox as mapbox
+from plantit import catalog as catalog
+from plantit import geocodes as geocodes
 from plantit import github as github
 from plantit import loess as loess
+from plantit import querycache as querycache
+from plantit import ratelimit as ratelimit
+from plantit import sessions as sessions
+from plantit import singleflight as singleflight
+from plantit import userstats as userstats
 from plantit.redis import RedisClient
 from plantit.agents.models import Agent, AgentRole
 from plantit.miappe.models import Investigation, Study
 from plantit.notifications.models import Notification
 from plantit.misc.models import NewsUpdate, FeaturedWorkflow
 from plantit.datasets.models import DatasetAccessPolicy
-from plantit.tasks.models import Task, DelayedTask, RepeatingTask, TriggeredTask, TaskCounter, TaskStatus
+from plantit.tasks.models import Task, DelayedTask, RepeatingTask, TriggeredTask, TaskCounter, TaskUsage
 from plantit.users.models import Profile, Migration, ManagedFile
+from plantit.utils import timeseries as timeseries
 from plantit.utils.misc import del_none
 from plantit.utils.tasks import get_task_orchestrator_log_file_path, has_output_target
 
@@ -42,20 +51,24 @@ logger = logging.getLogger(__name__)
 
 
 def get_project_workflows(project: Investigation):
-    redis = RedisClient.get()
-    workflows = [wf for wf in [json.loads(redis.get(key)) for key in redis.scan_iter(match='workflows/*')] if
-                 'projects' in wf['config'] and project.guid in wf['config']['projects']]
-    return workflows
+    return catalog.list_indexed_workflows(catalog.project_index(project.guid))
 
 
-async def refresh_online_users_workflow_cache():
-    users = await sync_to_async(User.objects.all)()
-    online = await sync_to_async(filter_online)(users)
+async def refresh_online_users_workflow_cache() -> Dict[str, int]:
+    online = await sync_to_async(list_online_users)()
     logger.info(f"Refreshing workflow cache for {len(online)} online user(s)")
+
+    # GitHub users whose token's rate limit budget is exhausted, and the seconds until it resets
+    deferred = dict()
     for user in online:
         profile = await sync_to_async(Profile.objects.get)(user=user)
         if profile.github_username is not None and profile.github_username != '':
-            await refresh_user_workflow_cache(profile.github_username)
+            try:
+                await refresh_user_workflow_cache(profile.github_username)
+            except ratelimit.RateLimited as e:
+                logger.warning(f"Deferring workflow cache refresh for GitHub user {profile.github_username}: {e}")
+                deferred[profile.github_username] = e.retry_after
+    return deferred
 
 
 @sync_to_async
@@ -80,101 +93,205 @@ async def refresh_user_workflow_cache(github_username: str):
     profile = await sync_to_async(Profile.objects.get)(user=user)
     workflows = await github.list_connectable_repos_by_owner(github_username, profile.github_token)
 
-    # update the cache, first removing workflows that no longer exist
-    redis = RedisClient.get()
-    removed = 0
-    updated = 0
-    added = 0
-    old_keys = [key.decode('utf-8') for key in redis.scan_iter(match=f"workflows/{github_username}/*")]
-    new_keys = [f"workflows/{github_username}/{wf['repo']['name']}/{wf['branch']['name']}" for wf in workflows]
-    for old_key in old_keys:
-        # invalidate submission config cache
-        config_key = f"workflow_configs/{user.username}/{old_key.partition('/')[2]}"
-        if redis.exists(config_key):
-            logger.info(f"Removing cached workflow configuration {config_key}")
-            redis.delete(config_key)
-
-        if old_key not in new_keys:
-            logger.debug(f"Removing user workflow {old_key}")
-            removed += 1
-            redis.delete(old_key)
-        else:
-            logger.debug(f"Updating user workflow {old_key}")
-            updated += 1
-
-    # ...then adding/updating the workflows we just scraped
-    for wf in workflows:
-        # set flag if this is a featured workflow
-        wf['featured'] = await is_featured(github_username, wf['repo']['name'], wf['branch']['name'])
-
-        key = f"workflows/{github_username}/{wf['repo']['name']}/{wf['branch']['name']}"
-        if key not in old_keys:
-            logger.debug(f"Adding user workflow {key}")
-            added += 1
-        redis.set(key, json.dumps(del_none(wf)))
+    # invalidate submission config caches, then update the workflow cache
+    old_keys = await sync_to_async(catalog.list_owner_keys)(github_username)
+    config_keys = [catalog.config_key(user.username, *key.split('/', 3)[1:]) for key in old_keys]
+    invalidated = await sync_to_async(catalog.remove_configs)(config_keys)
+    if invalidated > 0: logger.info(f"Removed {invalidated} cached workflow configuration(s) for user {user.username}")
 
-    redis.set(f"workflows_updated/{github_username}", timezone.now().timestamp())
+    added, updated, removed = await cache_owner_workflows(github_username, workflows, old_keys)
     logger.info(
         f"{len(workflows)} workflow(s) now in GitHub user's {github_username}'s workflow cache (added {added}, updated {updated}, removed {removed})")
 
 
-async def refresh_online_user_orgs_workflow_cache():
-    users = await sync_to_async(User.objects.all)()
-    online = await sync_to_async(filter_online)(users)
+async def refresh_online_user_orgs_workflow_cache() -> Dict[str, Tuple[int, List[str]]]:
+    online = await sync_to_async(list_online_users)()
+
+    # group online users by organization, so each organization is scraped once (rather than once per member)
+    members = dict()
     for user in online:
-        profile = await sync_to_async(Profile.objects.get)(user=user)
-        github_organizations = await get_user_github_organizations(user)
-        logger.info(f"Refreshing workflow cache for online user {user.username}'s {len(online)} organizations")
-        for org in github_organizations:
-            await refresh_org_workflow_cache(org['login'], profile.github_token)
+        try:
+            github_organizations = await get_user_github_organizations(user)
+        except ratelimit.RateLimited as e:
+            logger.warning(f"Skipping user {user.username}'s organizations: {e}")
+            continue
+        for org in github_organizations: members.setdefault(org['login'], []).append(user.username)
+
+    logger.info(f"Refreshing workflow cache for {len(members)} organization(s) of {len(online)} online user(s)")
+    return await refresh_orgs_workflow_cache(members)
+
+
+async def is_workflow_cache_fresh(owner: str) -> bool:
+    # a little slack, so owners refreshed during the previous periodic run aren't skipped this time around
+    window = int(settings.WORKFLOWS_REFRESH_MINUTES) * 60 * 0.9
+    updated = await RedisClient.get_async().get(f"workflows_updated/{owner}")
+    return updated is not None and timezone.now().timestamp() - float(updated) < window
+
+
+async def refresh_orgs_workflow_cache(members: Dict[str, List[str]], force: bool = False) -> Dict[str, Tuple[int, List[str]]]:
+    """
+    Refreshes the workflow cache for each of the given organizations at most once per freshness window,
+    trying each member's GitHub token in turn until one succeeds.
+
+    Args:
+        members: Usernames of (online) organization members, keyed by organization name
+        force: Whether to refresh organizations even if their cache is still fresh
+
+    Returns:
+        The organizations that couldn't be refreshed because every member's rate limit budget is exhausted,
+        with the seconds until the soonest budget resets and the members to try then
+    """
+
+    redis = RedisClient.get_async()
+    deferred = dict()
+    for org_name, usernames in members.items():
+        if not force and await is_workflow_cache_fresh(org_name):
+            logger.debug(f"Workflow cache for organization {org_name} is fresh, skipping")
+            continue
+
+        # claim the refresh, in case another worker is already on it
+        claim = f"workflows_refreshing/{org_name}"
+        if not await redis.set(claim, 1, nx=True, ex=int(settings.WORKFLOWS_REFRESH_MINUTES) * 60):
+            logger.debug(f"Workflow cache for organization {org_name} is already being refreshed, skipping")
+            continue
+
+        try:
+            retry_after = None
+            for username in usernames:
+                profile = await sync_to_async(Profile.objects.get)(user__username=username)
+                if profile.github_token is None or profile.github_token == '': continue
+                try:
+                    await refresh_org_workflow_cache(org_name, profile.github_token)
+                    retry_after = None
+                    break
+                except ratelimit.RateLimited as e:
+                    retry_after = e.retry_after if retry_after is None else min(retry_after, e.retry_after)
+                except:
+                    logger.warning(f"Failed to refresh organization {org_name}'s workflows with user {username}'s token: {traceback.format_exc()}")
+            if retry_after is not None:
+                logger.warning(f"Deferring workflow cache refresh for organization {org_name} by {retry_after}s")
+                deferred[org_name] = (retry_after, usernames)
+        finally:
+            await redis.delete(claim)
+
+    return deferred
 
 
 async def refresh_org_workflow_cache(org_name: str, github_token: str):
     # scrape GitHub to synchronize repos and workflow config
     workflows = await github.list_connectable_repos_by_org(org_name, github_token)
 
-    # update the cache, first removing workflows that no longer exist
-    redis = RedisClient.get()
-    removed = 0
-    updated = 0
-    added = 0
-    old_keys = [key.decode('utf-8') for key in redis.scan_iter(match=f"workflows/{org_name}/*")]
-    new_keys = [f"workflows/{org_name}/{wf['repo']['name']}/{wf['branch']['name']}" for wf in workflows]
-    for old_key in old_keys:
-        if old_key not in new_keys:
-            logger.debug(f"Removing org workflow {old_key}")
-            removed += 1
-            redis.delete(old_key)
-        else:
-            logger.debug(f"Updating org workflow {old_key}")
-            updated += 1
+    added, updated, removed = await cache_owner_workflows(org_name, workflows)
+    logger.info(
+        f"{len(workflows)} workflow(s) now in GitHub organization {org_name}'s workflow cache (added {added}, updated {updated}, removed {removed})")
+
+
+async def cache_owner_workflows(owner: str, workflows: List[dict], old_keys: List[str] = None) -> Tuple[int, int, int]:
+    """
+    Replaces the given owner's cached workflows with those just scraped from GitHub, in a few round trips.
+
+    Args:
+        owner: The GitHub user or organization name
+        workflows: The owner's workflows
+        old_keys: The cache keys of the owner's currently cached workflows (looked up if not provided)
+
+    Returns:
+        How many workflows were added, updated and removed
+    """
 
-    # ...then adding/updating the workflows we just scraped
+    if old_keys is None: old_keys = await sync_to_async(catalog.list_owner_keys)(owner)
+    featured = await sync_to_async(lambda: set(FeaturedWorkflow.objects.filter(owner=owner).values_list('name', 'branch')))()
+    new = dict()
     for wf in workflows:
         # set flag if this is a featured workflow
-        wf['featured'] = await is_featured(org_name, wf['repo']['name'], wf['branch']['name'])
+        wf['featured'] = (wf['repo']['name'], wf['branch']['name']) in featured
+        new[f"workflows/{owner}/{wf['repo']['name']}/{wf['branch']['name']}"] = del_none(wf)
 
-        key = f"workflows/{org_name}/{wf['repo']['name']}/{wf['branch']['name']}"
-        if key not in old_keys:
-            logger.debug(f"Adding org workflow {key}")
-            added += 1
-        redis.set(key, json.dumps(del_none(wf)))
+    # first remove workflows that no longer exist, then add/update those we just scraped
+    # (catalog writes are synchronous, since views use them too, so keep them off the event loop)
+    stale = [key for key in old_keys if key not in new]
+    await sync_to_async(catalog.remove_workflows)(stale)
+    await sync_to_async(catalog.put_workflows)(new)
+    await RedisClient.get_async().set(f"workflows_updated/{owner}", timezone.now().timestamp())
 
-    redis.set(f"workflows_updated/{org_name}", timezone.now().timestamp())
-    logger.info(
-        f"{len(workflows)} workflow(s) now in GitHub organization {org_name}'s workflow cache (added {added}, updated {updated}, removed {removed})")
+    added = len([key for key in new.keys() if key not in old_keys])
+    return added, len(old_keys) - len(stale), len(stale)
+
+
+def get_github_token(*github_usernames: str) -> str:
+    """
+    Picks a GitHub token to act on behalf of the given users (in order of preference),
+    falling back to the platform token if none of them has linked their GitHub account.
+    """
+
+    for github_username in github_usernames:
+        if github_username is None or github_username == '': continue
+        profile = Profile.objects.filter(github_username=github_username).exclude(github_token='').first()
+        if profile is not None: return profile.github_token
+    return settings.GITHUB_TOKEN
+
+
+def invalidate_workflow_configs(owner: str, name: str, branch: str = None):
+    # invalidate submission config caches (for all users) for the given repo (or just one of its branches)
+    keys = catalog.list_config_keys(owner, name, branch)
+    if len(keys) == 0: return
+    logger.info(f"Removing {len(keys)} cached workflow configuration(s) for {owner}/{name}{'' if branch is None else f'/{branch}'}")
+    catalog.remove_configs(keys)
+
+
+async def refresh_workflow_branch_cache(owner: str, name: str, branch: str, github_token: str, org: bool = False):
+    # scrape only the given branch
+    workflow = await github.get_connectable_repo_branch(owner, name, branch, github_token, org)
+
+    key = catalog.workflow_key(owner, name, branch)
+    await sync_to_async(invalidate_workflow_configs)(owner, name, branch)
+
+    if workflow is None:
+        logger.info(f"No workflow on {owner}/{name}/{branch}, removing it from the cache (if present)")
+        await sync_to_async(catalog.remove_workflow)(key)
+        return
+
+    workflow['featured'] = await is_featured(owner, name, branch)
+    await sync_to_async(catalog.put_workflow)(key, del_none(workflow))
+    logger.info(f"Refreshed workflow {key}")
+
+
+async def refresh_workflow_repo_cache(owner: str, name: str, github_token: str, org: bool = False):
+    # scrape every branch of the given repo
+    workflows = await github.list_connectable_repo_branches(owner, name, github_token, org)
+
+    old_keys = await sync_to_async(catalog.list_owner_keys)(owner, name)
+    new_keys = [catalog.workflow_key(owner, name, wf['branch']['name']) for wf in workflows]
+    await sync_to_async(invalidate_workflow_configs)(owner, name)
+
+    stale = [old_key for old_key in old_keys if old_key not in new_keys]
+    for old_key in stale: logger.debug(f"Removing workflow {old_key}")
+    await sync_to_async(catalog.remove_workflows)(stale)
+
+    new = dict()
+    for key, wf in zip(new_keys, workflows):
+        wf['featured'] = await is_featured(owner, name, wf['branch']['name'])
+        new[key] = del_none(wf)
+    await sync_to_async(catalog.put_workflows)(new)
+
+    logger.info(f"{len(workflows)} workflow(s) now in cache for repo {owner}/{name}")
+
+
+def remove_workflow_cache(owner: str, name: str, branch: str = None):
+    # remove the given repo's (or just one of its branch's) workflows from the cache
+    keys = [catalog.workflow_key(owner, name, branch)] if branch is not None else catalog.list_owner_keys(owner, name)
+    for key in keys:
+        logger.info(f"Removing workflow {key}")
+        catalog.remove_workflow(key)
+    invalidate_workflow_configs(owner, name, branch)
 
 
 def list_public_workflows() -> List[dict]:
-    redis = RedisClient.get()
-    workflows = [wf for wf in [json.loads(redis.get(key)) for key in redis.scan_iter(match='workflows/*')] if
-                 'public' in wf['config'] and wf['config']['public']]
-    return workflows
+    return catalog.list_public_catalog()
 
 
 def list_user_workflows(owner: str) -> List[dict]:
-    redis = RedisClient.get()
-    return [json.loads(redis.get(key)) for key in redis.scan_iter(match=f"workflows/{owner}/*")]
+    return catalog.list_indexed_workflows(catalog.owner_index(owner))
 
 
 async def list_user_org_workflows(user: User) -> Dict[str, List[dict]]:
@@ -190,14 +307,11 @@ def list_user_project_workflows(user: User) -> Dict[str, List[dict]]:
 
 
 def list_org_workflows(organization: str) -> List[dict]:
-    redis = RedisClient.get()
-    return [json.loads(redis.get(key)) for key in redis.scan_iter(match=f"workflows/{organization}/*")]
+    return catalog.list_indexed_workflows(catalog.owner_index(organization))
 
 
 def list_project_workflows(project: Investigation) -> List[dict]:
-    redis = RedisClient.get()
-    proj_dict = project_to_dict(project)
-    return [json.loads(wf) for wf in [redis.get(key) for key in [f"workflows/{name}" for name in proj_dict['workflows']]] if wf is not None]
+    return get_project_workflows(project)
 
 
 async def get_workflow(
@@ -207,23 +321,32 @@ async def get_workflow(
         github_token: str,
         cyverse_token: str,
         invalidate: bool = False) -> dict:
-    redis = RedisClient.get()
-    updated = redis.get(f"workflows_updated/{owner}")
-    workflow = redis.get(f"workflows/{owner}/{name}/{branch}")
+    key = catalog.workflow_key(owner, name, branch)
+
+    # catalog reads are synchronous, so keep them off the event loop
+    @sync_to_async
+    def read():
+        workflow = catalog.get_cached_workflow(key)
+        return None if workflow is None else (workflow, catalog.get_workflow_age(key))
 
-    if updated is None or workflow is None or invalidate:
+    async def compute():
         bundle = await github.get_repo_bundle(owner, name, branch, github_token, cyverse_token)
         workflow = {
             'config': bundle['config'],
             'repo': bundle['repo'],
             'validation': bundle['validation'],
             'branch': branch,
-            'featured': FeaturedWorkflow.objects.filter(owner=owner, name=name, branch=branch).exists()
+            'featured': await is_featured(owner, name, branch)
         }
-        redis.set(f"workflows/{owner}/{name}/{branch}", json.dumps(del_none(workflow)))
+        await sync_to_async(catalog.put_workflow)(key, del_none(workflow))
         return workflow
-    else:
-        return json.loads(workflow)
+
+    # serve from the cache, refreshing in the background if stale (concurrent fetches of the same workflow are shared)
+    max_age = int(settings.WORKFLOWS_REFRESH_MINUTES) * 60
+    workflow = await singleflight.stale_while_revalidate(key, read, compute, max_age, invalidate)
+
+    # callers may share the result, so give each its own copy to modify
+    return dict(workflow)
 
 
 def list_users(invalidate: bool = False) -> List[dict]:
@@ -231,8 +354,8 @@ def list_users(invalidate: bool = False) -> List[dict]:
     updated = redis.get(f"users_updated")
 
     # repopulate if empty or invalidation requested
-    if updated is None or len(list(redis.scan_iter(match=f"users/*"))) == 0 or invalidate:
-        refresh_user_cache()
+    if updated is None or not redis.exists(USERS_KEY) or invalidate:
+        async_to_sync(refresh_user_cache)(force=bool(invalidate))
     else:
         age = (datetime.now() - datetime.fromtimestamp(float(updated)))
         age_secs = age.total_seconds()
@@ -240,19 +363,66 @@ def list_users(invalidate: bool = False) -> List[dict]:
 
         # otherwise only if stale
         if age_secs > max_secs:
-            logger.info(f"User cache is stale ({age_secs}s old, {age_secs - max_secs}s past limit), repopulating")
-            refresh_user_cache()
+            logger.info(f"User cache is stale ({age_secs}s old, {age_secs - max_secs}s past limit), refreshing")
+            async_to_sync(refresh_user_cache)()
 
-    return [json.loads(redis.get(key)) for key in redis.scan_iter(match=f"users/*")]
+    return [json.loads(bundle) for bundle in redis.hgetall(USERS_KEY).values()]
 
 
-def refresh_user_cache():
-    logger.info(f"Refreshing user cache")
-    redis = RedisClient.get()
-    for user in list(User.objects.all().exclude(profile__isnull=True)):
-        bundle = get_user_bundle(user)
-        redis.set(f"users/{user.username}", json.dumps(bundle))
-    RedisClient.get().set(f"users_updated", timezone.now().timestamp())
+# the user directory is kept in one hash (username -> bundle) alongside another tracking when (and from what) each bundle was built
+USERS_KEY = 'users'
+USERS_META_KEY = 'users_meta'
+
+
+def get_user_fingerprint(user: User, profile: Profile) -> str:
+    # the fields a user's bundle is built from, so we can tell when it needs rebuilding
+    return f"{user.first_name}|{user.last_name}|{profile.github_username}|{has_github_info(profile)}"
+
+
+async def refresh_user_cache(force: bool = False):
+    """
+    Refreshes the user directory, rebuilding only bundles whose user's profile changed or whose GitHub info is stale
+    (unless `force` is set). GitHub info is retrieved concurrently, up to `USERS_REFRESH_CONCURRENCY` users at a time.
+
+    Args:
+        force: Whether to rebuild every bundle
+    """
+
+    redis = RedisClient.get_async()
+    users = await sync_to_async(lambda: list(User.objects.all().exclude(profile__isnull=True).select_related('profile')))()
+    meta = {username.decode('utf-8'): json.loads(m) for username, m in (await redis.hgetall(USERS_META_KEY)).items()}
+    now = timezone.now().timestamp()
+    max_secs = int(settings.USERS_REFRESH_MINUTES) * 60
+
+    def is_stale(user: User) -> bool:
+        m = meta.get(user.username, None)
+        if force or m is None or m['fingerprint'] != get_user_fingerprint(user, user.profile): return True
+        return has_github_info(user.profile) and now - m['updated'] > max_secs
+
+    stale = [user for user in users if is_stale(user)]
+    removed = set(meta.keys()) - set([user.username for user in users])
+    logger.info(f"Refreshing user cache ({len(stale)} of {len(users)} user(s) changed or stale, {len(removed)} removed)")
+
+    semaphore = asyncio.Semaphore(int(settings.USERS_REFRESH_CONCURRENCY))
+
+    async def refresh(user: User):
+        async with semaphore:
+            try: return user, await build_user_bundle(user, user.profile)
+            except:
+                # keep the old bundle (if any), we'll try again next refresh
+                logger.warning(f"Failed to refresh bundle for user {user.username}: {traceback.format_exc()}")
+                return user, None
+
+    pipeline = redis.pipeline()
+    for user, bundle in await asyncio.gather(*[refresh(user) for user in stale]):
+        if bundle is None: continue
+        pipeline.hset(USERS_KEY, user.username, json.dumps(bundle))
+        pipeline.hset(USERS_META_KEY, user.username, json.dumps({'fingerprint': get_user_fingerprint(user, user.profile), 'updated': now}))
+    if len(removed) > 0:
+        pipeline.hdel(USERS_KEY, *removed)
+        pipeline.hdel(USERS_META_KEY, *removed)
+    pipeline.set(f"users_updated", now)
+    await pipeline.execute()
 
 
 def has_github_info(profile: Profile):
@@ -262,6 +432,24 @@ def has_github_info(profile: Profile):
            profile.github_username != ''
 
 
+async def build_user_bundle(user: User, profile: Profile) -> dict:
+    bundle = {
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+    }
+    if not has_github_info(profile): return bundle
+
+    github_profile, github_organizations = await asyncio.gather(get_user_github_profile(user), get_user_github_organizations(user))
+    if 'login' not in github_profile: return bundle
+    return {
+        **bundle,
+        'github_username': profile.github_username,
+        'github_profile': github_profile,
+        'github_organizations': github_organizations,
+    }
+
+
 def get_user_bundle(user: User):
     profile = Profile.objects.get(user=user)
     if not has_github_info(profile):
@@ -272,24 +460,22 @@ def get_user_bundle(user: User):
         }
     else:
         redis = RedisClient.get()
-        cached = redis.get(f"users/{user.username}")
+        cached = redis.hget(USERS_KEY, user.username)
         if cached is not None: return json.loads(cached)
-        github_profile = async_to_sync(get_user_github_profile)(user)
-        github_organizations = async_to_sync(get_user_github_organizations)(user)
-        bundle = {
-            'username': user.username,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'github_username': profile.github_username,
-            'github_profile': github_profile,
-            'github_organizations': github_organizations,
-        } if 'login' in github_profile else {
-            'username': user.username,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-        }
-        redis.set(f"users/{user.username}", json.dumps(bundle))
-        return bundle
+
+        def reload():
+            cached = redis.hget(USERS_KEY, user.username)
+            return None if cached is None else json.loads(cached)
+
+        async def compute():
+            bundle = await build_user_bundle(user, profile)
+            await RedisClient.get_async().pipeline() \
+                .hset(USERS_KEY, user.username, json.dumps(bundle)) \
+                .hset(USERS_META_KEY, user.username, json.dumps({'fingerprint': get_user_fingerprint(user, profile), 'updated': timezone.now().timestamp()})) \
+                .execute()
+            return bundle
+
+        return dict(async_to_sync(singleflight.do)(f"users/{user.username}", compute, reload))
 
 
 def get_managed_files(user: User, page: int = 1):
@@ -589,6 +775,7 @@ def refresh_user_cyverse_tokens(user: User):
     user.profile.cyverse_refresh_token = refresh_token
     user.profile.save()
     user.save()
+    sessions.record_session(user.username, access_token)
 
 
 async def get_user_github_profile(user: User) -> dict:
@@ -652,52 +839,107 @@ def get_triggered_tasks(user: User):
     return [triggered_task_to_dict(task) for task in TriggeredTask.objects.filter(user=user, enabled=True)]
 
 
-@sync_to_async
-def filter_tasks(user: User, completed: bool = None):
-    if completed is not None and completed:
-        tasks = Task.objects.filter(user=user, completed__isnull=False)
-    else:
-        tasks = Task.objects.filter(user=user)
-    return list(tasks)
+def get_user_github_section(user: User) -> dict:
+    profile = Profile.objects.get(user=user)
+    if not has_github_info(profile): return {'github_profile': None, 'organizations': []}
+    try:
+        return {
+            'github_profile': async_to_sync(get_user_github_profile)(user),
+            'organizations': async_to_sync(get_user_github_organizations)(user),
+            'user_workflows': list_user_workflows(profile.github_username),
+            'org_workflows': async_to_sync(list_user_org_workflows)(user),
+        }
+    except:
+        logger.warning(f"Failed to load Github info for user {user.username}: {traceback.format_exc()}")
+        return {'github_profile': None, 'organizations': []}
 
 
-@sync_to_async
-def filter_agents(user: User = None, guest: User = None):
-    if user is not None and guest is None:
-        return list(Agent.objects.filter(user=user))
-    elif user is None and guest is not None:
-        return list(Agent.objects.filter(users_authorized__username=guest.username))
-    else:
-        raise ValueError(f"Expected either user or guest to be None")
+class CyVerseProfileUnavailable(Exception):
+    def __init__(self, error: Exception):
+        super().__init__(f"Failed to load CyVerse profile: {error}")
+        self.error = error
+
+
+def get_user_cyverse_section(user: User) -> dict:
+    if user.profile.cyverse_access_token == '': return None
+
+    # distinguish CyVerse failures from other sections' (the user's CyVerse session may need ending)
+    try: return get_user_cyverse_profile(user)
+    except (HTTPError, ValueError) as e: raise CyVerseProfileUnavailable(e) from e
+
+
+# section name -> (function computing it for a given user, seconds to cache it for, cache tags)
+USER_SECTIONS = {
+    'stats': (lambda user: async_to_sync(get_user_statistics)(user), 300, ['tasks/{username}', 'agents']),
+    'users': (lambda user: list_users(), 300, []),
+    'tasks': (lambda user: get_tasks(user, page=1), 10, ['tasks/{username}']),
+    'delayed_tasks': (get_delayed_tasks, 10, ['scheduled_tasks/{username}']),
+    'repeating_tasks': (get_repeating_tasks, 10, ['scheduled_tasks/{username}']),
+    'triggered_tasks': (get_triggered_tasks, 10, ['scheduled_tasks/{username}']),
+    'notifications': (lambda user: get_notifications(user, page=1), 10, ['notifications/{username}']),
+    'agents': (get_agents, 60, ['agents']),
+    'public_workflows': (lambda user: list_public_workflows(), 60, []),
+    'project_workflows': (list_user_project_workflows, 60, ['projects']),
+    'projects': (get_user_projects, 60, ['projects']),
+    'cyverse_profile': (get_user_cyverse_section, 300, []),
+    'github': (get_user_github_section, 300, []),
+}
+
+# sections requiring calls to external services, which may be loaded separately so they don't hold up the rest
+EXTERNAL_USER_SECTIONS = ['cyverse_profile', 'github']
+
+
+def get_user_section(user: User, section: str, invalidate: bool = False):
+    compute, ttl, tags = USER_SECTIONS[section]
+    key = f"user_sections/{user.username}/{section}"
+    cached = None if invalidate else querycache.get(key, ttl)
+    if cached is not None: return json.loads(cached)
+
+    # return what we cached (e.g., dates as ISO strings), so hits and misses look the same
+    serialized = querycache.put(key, compute(user), ttl, [tag.format(username=user.username) for tag in tags])
+    return json.loads(serialized)
+
+
+def get_user_sections(user: User, sections: List[str], invalidate: bool = False) -> dict:
+    """
+    Computes the given sections of the user's bootstrap payload concurrently (up to `USER_SECTIONS_CONCURRENCY`
+    at a time, since each thread holds its own database connection), each cached independently.
+
+    Args:
+        user: The user
+        sections: The section names (see `USER_SECTIONS`)
+        invalidate: Whether to ignore cached sections
+
+    Returns:
+        A dictionary mapping section names to their values
+    """
+
+    def compute(section):
+        try: return get_user_section(user, section, invalidate)
+        finally:
+            # each thread gets its own database connection, which would otherwise be left open
+            db.connections.close_all()
+
+    if len(sections) == 0: return dict()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(sections), int(settings.USER_SECTIONS_CONCURRENCY))) as executor:
+        futures = {section: executor.submit(compute, section) for section in sections}
+        return {section: future.result() for section, future in futures.items()}
 
 
 def filter_online(users: List[User]) -> List[User]:
     """
-    Selects only those users currently online by checking their Terrain token expiry times
+    Selects only those users currently online (see `plantit.sessions`)
 
     :param users: The list of users
     :return: The logged-in users
     """
 
-    online = []
-    for user in users:
-        decoded_token = jwt.decode(user.profile.cyverse_access_token, options={
-            'verify_signature': False,
-            'verify_aud': False,
-            'verify_iat': False,
-            'verify_exp': False,
-            'verify_iss': False
-        })
-        exp = datetime.fromtimestamp(decoded_token['exp'], timezone.utc)
-        now = datetime.now(tz=timezone.utc)
+    online = set(sessions.list_online())
+    return [user for user in users if user.username in online]
 
-        if now > exp:
-            print(f"Session for {decoded_token['preferred_username']} expired at {exp.isoformat()}")
-        else:
-            print(f"Session for {decoded_token['preferred_username']} valid until {exp.isoformat()}")
-            online.append(user)
 
-    return online
+def list_online_users() -> List[User]:
+    return list(User.objects.filter(username__in=sessions.list_online()))
 
 
 @sync_to_async
@@ -716,9 +958,7 @@ def notification_to_dict(notification: Notification) -> dict:
 
 
 def get_last_task_config(username, owner, name, branch):
-    redis = RedisClient.get()
-    last_config = redis.get(f"workflow_configs/{username}/{owner}/{name}/{branch}")
-    return None if last_config is None else json.loads(last_config)
+    return catalog.get_config(username, owner, name, branch)
 
 
 @sync_to_async
@@ -726,16 +966,6 @@ def get_task_user(task: Task):
     return task.user
 
 
-@sync_to_async
-def get_task_agent(task: Task):
-    return task.agent
-
-
-@sync_to_async
-def get_task_project(task: Task):
-    return task.project
-
-
 @sync_to_async
 def check_user_authentication(user):
     return user.is_authenticated
@@ -798,207 +1028,174 @@ def count_institutions():
     return list(Profile.objects.exclude(institution__exact='').values('institution').annotate(Count('institution')))
 
 
+INSTITUTIONS_KEY = 'institutions'
+
+
 def get_institutions(invalidate: bool = False) -> dict:
     redis = RedisClient.get()
-    cached = list(redis.scan_iter(match=f"institutions/*"))
-    institutions = dict()
+    if not invalidate: return {name.decode('utf-8'): json.loads(institution) for name, institution in redis.hgetall(INSTITUTIONS_KEY).items()}
 
-    if invalidate:
-        # count members per institution
-        counts = {i['institution'].lower(): i['institution__count'] for i in count_institutions()}
-
-        for k in counts.keys():
-            # get institution information (TODO: can we send all the requests concurrently?)
-            # TODO: need to make sure this doesn't exceed the free plan rate limit
-            result = async_to_sync(mapbox.get_institution)(k, settings.MAPBOX_TOKEN)
-
-            # reconstruct institution name with proper capitalization from Mapbox result
-            # TODO: are there any edge cases this might fail for?
-            name = ' '.join(result['query'])
-
-            # if we can't match the institution name, skip it
-            if name not in counts:
-                logger.warning(f"Failed to match {name} to any institution")
-                continue
-
-            # number of members in this institution
-            count = counts[name]
-
-            # if Mapbox returned no results, we can't return geocode information
-            if len(result['features']) == 0:
-                logger.warning(f"No results from Mapbox for institution: {name}")
-                institutions[name] = {
-                    'institution': name,
-                    'count': count,
-                    'geocode': None
-                }
-
-            # if we got results, pick the top one
-            else:
-                feature = result['features'][0]
-                feature['id'] = name
-                feature['properties'] = {
-                    'name': name,
-                    'count': count
-                }
-                institutions[name] = {
-                    'institution': name,
-                    'count': count,
-                    'geocode': feature
-                }
-
-        for name, institution in institutions.items(): redis.set(f"institutions/{name}", json.dumps(institution))
-    else:
-        for institution in cached:
-            if institution is not None:
-                institutions[institution.decode('utf-8')] = json.loads(redis.get(institution))
+    # count members per institution
+    counts = {i['institution'].lower(): i['institution__count'] for i in count_institutions()}
 
-    return institutions
+    # get institution information (only new institutions are looked up, see `plantit.geocodes`)
+    entries = geocodes.geocode(list(counts.keys()), settings.MAPBOX_TOKEN)
 
+    institutions = dict()
+    for name, count in counts.items():
+        entry = entries.get(name, None)
 
-def get_total_counts(invalidate: bool = False) -> dict:
-    redis = RedisClient.get()
-    cached = redis.get("stats_counts")
-
-    if cached is None or invalidate:
-        users = User.objects.count()
-        online = len(filter_online(User.objects.all()))  # TODO store this in the DB each time the user logs in
-        wfs = [json.loads(redis.get(key)) for key in redis.scan_iter(match='workflows/*')]
-        devs = list(set([wf['repo']['owner']['login'] for wf in wfs]))
-        workflows = len(wfs)
-        developers = len(devs)
-        agents = Agent.objects.count()
-        tasks = TaskCounter.load().count
-        running = len(list(Task.objects.exclude(status__in=[TaskStatus.COMPLETED, TaskStatus.FAILURE, TaskStatus.TIMEOUT, TaskStatus.CANCELED])))
-        institutions = len(get_institutions().keys())
-        counts = {
-            'users': users,
-            'online': online,
-            'workflows': workflows,
-            'developers': developers,
-            'agents': agents,
-            'tasks': tasks,
-            'running': running,
-            'institutions': institutions
-        }
+        # if we can't match the institution name, skip it
+        if entry is not None and not entry['matched']:
+            logger.warning(f"Failed to match {name} to any institution")
+            continue
 
-        redis.set("stats_counts", json.dumps(counts))
-    else:
-        counts = json.loads(cached)
+        # if Mapbox returned no results (or the lookup failed), we can't return geocode information
+        if entry is None or entry['feature'] is None:
+            logger.warning(f"No results from Mapbox for institution: {name}")
+            institutions[name] = {
+                'institution': name,
+                'count': count,
+                'geocode': None
+            }
 
-    return counts
+        # if we got results, use the top one
+        else:
+            feature = {**entry['feature'], 'id': name, 'properties': {'name': name, 'count': count}}
+            institutions[name] = {
+                'institution': name,
+                'count': count,
+                'geocode': feature
+            }
+
+    pipeline = redis.pipeline()
+    pipeline.delete(INSTITUTIONS_KEY)
+    if len(institutions) > 0: pipeline.hset(INSTITUTIONS_KEY, mapping={name: json.dumps(institution) for name, institution in institutions.items()})
+    pipeline.execute()
+    return institutions
 
 
-def get_aggregate_timeseries(invalidate: bool = False) -> dict:
-    redis = RedisClient.get()
-    cached = redis.get("total_timeseries")
-
-    if cached is None or invalidate:
-        users_total = get_users_total_timeseries()
-        tasks_total = get_tasks_total_timeseries()
-        tasks_usage = get_tasks_usage_timeseries()
-        workflows_usage = get_workflows_usage_timeseries()
-        agents_usage = get_agents_usage_timeseries()
-        series = {
-            'users_total': users_total,
-            'tasks_total': tasks_total,
-            'tasks_usage': tasks_usage,
-            'agents_usage': agents_usage,
-            'workflows_usage': workflows_usage,
-        }
+@querycache.cached('stats_counts', ttl=300, tags=['tasks', 'agents', userstats.TOTALS_TAG])
+def get_total_counts(invalidate: bool = False) -> dict:
+    users = User.objects.count()
+    online = sessions.count_online()
+    workflows = catalog.count_workflows()
+    developers = catalog.count_developers()
+    agents = Agent.objects.count()
+    tasks = TaskCounter.load().count
+    running = userstats.get_totals()['running']
+    institutions = len(get_institutions().keys())
+    return {
+        'users': users,
+        'online': online,
+        'workflows': workflows,
+        'developers': developers,
+        'agents': agents,
+        'tasks': tasks,
+        'running': running,
+        'institutions': institutions
+    }
 
-        redis.set("total_timeseries", json.dumps(series))
-    else:
-        series = json.loads(cached)
 
-    return series
+@querycache.cached('total_timeseries', ttl=3600, tags=['tasks', 'agents'])
+def get_aggregate_timeseries(invalidate: bool = False) -> dict:
+    users_total = get_users_total_timeseries()
+    tasks_total = get_tasks_total_timeseries()
+    tasks_usage = get_tasks_usage_timeseries()
+    workflows_usage = get_workflows_usage_timeseries()
+    agents_usage = get_agents_usage_timeseries()
+    return {
+        'users_total': users_total,
+        'tasks_total': tasks_total,
+        'tasks_usage': tasks_usage,
+        'agents_usage': agents_usage,
+        'workflows_usage': workflows_usage,
+    }
 
 
+@querycache.cached('user_timeseries/{user.username}', ttl=3600, tags=['tasks/{user.username}', 'agents'])
 def get_user_timeseries(user: User, invalidate: bool = False) -> dict:
-    redis = RedisClient.get()
-    cached = redis.get(f"user_timeseries/{user.username}")
-
-    if cached is None or invalidate:
-        tasks_usage = get_tasks_usage_timeseries(user=user)
-        workflows_usage = get_workflows_usage_timeseries(user)
-        agents_usage = get_agents_usage_timeseries(user)
-        series = {
-            'tasks_usage': tasks_usage,
-            'agents_usage': agents_usage,
-            'workflows_usage': workflows_usage
-        }
-
-        redis.set(f"user_timeseries/{user.username}", json.dumps(series))
-    else:
-        series = json.loads(cached)
-
-    return series
+    tasks_usage = get_tasks_usage_timeseries(user=user)
+    workflows_usage = get_workflows_usage_timeseries(user)
+    agents_usage = get_agents_usage_timeseries(user)
+    return {
+        'tasks_usage': tasks_usage,
+        'agents_usage': agents_usage,
+        'workflows_usage': workflows_usage
+    }
 
 
 def get_users_total_timeseries() -> List[Tuple[str, int]]:
-    return [(user.profile.created.isoformat(), i + 1) for i, user in enumerate(User.objects.all().order_by('profile__created'))]
+    created = Profile.objects.order_by('created').values_list('created', flat=True)
+    return [(c.isoformat(), i + 1) for i, c in enumerate(created)]
 
 
 def get_tasks_total_timeseries() -> List[Tuple[str, int]]:
-    return [(task['created'].isoformat(), i + 1) for i, task in enumerate(Task.objects.all().values('created').order_by('created'))]
+    # cumulative task count at the end of each (UTC) day with tasks, one point per day rather than one per task,
+    # since it's read from the daily rollups
+    counts = TaskUsage.objects.values('day').annotate(count=Sum('tasks')).order_by('day').values_list('day', 'count')
+    days, counts = zip(*counts) if len(counts) > 0 else ((), ())
+    return list(zip([get_day_timestamp(day) for day in days], np.cumsum(counts).tolist()))
 
 
 # TODO: refactor like below
-def get_tasks_usage_timeseries(interval_seconds: int = 600, user: User = None) -> dict:
+def get_tasks_usage_timeseries(interval_seconds: int = 600, user: User = None, window_days: int = None) -> dict:
     tasks = Task.objects.all() if user is None else Task.objects.filter(user=user).order_by('-completed')[:100]  # TODO make limit configurable
     series = dict()
 
+    # find the running interval for each task (unfinished tasks are running until now)
+    now = timezone.now().timestamp()
+    intervals = [(created.timestamp(), completed.timestamp() if completed is not None else now) for created, completed in tasks.values_list('created', 'completed')]
+
     # return early if no tasks
-    if len(tasks) == 0:
+    if len(intervals) == 0:
         return series
 
-    # find the running interval for each task
-    start_end_times = dict()
-    for task in tasks:
-        start_end_times[task.guid] = (task.created, task.completed if task.completed is not None else timezone.now())
-
     # count the number of running tasks for each value in the time domain
-    start = min([v[0] for v in start_end_times.values()])
-    end = max(v[1] for v in start_end_times.values())
-    for t in range(int(start.timestamp()), int(end.timestamp()), interval_seconds):
-        running = len([1 for k, se in start_end_times.items() if int(se[0].timestamp()) <= t <= int(se[1].timestamp())])
-        series[t] = running
+    starts, ends = np.array(intervals).T
+    window_start = None if window_days is None else int(now - window_days * 24 * 60 * 60)
+    ticks, running = timeseries.count_running(starts, ends, interval_seconds, window_start)
+    series = dict(zip(ticks.tolist(), running.tolist()))
+    if len(series) == 0:
+        return series
 
     # smooth timeseries with LOESS regression
     series_keys = list(series.keys())
     series_frame = pd.DataFrame({'X': series_keys, 'Y': list(series.values())})
     smoothed_frame = loess.regress(series_frame, bandwidth=int(interval_seconds / 5), num_pts=int(len(series_keys) / 2))
-    series = {datetime.fromtimestamp(row['X']).isoformat(): row['Y'] for i, row in smoothed_frame.iterrows()}
+    series = {datetime.fromtimestamp(x).isoformat(): y for x, y in zip(smoothed_frame['X'].tolist(), smoothed_frame['Y'].tolist())}
 
     return series
 
 
-def get_workflow_usage_timeseries(owner: str, name: str, branch: str, invalidate: bool = False) -> dict:
-    redis = RedisClient.get()
-    cached = redis.get(f"workflow_timeseries/{owner}/{name}/{branch}")
-
-    if cached is None or invalidate:
-        series = dict()
-        tasks = Task.objects.filter(
-            workflow__repo__owner=owner,
-            workflow__repo__name=name,
-            workflow__repo__branch=branch)
-
-        # return early if no tasks
-        if len(tasks) == 0:
-            return series
-
-        # count tasks per workflow
-        for task in tasks:
-            timestamp = datetime.combine(task.created.date(), datetime.min.time()).isoformat()
-            if timestamp not in series: series[timestamp] = 0
-            series[timestamp] = series[timestamp] + 1
-
-        redis.set(f"workflow_timeseries/{owner}/{name}/{branch}", json.dumps(series))
-    else:
-        series = json.loads(cached)
+def count_tasks_by_day(usage, *fields):
+    """
+    Counts tasks per (UTC) creation date from the given daily usage rollups, grouped by the given fields as well.
 
-    return series
+    Args:
+        usage: The rollups (`TaskUsage` queryset)
+        fields: Other fields to group by
+
+    Returns:
+        Dicts with the day, the fields' values and the count (days without tasks omitted), most recent first
+    """
+
+    return usage \
+        .order_by() \
+        .values('day', *fields) \
+        .annotate(count=Sum('tasks')) \
+        .filter(count__gt=0) \
+        .order_by('-day')
+
+
+def get_day_timestamp(day: date) -> str:
+    return datetime.combine(day, datetime.min.time()).isoformat()
+
+
+@querycache.cached('workflow_timeseries/{owner}/{name}/{branch}', ttl=3600, tags=['tasks/workflow/{owner}/{name}/{branch}'])
+def get_workflow_usage_timeseries(owner: str, name: str, branch: str, invalidate: bool = False) -> dict:
+    usage = TaskUsage.objects.filter(workflow_owner=owner, workflow_name=name, workflow_branch=branch)
+    return {get_day_timestamp(row['day']): row['count'] for row in count_tasks_by_day(usage)}
 
 
 def get_workflows_usage_timeseries(user: User = None) -> dict:
@@ -1009,138 +1206,141 @@ def get_workflows_usage_timeseries(user: User = None) -> dict:
     start = timezone.now().date() - timedelta(days=window_width_days)
 
     # if a user is provided, filter only tasks owned by that user, otherwise public tasks
-    tasks = Task.objects.filter(workflow__public=True, created__gte=start) if user is None else Task.objects.filter(user=user,
-                                                                                                                    created__gte=start)
-    tasks = tasks.order_by('-created')  # chronological order by start time
+    usage = TaskUsage.objects.filter(workflow_public=True, day__gte=start) if user is None else TaskUsage.objects.filter(user=user, day__gte=start)
 
-    # to store timeseries (key is workflow owner/name/branch, value is series)
-    series = dict()
+    # count tasks per workflow per day, zero-filling days without any (key is workflow owner/name/branch, value is series)
+    days = [start + timedelta(days=n) for n in range(window_width_days + 1)]
+    positions = {day: i for i, day in enumerate(days)}
+    counts = dict()
+    for row in count_tasks_by_day(usage, 'workflow_owner', 'workflow_name', 'workflow_branch'):
+        i = positions.get(row['day'], None)
+        if i is None: continue
+        workflow = f"{row['workflow_owner']}/{row['workflow_name']}/{row['workflow_branch']}"
+        if workflow not in counts: counts[workflow] = [0] * len(days)
+        counts[workflow][i] += row['count']
 
-    # return empty if no tasks
-    if len(tasks) == 0: return series
+    timestamps = [get_day_timestamp(day) for day in days]
+    return {workflow: OrderedDict(zip(timestamps, series)) for workflow, series in counts.items()}
 
-    # loop over days from start date to now and count tasks occurring per workflow on each day
-    dates = [start + timedelta(days=n) for n in range(window_width_days + 1)]
-    for date in dates:
-        # tasks created on this date
-        tasks_today = tasks.filter(created__date=date)
 
-        # count tasks per workflow
-        for task in tasks_today:
-            workflow = f"{task.workflow_owner}/{task.workflow_name}/{task.workflow_branch}"
-            if workflow not in series: series[workflow] = dict()
-            timestamp = datetime.combine(task.created.date(), datetime.min.time()).isoformat()
-            if timestamp not in series[workflow]: series[workflow][timestamp] = 0
-            series[workflow][timestamp] = series[workflow][timestamp] + 1
+def get_agent_usage_timeseries(name) -> dict:
+    usage = TaskUsage.objects.filter(agent=name)
+    return {get_day_timestamp(row['day']): row['count'] for row in count_tasks_by_day(usage)}
 
-    # sort dictionary by keys (dates)
-    for key in series.keys():
-        series[key] = OrderedDict(sorted(series[key].items(), key=lambda x: x[0]))
 
+def get_agents_usage_timeseries(user: User = None) -> dict:
+    series = dict()
+
+    # a user's series only covers their most recent tasks, few enough to count directly (rollups can't be cut off mid-day)
+    if user is not None:
+        recent = Task.objects.filter(user=user).order_by('-created').values_list('agent__name', 'created')[:100]  # TODO make limit configurable
+        for agent, created in recent:
+            # if task predates our adding agent FK to model, might be None... just skip it
+            if agent is None: continue
+            counts = series.setdefault(agent, dict())
+            timestamp = get_day_timestamp(created.date())
+            counts[timestamp] = counts.get(timestamp, 0) + 1
+        return series
+
+    # public agents' usage by everyone
+    usage = TaskUsage.objects.filter(agent__in=Agent.objects.filter(public=True).values('name'))
+    for row in count_tasks_by_day(usage, 'agent'):
+        series.setdefault(row['agent'], dict())[get_day_timestamp(row['day'])] = row['count']
     return series
 
 
-# TODO: refactor like above
-def get_agent_usage_timeseries(name) -> dict:
-    agent = Agent.objects.get(name=name)
-    tasks = Task.objects.filter(agent=agent).order_by('-created')
-    series = dict()
+USER_STATISTICS_TTL = 3600
 
-    if len(tasks) == 0:
-        return series
 
-    # count tasks per agent
-    for task in tasks:
-        timestamp = datetime.combine(task.created.date(), datetime.min.time()).isoformat()
-        if timestamp not in series: series[timestamp] = 0
-        series[timestamp] = series[timestamp] + 1
+@querycache.cached('stats/{user.username}', ttl=USER_STATISTICS_TTL, tags=['tasks/{user.username}', 'agents'])
+async def get_user_statistics(user: User, invalidate: bool = False) -> dict:
+    key = f"stats/{user.username}"
 
-    return series
+    async def reload():
+        cached = await querycache.get_async(key, USER_STATISTICS_TTL)
+        return None if cached is None else json.loads(cached)
 
+    # statistics are expensive to compute, so share the computation between concurrent callers
+    return dict(await singleflight.do(key, lambda: compute_user_statistics(user), reload))
 
-# TODO: refactor like above
-def get_agents_usage_timeseries(user: User = None) -> dict:
-    tasks = Task.objects.filter(agent__public=True).order_by('-created') if user is None else Task.objects.filter(user=user).order_by('-created')[
-                                                                                              :100]
-    series = dict()
 
-    # return early if no tasks
-    if len(tasks) == 0:
-        return series
+def get_user_task_aggregates(user: User) -> dict:
+    """
+    Aggregates the given user's tasks by workflow, agent and project (and totals their count and runtime)
+    in a handful of queries, rather than visiting each task and its related rows in turn.
 
-    # count tasks per agent
-    for task in tasks:
-        agent = task.agent
+    Args:
+        user: The user
 
-        # if task predates our adding agent FK to model, might be None... just skip it
-        if agent is None:
-            continue
+    Returns:
+        The statistics (the task-based subset of those returned by `get_user_statistics`)
+    """
 
-        if agent.name not in series: series[agent.name] = dict()
-        timestamp = datetime.combine(task.created.date(), datetime.min.time()).isoformat()
-        if timestamp not in series[agent.name]: series[agent.name][timestamp] = 0
-        series[agent.name][timestamp] = series[agent.name][timestamp] + 1
+    tasks = Task.objects.filter(user=user)
+    totals = tasks.aggregate(
+        total=Count('id'),
+        runtime=Sum(ExpressionWrapper(F('completed') - F('created'), output_field=DurationField()), filter=Q(completed__isnull=False)))
 
-    return series
+    # labels sorted, like np.unique
+    workflows = Counter()
+    for row in tasks.order_by().values('workflow_owner', 'workflow_name').annotate(count=Count('id')):
+        workflows[f"{row['workflow_owner']}/{row['workflow_name']}"] += row['count']
+    agents = Counter({row['agent__name']: row['count'] for row in tasks.order_by().exclude(agent=None).values('agent__name').annotate(count=Count('id'))})
 
+    # projects in order of their most recent task
+    projects = tasks.order_by().exclude(project=None).values('project__guid', 'project__title').annotate(count=Count('id'), latest=Max('created')).order_by('-latest')
+    project_labels = [f"{row['project__guid']} ({row['project__title']})" for row in projects]
 
-async def get_user_statistics(user: User, invalidate: bool = False) -> dict:
-    redis = RedisClient.get()
-    cached = redis.get(f"stats/{user.username}")
+    statuses = list(tasks.values_list('status', flat=True))
+    owned_agents = list(Agent.objects.filter(user=user).values_list('name', flat=True))
+    guest_agents = list(Agent.objects.filter(users_authorized=user).values_list('name', flat=True))
 
-    if cached is None or invalidate:
-        profile = await sync_to_async(Profile.objects.get)(user=user)
-        all_tasks = await filter_tasks(user=user)
-        completed_tasks = await filter_tasks(user=user, completed=True)
-        total_tasks = len(all_tasks)
-        total_time = sum([(task.completed - task.created).total_seconds() for task in completed_tasks])
-        owned_workflows = [
-            f"{workflow['repo']['owner']['login']}/{workflow['name'] if 'name' in workflow else '[unnamed]'}"
-            for
-            workflow in list_user_workflows(owner=profile.github_username)] if profile.github_username != '' else []
-        used_workflows = [f"{task.workflow_owner}/{task.workflow_name}" for task in all_tasks]
-        used_workflows_counter = Counter(used_workflows)
-        unique_used_workflows = list(np.unique(used_workflows))
-        owned_agents = [(await sync_to_async(agent_to_dict)(agent, user.username))['name'] for agent in
-                        [agent for agent in await filter_agents(user=user) if agent is not None]]
-        guest_agents = [(await sync_to_async(agent_to_dict)(agent, user.username))['name'] for agent in
-                        [agent for agent in await filter_agents(user=user) if agent is not None]]
-        used_agents = [(await sync_to_async(agent_to_dict)(agent, user.username))['name'] for agent in
-                       [a for a in [await get_task_agent(task) for task in all_tasks] if a is not None]]
-        used_projects = [(await sync_to_async(project_to_dict)(project)) for project in
-                         [p for p in [await get_task_project(task) for task in all_tasks] if p is not None]]
-        used_agents_counter = Counter(used_agents)
-        used_projects_counter = Counter([f"{project['guid']} ({project['title']})" for project in used_projects])
-        unique_used_agents = list(np.unique(used_agents))
-        tasks_running = await sync_to_async(get_tasks_usage_timeseries)(600, user)
-
-        stats = {
-            'total_tasks': total_tasks,
-            'total_task_seconds': total_time,
-            'owned_workflows': owned_workflows,
-            'workflow_usage': {
-                'values': [used_workflows_counter[workflow] for workflow in unique_used_workflows],
-                'labels': unique_used_workflows,
-            },
-            'agent_usage': {
-                'values': [used_agents_counter[agent] for agent in unique_used_agents],
-                'labels': unique_used_agents,
-            },
-            'project_usage': {
-                'values': list(dict(used_projects_counter).values()),
-                'labels': list(dict(used_projects_counter).keys()),
-            },
-            'task_status': {
-                'values': [1 if task.status == 'success' else 0 for task in all_tasks],
-                'labels': ['SUCCESS' if task.status == 'success' else 'FAILURE' for task in all_tasks],
-            },
-            'owned_agents': owned_agents,
-            'guest_agents': guest_agents,
-            'institution': profile.institution,
-            'tasks_running': tasks_running
-        }
-        redis.set(f"stats/{user.username}", json.dumps(stats))
-    else: stats = json.loads(cached)
+    return {
+        'total_tasks': totals['total'],
+        'total_task_seconds': totals['runtime'].total_seconds() if totals['runtime'] is not None else 0,
+        'workflow_usage': {
+            'values': [workflows[workflow] for workflow in sorted(workflows.keys())],
+            'labels': sorted(workflows.keys()),
+        },
+        'agent_usage': {
+            'values': [agents[agent] for agent in sorted(agents.keys())],
+            'labels': sorted(agents.keys()),
+        },
+        'project_usage': {
+            'values': [row['count'] for row in projects],
+            'labels': project_labels,
+        },
+        'task_status': {
+            'values': [1 if status == 'success' else 0 for status in statuses],
+            'labels': ['SUCCESS' if status == 'success' else 'FAILURE' for status in statuses],
+        },
+        'owned_agents': owned_agents,
+        'guest_agents': guest_agents,
+    }
+
+
+async def compute_user_statistics(user: User) -> dict:
+    profile = await sync_to_async(Profile.objects.get)(user=user)
+    owned_workflows = [
+        f"{workflow['repo']['owner']['login']}/{workflow['name'] if 'name' in workflow else '[unnamed]'}"
+        for
+        workflow in await sync_to_async(list_user_workflows)(owner=profile.github_username)] if profile.github_username != '' else []
+    aggregates = await sync_to_async(get_user_task_aggregates)(user)
+    tasks_running = await sync_to_async(get_tasks_usage_timeseries)(600, user)
+
+    stats = {
+        'total_tasks': aggregates['total_tasks'],
+        'total_task_seconds': aggregates['total_task_seconds'],
+        'owned_workflows': owned_workflows,
+        'workflow_usage': aggregates['workflow_usage'],
+        'agent_usage': aggregates['agent_usage'],
+        'project_usage': aggregates['project_usage'],
+        'task_status': aggregates['task_status'],
+        'owned_agents': aggregates['owned_agents'],
+        'guest_agents': aggregates['guest_agents'],
+        'institution': profile.institution,
+        'tasks_running': tasks_running
+    }
     return stats
 
 
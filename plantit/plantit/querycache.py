@@ -0,0 +1,188 @@
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from plantit import metrics as metrics
+from plantit.redis import RedisClient
+
+logger = logging.getLogger(__name__)
+
+# key -> (serialized value, expiry), least recently used first
+__local: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+__local_lock = threading.Lock()
+
+
+def get_tag_key(tag: str) -> str:
+    return f"query_cache_tags/{tag}"
+
+
+def get_local(key: str) -> Optional[str]:
+    with __local_lock:
+        entry = __local.get(key, None)
+        if entry is None: return None
+        value, expiry = entry
+        if expiry < time.monotonic():
+            del __local[key]
+            return None
+        __local.move_to_end(key)
+        return value
+
+
+def put_local(key: str, value: str, ttl: float):
+    with __local_lock:
+        __local[key] = (value, time.monotonic() + ttl)
+        __local.move_to_end(key)
+        while len(__local) > int(settings.QUERY_CACHE_LOCAL_SIZE): __local.popitem(last=False)
+
+
+def evict_local(*keys: str):
+    with __local_lock:
+        for key in keys: __local.pop(key, None)
+
+
+def get_tag_ttl(ttl: int) -> int:
+    # tag sets outlive the entries registered under them, and are refreshed on each write so idle tags expire
+    return max(ttl, int(settings.QUERY_CACHE_TAG_SECONDS))
+
+
+def get(key: str, ttl: int) -> Optional[str]:
+    """
+    Retrieves the serialized cache entry with the given key, from the local tier if possible.
+
+    Args:
+        key: The cache key
+        ttl: The entry's TTL, in seconds (bounds how long it's kept locally)
+
+    Returns:
+        The serialized entry, or None if there isn't one
+    """
+
+    value = get_local(key)
+    if value is not None: return value
+    value = RedisClient.get().get(key)
+    if value is None: return None
+    value = value.decode('utf-8')
+    put_local(key, value, min(ttl, int(settings.QUERY_CACHE_LOCAL_SECONDS)))
+    return value
+
+
+def queue_put(pipeline, key: str, serialized: str, ttl: int, tags: Iterable[str]):
+    pipeline.set(key, serialized, ex=ttl)
+    for tag in tags:
+        pipeline.sadd(get_tag_key(tag), key)
+        pipeline.expire(get_tag_key(tag), get_tag_ttl(ttl))
+
+
+def put(key: str, value, ttl: int, tags: Iterable[str] = ()) -> str:
+    serialized = json.dumps(value, cls=DjangoJSONEncoder)
+    pipeline = RedisClient.get().pipeline()
+    queue_put(pipeline, key, serialized, ttl, tags)
+    pipeline.execute()
+    put_local(key, serialized, min(ttl, int(settings.QUERY_CACHE_LOCAL_SECONDS)))
+    return serialized
+
+
+async def get_async(key: str, ttl: int) -> Optional[str]:
+    value = get_local(key)
+    if value is not None: return value
+    value = await RedisClient.get_async().get(key)
+    if value is None: return None
+    value = value.decode('utf-8')
+    put_local(key, value, min(ttl, int(settings.QUERY_CACHE_LOCAL_SECONDS)))
+    return value
+
+
+async def put_async(key: str, value, ttl: int, tags: Iterable[str] = ()):
+    serialized = json.dumps(value, cls=DjangoJSONEncoder)
+    pipeline = RedisClient.get_async().pipeline()
+    queue_put(pipeline, key, serialized, ttl, tags)
+    await pipeline.execute()
+    put_local(key, serialized, min(ttl, int(settings.QUERY_CACHE_LOCAL_SECONDS)))
+
+
+def invalidate_tags(*tags: str):
+    """
+    Invalidates every cache entry with any of the given tags.
+
+    Args:
+        tags: The tags
+    """
+
+    redis = RedisClient.get()
+    tag_keys = [get_tag_key(tag) for tag in tags]
+    pipeline = redis.pipeline()
+    for tag_key in tag_keys: pipeline.smembers(tag_key)
+    keys = list(set([key.decode('utf-8') for members in pipeline.execute() for key in members]))
+
+    pipeline = redis.pipeline()
+    if len(keys) > 0: pipeline.delete(*keys)
+    pipeline.delete(*tag_keys)
+    pipeline.execute()
+    evict_local(*keys)
+    if len(keys) > 0: logger.debug(f"Invalidated {len(keys)} cached query result(s) tagged {', '.join(tags)}")
+
+
+def cached(key: str, ttl: int, tags: Iterable[str] = ()):
+    """
+    Caches the decorated query's (JSON-serializable) result. Coroutine queries are cached via the asyncio client.
+
+    Args:
+        key: The cache key, a format string over the query's arguments (e.g. `user_timeseries/{user.username}`)
+        ttl: How long to cache the result, in seconds
+        tags: The entry's tags, format strings like the key (e.g. `tasks/{user.username}`)
+
+    Returns:
+        The decorator
+    """
+
+    def decorator(query: Callable):
+        signature = inspect.signature(query)
+        name = f"query/{query.__name__}"
+
+        def bind(*args, **kwargs) -> Tuple[dict, str]:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return bound.arguments, key.format(**bound.arguments)
+
+        if inspect.iscoroutinefunction(query):
+            @functools.wraps(query)
+            async def async_wrapper(*args, **kwargs):
+                arguments, cache_key = bind(*args, **kwargs)
+                if not arguments.get('invalidate', False):
+                    value = await get_async(cache_key, ttl)
+                    if value is not None:
+                        await metrics.record_async(name, hit=True)
+                        return json.loads(value)
+
+                await metrics.record_async(name, hit=False)
+                result = await query(*args, **kwargs)
+                await put_async(cache_key, result, ttl, [tag.format(**arguments) for tag in tags])
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(query)
+        def wrapper(*args, **kwargs):
+            arguments, cache_key = bind(*args, **kwargs)
+            if not arguments.get('invalidate', False):
+                value = get(cache_key, ttl)
+                if value is not None:
+                    metrics.record(name, hit=True)
+                    return json.loads(value)
+
+            metrics.record(name, hit=False)
+            result = query(*args, **kwargs)
+            put(cache_key, result, ttl, [tag.format(**arguments) for tag in tags])
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,122 @@
+import asyncio
+import contextvars
+import hashlib
+import logging
+import time
+from contextlib import contextmanager
+
+import httpx
+from django.conf import settings
+
+from plantit.redis import RedisClient
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+priority = contextvars.ContextVar('github_priority', default=INTERACTIVE)
+
+# spend one request from the budget, unless there are no more than ARGV[2] left (in which case return seconds until reset)
+ACQUIRE = """
+local remaining = tonumber(redis.call('HGET', KEYS[1], 'remaining'))
+local reset = tonumber(redis.call('HGET', KEYS[1], 'reset'))
+local now = tonumber(ARGV[1])
+if remaining == nil or reset == nil or now >= reset then return 0 end
+if remaining > tonumber(ARGV[2]) then
+    redis.call('HINCRBY', KEYS[1], 'remaining', -1)
+    return 0
+end
+return reset - now
+"""
+
+# record the budget GitHub reported, ignoring stale (higher) counts from responses to earlier requests in the same window
+UPDATE = """
+local reset = tonumber(redis.call('HGET', KEYS[1], 'reset'))
+local remaining = tonumber(redis.call('HGET', KEYS[1], 'remaining'))
+if reset ~= nil and reset == tonumber(ARGV[2]) and remaining ~= nil and remaining < tonumber(ARGV[1]) then return 0 end
+redis.call('HSET', KEYS[1], 'remaining', ARGV[1], 'reset', ARGV[2])
+redis.call('EXPIREAT', KEYS[1], tonumber(ARGV[2]) + 60)
+return 1
+"""
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"GitHub rate limit budget exhausted, resets in {retry_after}s")
+        self.retry_after = retry_after
+
+
+@contextmanager
+def background():
+    """
+    Marks GitHub requests made within this context as low-priority.
+    """
+
+    reset = priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        priority.reset(reset)
+
+
+def get_budget_key(token: str, resource: str = 'core') -> str:
+    return f"github_ratelimit/{resource}/{hashlib.sha256(token.encode('utf-8')).hexdigest()}"
+
+
+def get_resource(request: httpx.Request) -> str:
+    # the GraphQL API has its own budget, separate from the REST API's
+    return 'graphql' if request.url.path == '/graphql' else 'core'
+
+
+def get_token(request: httpx.Request) -> str:
+    return request.headers.get('Authorization', '').split(' ')[-1]
+
+
+async def acquire(request: httpx.Request):
+    """
+    Spends one request from the token's budget, waiting or raising `RateLimited` if it's exhausted.
+    Only requests to the GitHub API count; raw content requests aren't rate-limited.
+
+    Args:
+        request: The outgoing request
+    """
+
+    if request.url.host != 'api.github.com': return
+
+    redis = RedisClient.get_async()
+    key = get_budget_key(get_token(request), get_resource(request))
+    interactive = priority.get() == INTERACTIVE
+    reserve = 0 if interactive else int(settings.GITHUB_RATE_LIMIT_RESERVE)
+
+    while True:
+        retry_after = int(await redis.eval(ACQUIRE, 1, key, int(time.time()), reserve))
+        if retry_after <= 0: return
+
+        if not interactive or retry_after > int(settings.GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS):
+            logger.warning(f"GitHub rate limit budget exhausted for {priority.get()} request {request.url}, resets in {retry_after}s")
+            raise RateLimited(retry_after)
+
+        logger.info(f"GitHub rate limit budget exhausted, waiting {retry_after}s for reset")
+        await asyncio.sleep(retry_after)
+
+
+async def update(response: httpx.Response):
+    """
+    Records the budget GitHub reported in the response's rate limit headers (if any).
+
+    Args:
+        response: The incoming response
+    """
+
+    remaining = response.headers.get('X-RateLimit-Remaining', None)
+    reset = response.headers.get('X-RateLimit-Reset', None)
+    if remaining is None or reset is None: return
+
+    key = get_budget_key(get_token(response.request), get_resource(response.request))
+    await RedisClient.get_async().eval(UPDATE, 1, key, int(remaining), int(reset))
+    if int(remaining) == 0: logger.warning(f"GitHub rate limit reached, resets at {reset}")
+
+
+# attach to an `httpx.AsyncClient` with `event_hooks=EVENT_HOOKS`
+EVENT_HOOKS = {'request': [acquire], 'response': [update]}
@@ -1,11 +1,91 @@
+import asyncio
+import json
+import threading
+import weakref
+from typing import Any, AsyncGenerator, Iterable, List, Optional, Tuple
+
 import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+
+def get_pool_options() -> dict:
+    return {
+        'host': settings.REDIS_HOST,
+        'port': int(settings.REDIS_PORT),
+        'db': int(settings.REDIS_DB),
+        'max_connections': int(settings.REDIS_MAX_CONNECTIONS),
+        'timeout': int(settings.REDIS_POOL_TIMEOUT_SECONDS),
+    }
 
 
 class RedisClient:
     __client = None
+    __client_lock = threading.Lock()
+
+    # asyncio connections are bound to the event loop they were opened on (and `async_to_sync` runs each call on its
+    # own loop), so every loop gets its own client, whose connections are closed when the loop shuts down
+    __async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[aioredis.Redis, AsyncGenerator]]' = weakref.WeakKeyDictionary()
 
     @staticmethod
-    def get():
+    def get() -> redis.Redis:
         if RedisClient.__client is None:
-            RedisClient.__client = redis.Redis('redis', 6379, db=0)
+            with RedisClient.__client_lock:
+                if RedisClient.__client is None:
+                    RedisClient.__client = redis.Redis(connection_pool=redis.BlockingConnectionPool(**get_pool_options()))
         return RedisClient.__client
+
+    @staticmethod
+    def get_async() -> aioredis.Redis:
+        loop = asyncio.get_running_loop()
+        entry = RedisClient.__async_clients.get(loop, None)
+        if entry is None:
+            client = aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool(**get_pool_options()))
+            closer = close_on_shutdown(client)
+            loop.create_task(closer.__anext__())
+            entry = (client, closer)
+            RedisClient.__async_clients[loop] = entry
+        return entry[0]
+
+    @staticmethod
+    def pipeline(transaction: bool = True) -> redis.client.Pipeline:
+        """
+        Starts a pipeline on the synchronous client. Commands are buffered until `execute()`, then sent in one round trip.
+
+        Args:
+            transaction: Whether to wrap the commands in MULTI/EXEC, so they're applied atomically
+
+        Returns:
+            The pipeline
+        """
+
+        return RedisClient.get().pipeline(transaction=transaction)
+
+
+async def close_on_shutdown(client: aioredis.Redis):
+    # `asyncio.run` (which `async_to_sync` uses too) finalizes suspended async generators before closing its loop,
+    # so once started, this closes the client's connections while the loop can still run the coroutine to do so
+    try:
+        yield
+    finally:
+        await client.close(close_connection_pool=True)
+
+
+def decode(value: Optional[bytes]) -> Optional[Any]:
+    return None if value is None else json.loads(value)
+
+
+def get_many(keys: Iterable[str]) -> List[Optional[Any]]:
+    """
+    Retrieves the (JSON-serialized) values at the given keys in one MGET.
+
+    Args:
+        keys: The keys
+
+    Returns:
+        The deserialized values, in the same order as the keys (None for missing keys)
+    """
+
+    keys = list(keys)
+    if len(keys) == 0: return []
+    return [decode(value) for value in RedisClient.get().mget(keys)]
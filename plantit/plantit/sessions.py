@@ -0,0 +1,95 @@
+import logging
+import time
+from typing import List, Optional
+
+import jwt
+from django.contrib.auth.models import User
+
+from plantit.redis import RedisClient
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_KEY = 'sessions'
+SESSIONS_BUILT = 'sessions_built'
+
+
+def get_token_expiry(token: str) -> float:
+    decoded = jwt.decode(token, options={
+        'verify_signature': False,
+        'verify_aud': False,
+        'verify_iat': False,
+        'verify_exp': False,
+        'verify_iss': False
+    })
+    return float(decoded['exp'])
+
+
+def record_session(username: str, access_token: str):
+    """
+    Records (or extends) the given user's session, lasting until their access token expires.
+
+    Args:
+        username: The user's username
+        access_token: The user's CyVerse access token
+    """
+
+    try: expiry = get_token_expiry(access_token)
+    except Exception:
+        logger.warning(f"Couldn't decode CyVerse access token for {username}, not recording session")
+        return
+    RedisClient.get().zadd(SESSIONS_KEY, {username: expiry})
+
+
+def rebuild_index():
+    sessions = dict()
+    for username, token in User.objects.exclude(profile__isnull=True).exclude(profile__cyverse_access_token='').values_list('username', 'profile__cyverse_access_token'):
+        try: sessions[username] = get_token_expiry(token)
+        except Exception: continue
+
+    pipeline = RedisClient.get().pipeline()
+    pipeline.delete(SESSIONS_KEY)
+    if len(sessions) > 0: pipeline.zadd(SESSIONS_KEY, sessions)
+    pipeline.set(SESSIONS_BUILT, 1)
+    pipeline.execute()
+    logger.info(f"Rebuilt session index ({len(sessions)} session(s))")
+
+
+def ensure_index():
+    if not RedisClient.get().exists(SESSIONS_BUILT): rebuild_index()
+
+
+def list_online() -> List[str]:
+    """
+    Lists the usernames of users currently online (i.e., whose access token hasn't expired).
+
+    Returns:
+        The usernames
+    """
+
+    ensure_index()
+    return [username.decode('utf-8') for username in RedisClient.get().zrangebyscore(SESSIONS_KEY, time.time(), '+inf')]
+
+
+def count_online() -> int:
+    ensure_index()
+    return RedisClient.get().zcount(SESSIONS_KEY, time.time(), '+inf')
+
+
+
+def list_expiring(before: float) -> List[str]:
+    """
+    Lists the usernames of users whose sessions expire (or have expired) before the given time.
+
+    Args:
+        before: The UNIX timestamp
+
+    Returns:
+        The usernames
+    """
+
+    ensure_index()
+    return [username.decode('utf-8') for username in RedisClient.get().zrangebyscore(SESSIONS_KEY, '-inf', before)]
+
+
+def get_expiry(username: str) -> Optional[float]:
+    return RedisClient.get().zscore(SESSIONS_KEY, username)
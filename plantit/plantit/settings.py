@@ -70,6 +70,9 @@ CELERYD_TASK_SOFT_TIME_LIMIT = 60  # global Celery task timeout
 CELERY_EVENTLET_QUEUE = os.environ.get('CELERY_EVENTLET_QUEUE')
 MAPBOX_TOKEN = os.environ.get('MAPBOX_TOKEN')
 MAPBOX_FEATURE_REFRESH_MINUTES = os.environ.get('MAPBOX_FEATURE_REFRESH_MINUTES')
+MAPBOX_CONCURRENCY = os.environ.get('MAPBOX_CONCURRENCY', 5)  # max concurrent Mapbox geocoding requests
+MAPBOX_REQUESTS_PER_SECOND = os.environ.get('MAPBOX_REQUESTS_PER_SECOND', 5)  # max Mapbox geocoding requests per second (the free plan allows 600 per minute)
+MAPBOX_NEGATIVE_CACHE_DAYS = os.environ.get('MAPBOX_NEGATIVE_CACHE_DAYS', 7)  # how long to remember that Mapbox couldn't geocode an institution
 CYVERSE_TOKEN_REFRESH_MINUTES = os.environ.get('CYVERSE_TOKEN_REFRESH_MINUTES')
 CYVERSE_REDIRECT_URL = os.environ.get('CYVERSE_REDIRECT_URL')
 CYVERSE_USERNAME = os.environ.get('CYVERSE_USERNAME')
@@ -84,6 +87,8 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 USERS_CACHE = os.environ.get('USERS_CACHE')
 USERS_REFRESH_MINUTES = os.environ.get('USERS_REFRESH_MINUTES')
 USERS_STATS_REFRESH_MINUTES = os.environ.get('USERS_STATS_REFRESH_MINUTES')
+USERS_REFRESH_CONCURRENCY = os.environ.get('USERS_REFRESH_CONCURRENCY', 10)  # max users whose GitHub info is retrieved at once when refreshing the user directory
+USER_SECTIONS_CONCURRENCY = os.environ.get('USER_SECTIONS_CONCURRENCY', 4)  # max bootstrap payload sections computed at once per request (each holds a database connection)
 MORE_USERS = os.environ.get('MORE_USERS')
 AGENT_KEYS = os.environ.get('AGENT_KEYS')
 WORKFLOWS_CACHE = os.environ.get('WORKFLOWS_CACHE')
@@ -107,6 +112,19 @@ HTTP_TIMEOUT = os.environ.get("HTTP_TIMEOUT")
 STATS_WINDOW_WIDTH_DAYS = os.environ.get("STATS_WINDOW_WIDTH_DAYS")
 DOCKER_USERNAME = os.environ.get("DOCKER_USERNAME")
 DOCKER_PASSWORD = os.environ.get("DOCKER_PASSWORD")
+DOCKER_IMAGE_CACHE_MINUTES = os.environ.get("DOCKER_IMAGE_CACHE_MINUTES", 60)  # how long to remember that an image exists on Docker Hub
+DOCKER_IMAGE_MISSING_CACHE_MINUTES = os.environ.get("DOCKER_IMAGE_MISSING_CACHE_MINUTES", 5)  # how long to remember that an image is missing from Docker Hub
+WORKFLOW_CONFIG_CACHE_MINUTES = os.environ.get("WORKFLOW_CONFIG_CACHE_MINUTES", 1440)  # how long to keep parsed and validated plantit.yaml files, keyed by content hash
+SINGLEFLIGHT_TIMEOUT_SECONDS = os.environ.get("SINGLEFLIGHT_TIMEOUT_SECONDS", 60)  # how long to wait on another process computing the same cached value
+LOCKS_TTL_SECONDS = os.environ.get("LOCKS_TTL_SECONDS", 300)  # how long a distributed lock is held unless renewed or released
+QUERY_CACHE_LOCAL_SIZE = os.environ.get("QUERY_CACHE_LOCAL_SIZE", 1024)  # max query results kept in each process (in front of Redis)
+QUERY_CACHE_LOCAL_SECONDS = os.environ.get("QUERY_CACHE_LOCAL_SECONDS", 10)  # max time a query result is kept in-process (bounds staleness after invalidation elsewhere)
+QUERY_CACHE_TAG_SECONDS = os.environ.get("QUERY_CACHE_TAG_SECONDS", 86400)  # min time an idle cache tag is kept (tags are refreshed on each write)
+REDIS_HOST = os.environ.get("REDIS_HOST", "redis")
+REDIS_PORT = os.environ.get("REDIS_PORT", 6379)
+REDIS_DB = os.environ.get("REDIS_DB", 0)
+REDIS_MAX_CONNECTIONS = os.environ.get("REDIS_MAX_CONNECTIONS", 50)  # max connections each process (or event loop) opens to Redis
+REDIS_POOL_TIMEOUT_SECONDS = os.environ.get("REDIS_POOL_TIMEOUT_SECONDS", 20)  # how long to wait for a free connection when the pool is exhausted
 DIRT_MIGRATION_STAGING_DIR = os.environ.get("DIRT_MIGRATION_STAGING_DIR")
 DIRT_MIGRATION_DATA_DIR = os.environ.get("DIRT_MIGRATION_DATA_DIR")
 DIRT_MIGRATION_HOST = os.environ.get("DIRT_MIGRATION_HOST")
@@ -132,6 +150,12 @@ GITHUB_REDIRECT_URI = os.environ.get('GITHUB_REDIRECT_URI')
 GITHUB_CLIENT_ID = os.environ.get('GITHUB_CLIENT_ID')
 GITHUB_SECRET = os.environ.get('GITHUB_SECRET')
 GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN')
+GITHUB_CONCURRENCY = os.environ.get('GITHUB_CONCURRENCY', 10)  # max concurrent requests per repository scrape
+GITHUB_HTTP_CACHE_DAYS = os.environ.get('GITHUB_HTTP_CACHE_DAYS', 7)  # how long to keep ETag/Last-Modified validators
+GITHUB_WEBHOOK_SECRET = os.environ.get('GITHUB_WEBHOOK_SECRET', '')  # shared secret for signed repository webhooks (disabled if empty)
+GITHUB_RATE_LIMIT_RESERVE = os.environ.get('GITHUB_RATE_LIMIT_RESERVE', 500)  # requests per token held back from background refreshes
+GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS = os.environ.get('GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS', 30)  # longest an interactive request waits for a reset
+GITHUB_GRAPHQL = os.environ.get('GITHUB_GRAPHQL', 'True').lower() == 'true'  # scrape repositories via the GraphQL API (falls back to REST)
 
 # Celery timezone
 timezone = 'US/Eastern'
@@ -235,7 +259,7 @@ CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [("redis", 6379)]
+            "hosts": [(REDIS_HOST, int(REDIS_PORT))]
         }
     }
 }
@@ -324,8 +348,8 @@ CACHES = {
 }
 
 CACHEOPS_REDIS = {
-    'host': 'redis',  # redis-server is on same machine
-    'port': 6379,  # default redis port
+    'host': REDIS_HOST,
+    'port': int(REDIS_PORT),
 }
 
 CACHEOPS = {
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.db.models.signals import m2m_changed, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from plantit import querycache as querycache
+from plantit import usage as usage
+from plantit import userstats as userstats
+from plantit.agents.models import Agent
+from plantit.miappe.models import Investigation
+from plantit.notifications.models import Notification
+from plantit.tasks.models import DelayedTask, RepeatingTask, Task, TriggeredTask
+
+
+def get_task_tags(task: Task, created: bool) -> list:
+    # a task's status changes often while it runs, but only its creation or deletion changes aggregate counts
+    tags = [f"tasks/{task.user.username}"]
+    if created: tags.extend(['tasks', f"tasks/workflow/{task.workflow_owner}/{task.workflow_name}/{task.workflow_branch}"])
+    return tags
+
+
+@receiver(pre_save, sender=Task)
+def detect_task_completion(sender, instance, **kwargs):
+    # only completed tasks need the stored row, to tell whether they just completed (or their completion time changed)
+    if instance.pk is None or instance.completed is None: return
+    instance._previous_completed = Task.objects.filter(pk=instance.pk).values_list('completed', flat=True).first()
+
+
+@receiver(post_save, sender=Task)
+def invalidate_on_task_save(sender, instance, created, **kwargs):
+    querycache.invalidate_tags(*get_task_tags(instance, created))
+
+
+@receiver(post_save, sender=Task)
+def update_usage_on_task_save(sender, instance, created, **kwargs):
+    if created:
+        usage.record(instance, tasks=1, completed=int(instance.completed is not None), runtime=usage.get_runtime(instance))
+    elif '_previous_completed' in instance.__dict__:
+        previous = instance.__dict__.pop('_previous_completed')
+        if previous == instance.completed: return
+        runtime = usage.get_runtime(instance) - (previous - instance.created if previous is not None else timedelta(0))
+        usage.record(instance, completed=int(previous is None), runtime=runtime)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def mark_user_stats_dirty(sender, instance, **kwargs):
+    userstats.mark_dirty(instance.user.username)
+
+
+@receiver(post_delete, sender=Task)
+def invalidate_on_task_delete(sender, instance, **kwargs):
+    querycache.invalidate_tags(*get_task_tags(instance, True))
+
+
+@receiver(post_delete, sender=Task)
+def update_usage_on_task_delete(sender, instance, **kwargs):
+    usage.record(instance, tasks=-1, completed=-int(instance.completed is not None), runtime=-usage.get_runtime(instance), create=False)
+
+
+@receiver(post_save, sender=Agent)
+@receiver(post_delete, sender=Agent)
+@receiver(m2m_changed, sender=Agent.users_authorized.through)
+def invalidate_on_agent_change(sender, instance, **kwargs):
+    querycache.invalidate_tags('agents')
+
+
+@receiver(post_save, sender=Investigation)
+@receiver(post_delete, sender=Investigation)
+def invalidate_on_project_change(sender, instance, **kwargs):
+    querycache.invalidate_tags('projects')
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_on_notification_change(sender, instance, **kwargs):
+    querycache.invalidate_tags(f"notifications/{instance.user.username}")
+
+
+@receiver(post_save, sender=DelayedTask)
+@receiver(post_save, sender=RepeatingTask)
+@receiver(post_save, sender=TriggeredTask)
+@receiver(post_delete, sender=DelayedTask)
+@receiver(post_delete, sender=RepeatingTask)
+@receiver(post_delete, sender=TriggeredTask)
+def invalidate_on_scheduled_task_change(sender, instance, **kwargs):
+    if instance.user is not None: querycache.invalidate_tags(f"scheduled_tasks/{instance.user.username}")
@@ -0,0 +1,158 @@
+import asyncio
+import inspect
+import logging
+import time
+import weakref
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple, TypeVar, Union
+
+from django.conf import settings
+
+from plantit import locks as locks
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# how often to check whether another process has released its lease
+POLL_INTERVAL_SECONDS = 0.1
+
+# key -> in-flight computation
+__flights: Dict[str, asyncio.Future] = dict()
+
+# in-flight computations started by background refreshes
+__background: 'weakref.WeakSet[asyncio.Future]' = weakref.WeakSet()
+
+# background refreshes (the event loop only keeps weak references to tasks)
+__revalidations: Set[asyncio.Task] = set()
+
+
+def get_lease_name(key: str) -> str:
+    return f"singleflight/{key}"
+
+
+def get_lease_key(key: str) -> str:
+    return locks.get_lock_key(get_lease_name(key))
+
+
+async def __fly(key: str, compute: Callable[[], Awaitable[T]], reload: Callable[[], Optional[T]], timeout: int, background: bool) -> Optional[T]:
+    lease = locks.Lock(get_lease_name(key), timeout)
+    acquired = await lease.acquire_async()
+
+    # another process is already refreshing the value in the background, leave it to them
+    if not acquired and background: return None
+
+    if not acquired and reload is not None:
+        # another process is computing the value, wait for it to finish (or its lease to expire) and use theirs
+        deadline = time.monotonic() + timeout
+        while await lease.locked_async() and time.monotonic() < deadline: await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        value = reload()
+        if inspect.isawaitable(value): value = await value
+        if value is not None: return value
+        logger.debug(f"No value for {key} after waiting on another process's lease, computing it")
+
+    try:
+        return await compute()
+    finally:
+        if acquired: await lease.release_async()
+
+
+def __start(key: str, compute: Callable[[], Awaitable[T]], reload: Callable[[], Optional[T]], timeout: int, background: bool) -> asyncio.Future:
+    flight = asyncio.ensure_future(__fly(key, compute, reload, int(timeout or settings.SINGLEFLIGHT_TIMEOUT_SECONDS), background))
+    __flights[key] = flight
+    if background: __background.add(flight)
+    flight.add_done_callback(lambda _: __flights.pop(key, None) if __flights.get(key, None) is flight else None)
+    return flight
+
+
+async def do(key: str, compute: Callable[[], Awaitable[T]], reload: Callable[[], Optional[T]] = None, timeout: int = None) -> T:
+    """
+    Computes the value for the given key, unless a computation is already in flight, in which case its result is shared.
+
+    Args:
+        key: The key (typically the value's cache key)
+        compute: Computes (and caches) the value
+        reload: Reads the cached value (synchronously, or as a coroutine), used instead of `compute` after waiting on another process (optional)
+        timeout: How long another process's lease may be waited on, in seconds (defaults to `SINGLEFLIGHT_TIMEOUT_SECONDS`)
+
+    Returns:
+        The value
+    """
+
+    flight = __flights.get(key, None)
+
+    # computations can only be shared within the same event loop
+    if flight is None or flight.get_loop() is not asyncio.get_running_loop():
+        flight = __start(key, compute, reload, timeout, background=False)
+
+    value = await asyncio.shield(flight)
+
+    # the background refresh we joined deferred to another process's, so we still need the value
+    if value is None and flight in __background: return await do(key, compute, reload, timeout)
+    return value
+
+
+def revalidate(key: str, compute: Callable[[], Awaitable[T]], timeout: int = None):
+    """
+    Starts recomputing the value for the given key in the background, unless it's already being recomputed
+    (in this process, or in another process holding the key's lease).
+
+    Args:
+        key: The key
+        compute: Computes (and caches) the value
+        timeout: How long the lease is held before it expires, in seconds
+    """
+
+    if key in __flights: return
+    flight = __start(key, compute, None, timeout, background=True)
+
+    async def refresh():
+        try: await flight
+        except: logger.warning(f"Failed to revalidate {key}", exc_info=True)
+
+    task = asyncio.ensure_future(refresh())
+    __revalidations.add(task)
+    task.add_done_callback(__revalidations.discard)
+
+
+async def stale_while_revalidate(
+        key: str,
+        read: Callable[[], Union[Optional[Tuple[T, Optional[float]]], Awaitable[Optional[Tuple[T, Optional[float]]]]]],
+        compute: Callable[[], Awaitable[T]],
+        max_age: float,
+        invalidate: bool = False,
+        timeout: int = None) -> T:
+    """
+    Serves the cached value for the given key if there is one, revalidating it in the background if it's stale.
+    If nothing is cached (or invalidation is requested) the value is computed, sharing any computation already in flight.
+
+    Args:
+        key: The key
+        read: Reads the cached value and its age in seconds (or None if unknown), returning None if nothing is cached
+            (synchronously, or as a coroutine, which callers on the event loop should prefer)
+        compute: Computes (and caches) the value
+        max_age: How old the cached value may be before it's revalidated, in seconds
+        invalidate: Whether to ignore the cached value
+        timeout: How long another process's lease may be waited on, in seconds
+
+    Returns:
+        The value
+    """
+
+    async def reread():
+        cached = read()
+        if inspect.isawaitable(cached): cached = await cached
+        return cached
+
+    async def reload():
+        cached = await reread()
+        return None if cached is None else cached[0]
+
+    cached = await reread()
+    if cached is None or invalidate:
+        return await do(key, compute, reload=reload, timeout=timeout)
+
+    value, age = cached
+    if age is None or age > max_age:
+        logger.debug(f"Serving stale {key} ({'unknown age' if age is None else f'{int(age)}s old'}), revalidating")
+        revalidate(key, compute, timeout)
+    return value
@@ -7,5 +7,6 @@ urlpatterns = [
     path(r'institutions/', views.institutions_info),
     path(r'timeseries/', views.aggregate_timeseries),
     path(r'user_timeseries/', views.user_timeseries),
+    path(r'cache/', views.cache_metrics),
     path(r'timeseries/<owner>/<name>/<branch>/', views.workflow_timeseries),
 ]
@@ -4,6 +4,7 @@ from django.http import JsonResponse, HttpResponseNotFound
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.decorators import api_view
 
+import plantit.metrics as metrics
 import plantit.queries as q
 
 
@@ -41,3 +42,8 @@ def user_timeseries(request):
     try: user = User.objects.get(username=username)
     except: return HttpResponseNotFound()
     return JsonResponse(q.get_user_timeseries(user))
+
+
+@login_required
+def cache_metrics(request):
+    return JsonResponse(metrics.get_cache_metrics())
@@ -19,10 +19,10 @@ from paramiko.ssh_exception import AuthenticationException, ChannelException, No
 from tenacity import retry, wait_random_exponential, stop_after_attempt, retry_if_exception_type
 
 from pycyapi.clients import TerrainClient
+from plantit import catalog as catalog
 from plantit import docker as docker
 from plantit.agents.models import Agent
 from plantit.miappe.models import Investigation, Study
-from plantit.redis import RedisClient
 from plantit.sns import SnsClient
 from plantit.ssh import SSH, execute_command
 from plantit.task_resources import get_task_ssh_client, log_task_status, push_task_channel_event
@@ -47,8 +47,7 @@ def create_immediate_task(user: User, config: dict):
     repo_branch = config['repo']['branch']
 
     # persist task configuration
-    redis = RedisClient.get()
-    redis.set(f"workflow_configs/{user.username}/{repo_owner}/{repo_name}/{repo_branch}", json.dumps(config))
+    catalog.put_config(user.username, repo_owner, repo_name, repo_branch, config)
 
     # get the task GUID and name
     guid = config.get('guid', None) if config['type'] == 'Now' else str(uuid.uuid4())
@@ -1,4 +1,5 @@
 import json
+from datetime import timedelta
 from enum import Enum
 from itertools import chain
 from typing import TypedDict, List
@@ -49,6 +50,7 @@ class TaskCounter(SingletonModel):
 class Task(models.Model):
     class Meta:
         ordering = ['-created']
+        indexes = [models.Index(fields=['workflow_owner', 'workflow_name', 'workflow_branch', 'created'])]
 
     guid = models.CharField(max_length=50, null=False, blank=False, unique=True)
     name = models.CharField(max_length=250, null=True, blank=True)
@@ -206,6 +208,23 @@ class TriggeredTask(PeriodicTask):
 
 # Task Options
 
+class TaskUsage(models.Model):
+    # daily rollup of tasks (by UTC creation date) per user, agent and workflow, maintained by `plantit.usage`
+    class Meta:
+        unique_together = ['day', 'user', 'agent', 'workflow_owner', 'workflow_name', 'workflow_branch', 'workflow_public']
+
+    day = models.DateField()
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    agent = models.CharField(max_length=50, blank=True, default='')  # agent name (blank if none)
+    workflow_owner = models.CharField(max_length=280)
+    workflow_name = models.CharField(max_length=280)
+    workflow_branch = models.CharField(max_length=280)
+    workflow_public = models.BooleanField(default=False)
+    tasks = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    runtime = models.DurationField(default=timedelta)  # total runtime of completed tasks
+
+
 class BindMount(TypedDict):
     host_path: str
     container_path: str
@@ -0,0 +1,120 @@
+"""
+GitHub scraping benchmark.
+
+Scrapes a mock GitHub (served in-process through an `httpx.MockTransport` with simulated per-request latency)
+with increasing concurrency limits, so the sequential baseline (concurrency 1) can be compared with the
+bounded-parallel scraper.
+
+Usage (from the directory containing `manage.py`):
+
+    python -m plantit.tests.benchmarks.bench_github --repos 100 --branches 5 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import django
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(GITHUB_CONCURRENCY=10, GITHUB_GRAPHQL=False)
+    django.setup()
+
+import httpx
+
+from plantit import github
+
+CONFIG = """
+name: Benchmark
+image: library/alpine
+commands: echo "Hello, world!"
+"""
+
+
+class MockGitHub:
+    """
+    Serves repository listings (paginated), branch listings and `plantit.yaml` files for a single owner.
+    Every other repository lacks a `plantit.yaml`. Tracks request counts and peak concurrency.
+    """
+
+    def __init__(self, owner: str, repos: int, branches: int, latency: float, page_size: int = 30):
+        self.owner = owner
+        self.repos = repos
+        self.branches = branches
+        self.latency = latency
+        self.page_size = page_size
+        self.requests = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            return self.route(request)
+        finally:
+            self.in_flight -= 1
+
+    def route(self, request: httpx.Request) -> httpx.Response:
+        parts = request.url.path.strip('/').split('/')
+
+        if request.url.host == 'raw.githubusercontent.com':
+            _, repo, _, _ = parts
+            if int(repo.replace('repo', '')) % 2 == 1: return httpx.Response(404)
+            return httpx.Response(200, text=CONFIG)
+
+        if parts[0] == 'users' and parts[2] == 'repos':
+            page = int(request.url.params.get('page', 1))
+            first = (page - 1) * self.page_size
+            last = min(first + self.page_size, self.repos)
+            repos = [{'name': f"repo{i}", 'owner': {'login': self.owner}} for i in range(first, last)]
+            headers = {}
+            if last < self.repos:
+                headers['Link'] = f'<https://api.github.com/users/{self.owner}/repos?per_page={self.page_size}&page={page + 1}>; rel="next"'
+            return httpx.Response(200, json=repos, headers=headers)
+
+        if parts[0] == 'repos' and parts[3] == 'branches':
+            return httpx.Response(200, json=[{'name': f"branch{i}"} for i in range(self.branches)])
+
+        return httpx.Response(404)
+
+
+async def run(repos: int, branches: int, latency: float, concurrency: int) -> dict:
+    mock = MockGitHub('benchmark', repos, branches, latency)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(mock))
+    start = time.perf_counter()
+    try:
+        workflows = await github.list_connectable_repos('benchmark', 'token', concurrency=concurrency, client=client)
+    finally:
+        await client.aclose()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'concurrency': concurrency,
+        'repos': repos,
+        'branches': branches,
+        'workflows': len(workflows),
+        'requests': mock.requests,
+        'peak_in_flight': mock.peak,
+        'seconds': round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GitHub scraping benchmark")
+    parser.add_argument('--repos', type=int, default=100)
+    parser.add_argument('--branches', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.05, help="Simulated per-request latency (seconds)")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 5, 10, 25])
+    args = parser.parse_args()
+
+    for concurrency in args.concurrency:
+        print(json.dumps(asyncio.run(run(args.repos, args.branches, args.latency, concurrency))))
+
+
+if __name__ == '__main__':
+    main()
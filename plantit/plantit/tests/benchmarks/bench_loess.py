@@ -0,0 +1,57 @@
+"""
+LOESS smoothing benchmark.
+
+Smooths a synthetic running-task count series (like those behind the usage charts) with the vectorized
+regression and with the per-point weighted least squares fits it replaced, and reports the largest difference.
+
+Usage (from the directory containing `manage.py`):
+
+    python -m plantit.tests.benchmarks.bench_loess --points 1000 10000 100000 --bandwidth 120
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from plantit import loess
+
+
+def synthesize(points: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    xs = np.arange(0, points * 600, 600)
+    ys = np.maximum(0, np.cumsum(rng.normal(0, 1, points))).round()
+    return pd.DataFrame({'X': xs, 'Y': ys})
+
+
+def time_regression(regress, frame: pd.DataFrame, bandwidth: int, num_pts: int):
+    start = time.perf_counter()
+    smoothed = regress(frame, bandwidth, num_pts)
+    return smoothed, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LOESS smoothing benchmark")
+    parser.add_argument('--points', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--bandwidth', type=int, default=120)
+    parser.add_argument('--max-reference-points', type=int, default=20000, help="Skip the (slow) reference fits above this size")
+    args = parser.parse_args()
+
+    for points in args.points:
+        frame = synthesize(points)
+        num_pts = points // 2
+        smoothed, vectorized = time_regression(loess.regress, frame, args.bandwidth, num_pts)
+        result = {'points': points, 'bandwidth': args.bandwidth, 'vectorized_seconds': round(vectorized, 4)}
+
+        if points <= args.max_reference_points:
+            reference, seconds = time_regression(loess.regress_wls, frame, args.bandwidth, num_pts)
+            result['reference_seconds'] = round(seconds, 3)
+            result['max_difference'] = float(np.max(np.abs(smoothed['Y'] - reference['Y'])))
+
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
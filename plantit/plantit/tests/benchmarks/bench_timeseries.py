@@ -0,0 +1,59 @@
+"""
+Running-task time series benchmark.
+
+Counts running tasks at each tick of a synthetic task history with the vectorized sweep, and (on a subset, since
+it's quadratic) with the per-tick scan it replaced, extrapolating the latter to the full history.
+
+Usage (from the directory containing `manage.py`):
+
+    python -m plantit.tests.benchmarks.bench_timeseries --tasks 1000000 --days 1825 --resolution 600
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from plantit.utils.timeseries import count_running
+
+
+def synthesize(tasks: int, days: int, seed: int = 0):
+    # tasks start uniformly over the history and run for exponentially distributed durations (mean 30 minutes)
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, days * 24 * 60 * 60, tasks)
+    ends = starts + rng.exponential(30 * 60, tasks).astype(np.int64)
+    return starts, ends
+
+
+def count_running_scan(starts: list, ends: list, resolution: int) -> dict:
+    # the former approach: scan every task at every tick
+    intervals = list(zip(starts, ends))
+    return {t: len([1 for s, e in intervals if s <= t <= e]) for t in range(min(starts), max(ends), resolution)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Running-task time series benchmark")
+    parser.add_argument('--tasks', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=1825, help="Length of the synthetic history")
+    parser.add_argument('--resolution', type=int, default=600, help="Seconds between ticks")
+    parser.add_argument('--scan-tasks', type=int, default=200, help="Tasks to time the per-tick scan on")
+    args = parser.parse_args()
+
+    starts, ends = synthesize(args.tasks, args.days)
+    start = time.perf_counter()
+    ticks, running = count_running(starts, ends, args.resolution)
+    sweep = time.perf_counter() - start
+    print(json.dumps({'method': 'sweep', 'tasks': args.tasks, 'ticks': len(ticks), 'peak_running': int(running.max()), 'seconds': round(sweep, 3)}))
+
+    # the scan's cost is ticks x tasks, so extrapolate linearly in tasks (the tick count is the same)
+    subset = slice(0, args.scan_tasks)
+    start = time.perf_counter()
+    scanned = count_running_scan(starts[subset].tolist(), ends[subset].tolist(), args.resolution)
+    scan = time.perf_counter() - start
+    extrapolated = scan * (args.tasks / args.scan_tasks) * (len(ticks) / max(len(scanned), 1))
+    print(json.dumps({'method': 'scan', 'tasks': args.scan_tasks, 'ticks': len(scanned), 'seconds': round(scan, 3), 'extrapolated_seconds': round(extrapolated, 1)}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Websocket load-test harness.
+
+Opens N sockets against an in-memory channel layer, then pushes a task event to every user group
+and measures fan-out latency and memory per connection. Runs against both the legacy (sync) and the
+current (async) consumer so the two can be compared side by side.
+
+Usage (from the directory containing `manage.py`):
+
+    python -m plantit.tests.benchmarks.bench_websockets --connections 5000 --users 500
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import statistics
+import threading
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(
+        INSTALLED_APPS=['channels'],
+        DATABASES={},
+        CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    django.setup()
+
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import WebsocketConsumer
+from channels.layers import InMemoryChannelLayer, channel_layers
+from channels.testing import WebsocketCommunicator
+
+from plantit.consumers import UserEventConsumer
+
+
+class LegacyUserEventConsumer(WebsocketConsumer):
+    """
+    The synchronous consumer as it was before the async rewrite, kept here only as a baseline.
+    """
+
+    def connect(self):
+        self.username = self.scope['url_route']['kwargs']['username']
+        async_to_sync(self.channel_layer.group_add)(f"{self.username}", self.channel_name)
+        self.accept()
+
+    def disconnect(self, code):
+        async_to_sync(self.channel_layer.group_discard)(f"{self.username}", self.channel_name)
+
+    def task_event(self, event):
+        self.send(text_data=json.dumps({'task': event['task']}))
+
+
+def with_url_route(app):
+    # mimic the URLRouter in `plantit.urls` without loading the full URL configuration
+    async def inner(scope, receive, send):
+        username = scope['path'].strip('/').split('/')[-1]
+        return await app(dict(scope, url_route={'kwargs': {'username': username}}), receive, send)
+
+    return inner
+
+
+async def run(consumer, connections: int, users: int, timeout: float) -> dict:
+    # fresh channel layer per run so groups don't leak between runs
+    channel_layers.set('default', InMemoryChannelLayer(capacity=1000))
+    layer = channel_layers['default']
+    application = with_url_route(consumer.as_asgi())
+
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    threads_before = threading.active_count()
+
+    # open the sockets
+    start = time.perf_counter()
+    communicators = []
+    for i in range(connections):
+        communicator = WebsocketCommunicator(application, f"/ws/user{i % users}/")
+        connected, _ = await communicator.connect(timeout=timeout)
+        if not connected: raise RuntimeError(f"Socket {i} failed to connect")
+        communicators.append(communicator)
+    connect_seconds = time.perf_counter() - start
+
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    threads_after = threading.active_count()
+
+    # push one task event to each user group, then wait for every socket to receive it
+    start = time.perf_counter()
+    for u in range(users):
+        await layer.group_send(f"user{u}", {
+            'type': 'task_event',
+            'task': {'name': f"task{u}", 'status': 'running', 'sent': time.perf_counter()}
+        })
+
+    latencies = []
+    for communicator in communicators:
+        message = json.loads(await communicator.receive_from(timeout=timeout))
+        latencies.append(time.perf_counter() - message['task']['sent'])
+    fanout_seconds = time.perf_counter() - start
+
+    for communicator in communicators: await communicator.disconnect()
+
+    latencies.sort()
+    return {
+        'consumer': consumer.__name__,
+        'connections': connections,
+        'users': users,
+        'connect_seconds': round(connect_seconds, 3),
+        'fanout_seconds': round(fanout_seconds, 3),
+        'latency_p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'latency_p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+        'latency_max_ms': round(latencies[-1] * 1000, 3),
+        'bytes_per_connection': int((current - baseline) / connections),
+        'peak_bytes': peak - baseline,
+        'threads_added': threads_after - threads_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Websocket consumer load test")
+    parser.add_argument('--connections', type=int, default=2000, help="Number of sockets to open")
+    parser.add_argument('--users', type=int, default=200, help="Number of distinct users (groups) to spread sockets across")
+    parser.add_argument('--timeout', type=float, default=30, help="Per-operation timeout (seconds)")
+    parser.add_argument('--async-only', action='store_true', help="Skip the legacy sync consumer baseline")
+    args = parser.parse_args()
+
+    # the consumers log every event, which would dominate the measurements
+    logging.getLogger('plantit').setLevel(logging.WARNING)
+
+    consumers = [UserEventConsumer] if args.async_only else [LegacyUserEventConsumer, UserEventConsumer]
+    for consumer in consumers:
+        results = asyncio.run(run(consumer, args.connections, args.users, args.timeout))
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
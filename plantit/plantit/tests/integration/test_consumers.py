@@ -0,0 +1,39 @@
+import json
+
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+
+from plantit.urls import websocket_urlpatterns
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class UserEventConsumerTests(TestCase):
+    async def test_task_event_is_pushed_to_user_sockets(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/wbonelli/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        await get_channel_layer().group_send('wbonelli', {
+            'type': 'task_event',
+            'task': {'name': 'test', 'status': 'running'}
+        })
+        message = json.loads(await communicator.receive_from())
+        self.assertEqual(message['task']['name'], 'test')
+
+        await communicator.disconnect()
+
+    async def test_migration_event_includes_file(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/wbonelli/')
+        await communicator.connect()
+
+        await get_channel_layer().group_send('wbonelli', {
+            'type': 'migration_event',
+            'migration': {'num_files': 1},
+            'file': {'name': 'image.png'}
+        })
+        message = json.loads(await communicator.receive_from())
+        self.assertEqual(message['file']['name'], 'image.png')
+
+        await communicator.disconnect()
@@ -0,0 +1,95 @@
+from django.test import TestCase
+
+import plantit.catalog as catalog
+import plantit.queries as q
+from plantit.redis import RedisClient
+
+
+def workflow(owner: str, name: str, public: bool = False, projects: list = None) -> dict:
+    config = {'name': name, 'public': public}
+    if projects is not None: config['projects'] = projects
+    return {'config': config, 'repo': {'name': name, 'owner': {'login': owner}}, 'branch': {'name': 'master'}}
+
+
+class CatalogTests(TestCase):
+    def tearDown(self):
+        redis = RedisClient.get()
+        for pattern in ['workflows/catalog_test_*', 'workflows_index/*', 'workflows_catalog/*', 'workflow_configs*/*catalog_test_owner/*']:
+            for key in redis.scan_iter(match=pattern): redis.delete(key)
+
+    def test_put_indexes_workflow(self):
+        key = catalog.workflow_key('catalog_test_owner', 'repo', 'master')
+        catalog.put_workflow(key, workflow('catalog_test_owner', 'repo', public=True, projects=['guid']))
+
+        self.assertEqual(['repo'], [wf['repo']['name'] for wf in catalog.list_indexed_workflows(catalog.owner_index('catalog_test_owner'))])
+        self.assertEqual(['repo'], [wf['repo']['name'] for wf in catalog.list_indexed_workflows(catalog.project_index('guid'))])
+        self.assertIn('repo', [wf['repo']['name'] for wf in catalog.list_public_catalog()])
+
+    def test_put_reindexes_changed_workflow(self):
+        key = catalog.workflow_key('catalog_test_owner', 'repo', 'master')
+        catalog.put_workflow(key, workflow('catalog_test_owner', 'repo', public=True))
+        self.assertIn('repo', [wf['repo']['name'] for wf in catalog.list_public_catalog()])
+
+        catalog.put_workflow(key, workflow('catalog_test_owner', 'repo', public=False))
+        self.assertNotIn('repo', [wf['repo']['name'] for wf in catalog.list_public_catalog()])
+
+    def test_remove_unindexes_workflow(self):
+        key = catalog.workflow_key('catalog_test_owner', 'repo', 'master')
+        catalog.put_workflow(key, workflow('catalog_test_owner', 'repo', public=True))
+        catalog.remove_workflow(key)
+
+        self.assertEqual([], catalog.list_indexed_workflows(catalog.owner_index('catalog_test_owner')))
+        self.assertNotIn('repo', [wf['repo']['name'] for wf in catalog.list_public_catalog()])
+        self.assertNotIn(b'catalog_test_owner', RedisClient.get().smembers(catalog.INDEX_OWNERS))
+
+    def test_missing_index_is_rebuilt(self):
+        catalog.put_workflow(catalog.workflow_key('catalog_test_owner', 'repo1', 'master'), workflow('catalog_test_owner', 'repo1'))
+        catalog.put_workflow(catalog.workflow_key('catalog_test_owner', 'repo2', 'master'), workflow('catalog_test_owner', 'repo2'))
+
+        redis = RedisClient.get()
+        for key in redis.scan_iter(match='workflows_index/*'): redis.delete(key)
+
+        self.assertEqual(['repo1', 'repo2'], [wf['repo']['name'] for wf in catalog.list_indexed_workflows(catalog.owner_index('catalog_test_owner'))])
+        self.assertEqual(['catalog_test_owner/repo1/master', 'catalog_test_owner/repo2/master'],
+                         [key.partition('/')[2] for key in sorted(catalog.list_owner_keys('catalog_test_owner'))])
+
+    def test_rebuild_keeps_cache_times(self):
+        key = catalog.workflow_key('catalog_test_owner', 'repo', 'master')
+        catalog.put_workflow(key, workflow('catalog_test_owner', 'repo'))
+        RedisClient.get().zadd(catalog.INDEX_UPDATED, {'workflows/catalog_test_owner/gone/master': 0})
+        age = catalog.get_workflow_age(key)
+
+        catalog.rebuild_index()
+
+        self.assertIsNotNone(catalog.get_workflow_age(key))
+        self.assertLess(catalog.get_workflow_age(key) - age, 5)
+        self.assertIsNone(RedisClient.get().zscore(catalog.INDEX_UPDATED, 'workflows/catalog_test_owner/gone/master'))
+
+    def test_bulk_put_and_remove(self):
+        keys = [catalog.workflow_key('catalog_test_owner', f"repo{i}", 'master') for i in range(3)]
+        catalog.put_workflows({key: workflow('catalog_test_owner', f"repo{i}", public=i == 0) for i, key in enumerate(keys)})
+        self.assertEqual(['repo0', 'repo1', 'repo2'], [wf['repo']['name'] for wf in catalog.list_indexed_workflows(catalog.owner_index('catalog_test_owner'))])
+        self.assertIn('repo0', [wf['repo']['name'] for wf in catalog.list_public_catalog()])
+
+        catalog.remove_workflows(keys[:2])
+        self.assertEqual(['repo2'], [wf['repo']['name'] for wf in catalog.list_indexed_workflows(catalog.owner_index('catalog_test_owner'))])
+        self.assertNotIn('repo0', [wf['repo']['name'] for wf in catalog.list_public_catalog()])
+        self.assertIn(b'catalog_test_owner', RedisClient.get().smembers(catalog.INDEX_OWNERS))
+
+        catalog.remove_workflows(keys[2:])
+        self.assertNotIn(b'catalog_test_owner', RedisClient.get().smembers(catalog.INDEX_OWNERS))
+
+    def test_configs_invalidated_per_branch_and_repo(self):
+        for username in ['alice', 'bob']:
+            for branch in ['master', 'feature/master']:
+                catalog.put_config(username, 'catalog_test_owner', 'repo', branch, {'branch': branch})
+        catalog.put_config('alice', 'catalog_test_owner', 'other', 'master', {'branch': 'master'})
+
+        q.invalidate_workflow_configs('catalog_test_owner', 'repo', 'master')
+        self.assertIsNone(catalog.get_config('alice', 'catalog_test_owner', 'repo', 'master'))
+        self.assertEqual({'branch': 'feature/master'}, catalog.get_config('bob', 'catalog_test_owner', 'repo', 'feature/master'))
+        self.assertEqual(2, len(catalog.list_config_keys('catalog_test_owner', 'repo')))
+
+        q.invalidate_workflow_configs('catalog_test_owner', 'repo')
+        self.assertEqual([], catalog.list_config_keys('catalog_test_owner', 'repo'))
+        self.assertEqual({'branch': 'master'}, catalog.get_config('alice', 'catalog_test_owner', 'other', 'master'))
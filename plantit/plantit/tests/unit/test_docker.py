@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+from django.test import TestCase
+
+import plantit.docker as docker
+from plantit.redis import RedisClient
+from plantit.validation import validate_workflow_configuration
+
+
+class MockDockerHub:
+    def __init__(self):
+        self.requests = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request.url.path)
+        await asyncio.sleep(0.01)
+        if request.url.path == '/v2/repositories/test_unit/present/':
+            return httpx.Response(200, json={'user': 'test_unit', 'name': 'present'})
+        if request.url.path == '/v2/repositories/test_unit/throttled/':
+            return httpx.Response(429, json={'message': 'too many requests'})
+        if request.url.path == '/v2/repositories/test_unit/unavailable/':
+            return httpx.Response(503, text='service unavailable')
+        return httpx.Response(404, json={'message': 'object not found'})
+
+
+class DockerImageResolutionTests(TestCase):
+    def tearDown(self):
+        redis = RedisClient.get()
+        for key in redis.scan_iter(match='docker_images/test_unit/*'): redis.delete(key)
+
+    async def test_resolve_images_looks_up_each_image_once(self):
+        hub = MockDockerHub()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(hub)) as client:
+            images = await asyncio.gather(*[docker.resolve_images(['docker://test_unit/present', 'docker://test_unit/missing'], client) for _ in range(10)])
+
+        self.assertTrue(all(i == {'docker://test_unit/present': True, 'docker://test_unit/missing': False} for i in images))
+        self.assertEqual(1, hub.requests.count('/v2/repositories/test_unit/present/'))
+        self.assertEqual(1, hub.requests.count('/v2/repositories/test_unit/missing/'))
+
+    async def test_missing_images_are_cached(self):
+        hub = MockDockerHub()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(hub)) as client:
+            self.assertFalse(await docker.image_exists_async('also_missing', 'test_unit', client=client))
+            self.assertFalse(await docker.image_exists_async('also_missing', 'test_unit', client=client))
+
+        self.assertEqual(1, len(hub.requests))
+
+    async def test_results_shared_through_redis_with_ttl(self):
+        hub = MockDockerHub()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(hub)) as client:
+            self.assertTrue(await docker.image_exists_async('present', 'test_unit', client=client))
+
+        # another process sees the result without asking Docker Hub
+        self.assertTrue(docker.get_cached_image('present', 'test_unit'))
+        self.assertTrue(0 < RedisClient.get().ttl(docker.get_image_cache_key('present', 'test_unit')) <= docker.get_image_cache_ttl(True))
+
+    async def test_indeterminate_responses_not_cached(self):
+        hub = MockDockerHub()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(hub)) as client:
+            for _ in range(2):
+                self.assertFalse(await docker.image_exists_async('throttled', 'test_unit', client=client))
+                self.assertFalse(await docker.image_exists_async('unavailable', 'test_unit', client=client))
+
+        self.assertEqual(4, len(hub.requests))
+        self.assertIsNone(docker.get_cached_image('throttled', 'test_unit'))
+
+    def test_validation_uses_resolved_images(self):
+        config = {
+            'name': 'Test Flow',
+            'image': 'docker://test_unit/unresolvable',
+            'commands': 'echo "Hello, world!"'
+        }
+        self.assertTrue(validate_workflow_configuration(config, {'docker://test_unit/unresolvable': True})[0])
+        self.assertFalse(validate_workflow_configuration(config, {'docker://test_unit/unresolvable': False})[0])
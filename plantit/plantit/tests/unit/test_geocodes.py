@@ -0,0 +1,104 @@
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+import plantit.geocodes as geocodes
+import plantit.mapbox as mapbox
+import plantit.queries as q
+from plantit.redis import RedisClient
+from plantit.users.models import Profile
+
+
+class MockMapbox:
+    # echoes the query's terms, with a feature unless the institution is unknown
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.queried = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, name: str, token: str, client=None) -> dict:
+        self.queried.append(name)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if name == 'flaky college': raise RuntimeError()
+            features = [] if name == 'unknown institute' else [{'text': name.title(), 'center': [0, 0]}]
+            return {'query': name.split(' '), 'features': features}
+        finally:
+            self.in_flight -= 1
+
+
+class GeocodeCacheTests(TestCase):
+    def setUp(self):
+        for i, institution in enumerate(['University of Georgia', 'University of Georgia', 'Unknown Institute']):
+            Profile.objects.create(user=User.objects.create(username=f"geocode_user_{i}"), institution=institution)
+
+    def tearDown(self):
+        RedisClient.get().delete(geocodes.GEOCODES_KEY, q.INSTITUTIONS_KEY)
+
+    def test_only_new_institutions_looked_up(self):
+        mock = MockMapbox()
+        with patch('plantit.mapbox.get_institution', mock):
+            institutions = q.get_institutions(invalidate=True)
+            self.assertEqual(['university of georgia', 'unknown institute'], sorted(mock.queried))
+            self.assertEqual(2, institutions['university of georgia']['count'])
+            self.assertEqual('University Of Georgia', institutions['university of georgia']['geocode']['text'])
+            self.assertEqual({'name': 'university of georgia', 'count': 2}, institutions['university of georgia']['geocode']['properties'])
+            self.assertIsNone(institutions['unknown institute']['geocode'])
+
+            # negative results are cached too
+            q.get_institutions(invalidate=True)
+            self.assertEqual(2, len(mock.queried))
+
+            Profile.objects.create(user=User.objects.create(username='geocode_user_new'), institution='Georgia Tech')
+            q.get_institutions(invalidate=True)
+            self.assertEqual('georgia tech', mock.queried[-1])
+            self.assertEqual(3, len(mock.queried))
+
+        self.assertEqual(institutions['university of georgia'], q.get_institutions()['university of georgia'])
+
+    @override_settings(MAPBOX_NEGATIVE_CACHE_DAYS=1)
+    def test_negative_entries_expire(self):
+        mock = MockMapbox()
+        with patch('plantit.mapbox.get_institution', mock):
+            q.get_institutions(invalidate=True)
+            entry = json.loads(RedisClient.get().hget(geocodes.GEOCODES_KEY, 'unknown institute'))
+            entry['updated'] = time.time() - 2 * 24 * 60 * 60
+            RedisClient.get().hset(geocodes.GEOCODES_KEY, 'unknown institute', json.dumps(entry))
+
+            q.get_institutions(invalidate=True)
+            self.assertEqual(['unknown institute'], mock.queried[2:])
+
+    def test_failed_lookups_not_cached(self):
+        mock = MockMapbox()
+        with patch('plantit.mapbox.get_institution', mock):
+            entries = geocodes.geocode(['flaky college', 'university of georgia'], 'token')
+            self.assertEqual(['university of georgia'], list(entries.keys()))
+            geocodes.geocode(['flaky college', 'university of georgia'], 'token')
+            self.assertEqual(['flaky college'], mock.queried[2:])
+
+    def test_lookups_concurrent_and_bounded(self):
+        mock = MockMapbox(latency=0.05)
+        names = [f"institution {i}" for i in range(12)]
+        with patch('plantit.mapbox.get_institution', mock):
+            start = time.monotonic()
+            results = asyncio.run(mapbox.get_institutions(names, 'token', concurrency=4, per_second=1000))
+            elapsed = time.monotonic() - start
+
+        self.assertEqual(set(names), set(results.keys()))
+        self.assertEqual(4, mock.peak)
+        self.assertLess(elapsed, 12 * 0.05)
+
+    def test_rate_limited(self):
+        async def spend(limiter: mapbox.RateLimiter, n: int):
+            for _ in range(n): await limiter.wait()
+
+        start = time.monotonic()
+        asyncio.run(spend(mapbox.RateLimiter(per_second=50), 6))
+        self.assertGreaterEqual(time.monotonic() - start, 5 / 50)
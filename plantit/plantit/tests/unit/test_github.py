@@ -0,0 +1,159 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import yaml
+from django.test import TestCase
+
+import plantit.github as github
+import plantit.metrics as metrics
+from plantit.redis import RedisClient
+
+CONFIG = """
+name: Test Flow
+image: library/alpine
+commands: echo "Hello, world!"
+"""
+
+
+def mock_github(request: httpx.Request) -> httpx.Response:
+    path = request.url.path
+    if request.url.host == 'raw.githubusercontent.com':
+        return httpx.Response(200, text=CONFIG) if path.startswith('/owner/repo1/') else httpx.Response(404)
+    if path == '/users/owner/repos':
+        if request.url.params.get('page') == '2':
+            return httpx.Response(200, json=[{'name': 'repo2'}])
+        return httpx.Response(200, json=[{'name': 'repo1'}], headers={
+            'Link': '<https://api.github.com/users/owner/repos?per_page=100&page=2>; rel="next"'})
+    if path.endswith('/branches'):
+        return httpx.Response(200, json=[{'name': 'master'}, {'name': 'dev'}])
+    return httpx.Response(404)
+
+
+class GithubScrapingTests(TestCase):
+    async def test_list_connectable_repos_follows_pagination(self):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(mock_github)) as client:
+            repos = await github.list_repositories('owner', 'token', client=client)
+        self.assertEqual(['repo1', 'repo2'], [repo['name'] for repo in repos])
+
+    async def test_list_connectable_repos_finds_configs_on_each_branch(self):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(mock_github)) as client:
+            workflows = await github.list_connectable_repos('owner', 'token', concurrency=2, client=client)
+
+        self.assertEqual(2, len(workflows))
+        self.assertEqual(['master', 'dev'], [wf['branch']['name'] for wf in workflows])
+        self.assertTrue(all(wf['repo']['name'] == 'repo1' for wf in workflows))
+        self.assertTrue(all(wf['validation']['is_valid'] for wf in workflows))
+
+    async def test_list_connectable_repos_marks_org_workflows(self):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(mock_github)) as client:
+            workflows = await github.list_connectable_repos('owner', 'token', org=True, concurrency=2, client=client)
+
+        self.assertTrue(all(wf['repo']['organization'] == 'owner' for wf in workflows))
+        self.assertTrue(all(not wf['example'] for wf in workflows))
+
+
+def mock_github_graphql(request: httpx.Request) -> httpx.Response:
+    if request.url.path != '/graphql': return mock_github(request)
+
+    def ref(name: str, text: str = None):
+        return {'name': name, 'target': {'oid': f"{name}sha", 'file': {'object': {'text': text}} if text is not None else None}}
+
+    return httpx.Response(200, json={'data': {'repositoryOwner': {'repositories': {
+        'pageInfo': {'hasNextPage': False, 'endCursor': None},
+        'nodes': [{
+            'name': 'repo1',
+            'nameWithOwner': 'owner/repo1',
+            'description': None,
+            'url': 'https://github.com/owner/repo1',
+            'isPrivate': False,
+            'isArchived': False,
+            'isFork': False,
+            'stargazerCount': 0,
+            'forkCount': 0,
+            'createdAt': '2022-01-01T00:00:00Z',
+            'updatedAt': '2022-01-01T00:00:00Z',
+            'pushedAt': '2022-01-01T00:00:00Z',
+            'owner': {'__typename': 'User', 'login': 'owner', 'avatarUrl': '', 'url': 'https://github.com/owner'},
+            'defaultBranchRef': {'name': 'master'},
+            'repositoryTopics': {'nodes': [{'topic': {'name': 'phenotyping'}}]},
+            'refs': {'pageInfo': {'hasNextPage': False, 'endCursor': None}, 'nodes': [ref('master', CONFIG), ref('dev')]}
+        }]
+    }}}})
+
+
+def mock_github_graphql_unauthorized(request: httpx.Request) -> httpx.Response:
+    if request.url.path != '/graphql': return mock_github(request)
+    return httpx.Response(200, json={'errors': [{'type': 'INSUFFICIENT_SCOPES', 'message': 'Your token has not been granted the required scopes'}]})
+
+
+class GithubGraphQLScrapingTests(TestCase):
+    async def test_list_connectable_repos_via_graphql(self):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(mock_github_graphql)) as client:
+            workflows = await github.list_connectable_repos('owner', 'token', client=client, graphql=True)
+
+        self.assertEqual(['master'], [wf['branch']['name'] for wf in workflows])
+        self.assertEqual('repo1', workflows[0]['repo']['name'])
+        self.assertEqual('owner', workflows[0]['repo']['owner']['login'])
+        self.assertEqual(['phenotyping'], workflows[0]['repo']['topics'])
+        self.assertTrue(workflows[0]['validation']['is_valid'])
+
+    async def test_list_connectable_repos_falls_back_to_rest(self):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(mock_github_graphql_unauthorized)) as client:
+            workflows = await github.list_connectable_repos('owner', 'token', concurrency=2, client=client, graphql=True)
+
+        self.assertEqual(['master', 'dev'], [wf['branch']['name'] for wf in workflows])
+
+
+class ConfigCacheTests(TestCase):
+    def setUp(self):
+        metrics.flush()
+        RedisClient.get().delete(github.get_config_cache_key(CONFIG), metrics.METRICS_KEY)
+
+    def tearDown(self):
+        RedisClient.get().delete(github.get_config_cache_key(CONFIG), metrics.METRICS_KEY)
+
+    async def test_identical_configs_parsed_once(self):
+        with patch('plantit.github.yaml.safe_load', wraps=yaml.safe_load) as safe_load:
+            results = await asyncio.gather(*[github.parse_config(CONFIG) for _ in range(5)])
+            results.append(await github.parse_config(CONFIG))
+
+        self.assertEqual(1, safe_load.call_count)
+        self.assertTrue(all(config['name'] == 'Test Flow' and validation['is_valid'] for config, validation in results))
+        self.assertEqual({'hits': 5, 'misses': 1, 'hit_rate': 5 / 6}, metrics.get_cache_metrics()['workflow_config'])
+
+    async def test_invalid_config_cached(self):
+        text = CONFIG.replace('commands', 'command')
+        self.addCleanup(RedisClient.get().delete, github.get_config_cache_key(text))
+        for _ in range(2):
+            config, validation = await github.parse_config(text)
+            self.assertFalse(validation['is_valid'])
+
+        self.assertEqual(1, metrics.get_cache_metrics()['workflow_config']['hits'])
+
+    async def test_metrics_flushed_asynchronously(self):
+        # a due flush from the event loop shouldn't fall back to the synchronous client
+        with patch('plantit.metrics.FLUSH_INTERVAL_SECONDS', -1), patch('plantit.metrics.RedisClient.get', side_effect=AssertionError):
+            await github.parse_config(CONFIG)
+
+        self.assertEqual(1, int(RedisClient.get().hget(metrics.METRICS_KEY, 'workflow_config/misses')))
+
+    async def test_unchanged_config_image_rechecked(self):
+        text = CONFIG.replace('library/alpine', 'docker://test_unit/vanishing')
+        url = 'https://raw.githubusercontent.com/owner/repo1/master/plantit.yaml'
+        self.addCleanup(RedisClient.get().delete, github.get_config_cache_key(text), github.get_http_cache_key(url, 'token'))
+
+        def mock_raw(request: httpx.Request) -> httpx.Response:
+            if 'If-None-Match' in request.headers: return httpx.Response(304)
+            return httpx.Response(200, text=text, headers={'ETag': '"v1"'})
+
+        # the image exists when the config is first parsed, but is gone by the next scrape
+        images = [{'docker://test_unit/vanishing': True}, {'docker://test_unit/vanishing': False}]
+        with patch('plantit.github.docker.resolve_images', side_effect=images):
+            async with httpx.AsyncClient(transport=httpx.MockTransport(mock_raw)) as client:
+                repository, branch = {'name': 'repo1', 'owner': {'login': 'owner'}}, {'name': 'master'}
+                first = await github.get_branch_workflow(client, 'owner', repository, branch, 'token')
+                second = await github.get_branch_workflow(client, 'owner', repository, branch, 'token')
+
+        self.assertTrue(first['validation']['is_valid'])
+        self.assertFalse(second['validation']['is_valid'])
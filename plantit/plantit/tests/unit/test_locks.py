@@ -0,0 +1,47 @@
+import time
+
+from django.test import TestCase
+
+import plantit.locks as locks
+from plantit.redis import RedisClient
+
+
+class LockTests(TestCase):
+    def tearDown(self):
+        RedisClient.get().delete(locks.get_lock_key('test_lock'), locks.get_lock_key('test_lock/other'))
+
+    def test_only_one_holder(self):
+        first, second = locks.Lock('test_lock'), locks.Lock('test_lock')
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+
+        self.assertTrue(first.release())
+        self.assertTrue(second.acquire())
+        second.release()
+
+    def test_scopes_are_independent(self):
+        with locks.lock('test_lock') as acquired, locks.lock('test_lock/other') as other:
+            self.assertTrue(acquired)
+            self.assertTrue(other)
+
+    def test_only_owner_releases(self):
+        held = locks.Lock('test_lock')
+        held.acquire()
+        RedisClient.get().set(held.key, 'someone else')
+
+        self.assertFalse(held.release())
+        self.assertEqual(b'someone else', RedisClient.get().get(held.key))
+
+    def test_context_releases_on_exit(self):
+        with locks.lock('test_lock', renew=False) as acquired:
+            self.assertTrue(acquired)
+            with locks.lock('test_lock') as again: self.assertFalse(again)
+        self.assertFalse(RedisClient.get().exists(locks.get_lock_key('test_lock')))
+
+    def test_renewed_while_held(self):
+        held = locks.Lock('test_lock', ttl=1)
+        held.acquire(renew=True)
+        time.sleep(1.5)
+
+        self.assertTrue(held.locked())
+        self.assertTrue(held.release())
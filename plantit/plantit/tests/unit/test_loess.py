@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+from django.test import TestCase
+
+from plantit import loess
+
+
+class LoessTests(TestCase):
+    def assertMatchesReference(self, frame: pd.DataFrame, bandwidth: int, num_pts: int):
+        expected = loess.regress_wls(frame, bandwidth, num_pts)
+        actual = loess.regress(frame, bandwidth, num_pts)
+        np.testing.assert_allclose(actual['X'], expected['X'])
+        np.testing.assert_allclose(actual['Y'], expected['Y'], atol=1e-9)
+
+    def test_matches_reference_on_evenly_spaced_series(self):
+        # like running-task counts: evenly spaced ticks, non-negative integer counts
+        rng = np.random.default_rng(42)
+        xs = np.arange(0, 600 * 500, 600)
+        ys = np.maximum(0, np.cumsum(rng.normal(0, 1, len(xs)))).round()
+        frame = pd.DataFrame({'X': xs, 'Y': ys})
+        for bandwidth in [2, 10, 120]:
+            self.assertMatchesReference(frame, bandwidth, len(xs) // 2)
+
+    def test_matches_reference_on_irregular_series(self):
+        rng = np.random.default_rng(7)
+        frame = pd.DataFrame({'X': np.sort(rng.uniform(0, 1e6, 300)), 'Y': rng.normal(10, 3, 300)})
+        self.assertMatchesReference(frame, 25, 150)
+
+    def test_bandwidth_spanning_every_point(self):
+        frame = pd.DataFrame({'X': np.arange(50), 'Y': np.arange(50) % 7})
+        self.assertMatchesReference(frame, 50, 25)
@@ -0,0 +1,54 @@
+from unittest.mock import patch, AsyncMock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+import plantit.queries as q
+from plantit.ratelimit import RateLimited
+from plantit.redis import RedisClient
+from plantit.users.models import Profile
+
+ORGS = ['test_org_refresh_1', 'test_org_refresh_2']
+
+
+class OrgRefreshTests(TestCase):
+    def setUp(self):
+        for username in ['member1', 'member2']:
+            user = User.objects.create(username=username)
+            Profile.objects.create(user=user, github_username=username, github_token=f"{username}_token")
+
+    def tearDown(self):
+        redis = RedisClient.get()
+        for org in ORGS: redis.delete(f"workflows_updated/{org}", f"workflows_refreshing/{org}")
+
+    @patch('plantit.queries.refresh_org_workflow_cache', new_callable=AsyncMock)
+    async def test_each_org_refreshed_once(self, refresh):
+        deferred = await q.refresh_orgs_workflow_cache({org: ['member1', 'member2'] for org in ORGS})
+
+        self.assertEqual({}, deferred)
+        self.assertEqual(sorted(ORGS), sorted([call.args[0] for call in refresh.call_args_list]))
+        self.assertTrue(all(call.args[1] == 'member1_token' for call in refresh.call_args_list))
+
+    @patch('plantit.queries.refresh_org_workflow_cache', new_callable=AsyncMock)
+    async def test_fresh_org_skipped(self, refresh):
+        await sync_to_async(RedisClient.get().set)(f"workflows_updated/{ORGS[0]}", timezone.now().timestamp())
+        await q.refresh_orgs_workflow_cache({org: ['member1'] for org in ORGS})
+
+        self.assertEqual([ORGS[1]], [call.args[0] for call in refresh.call_args_list])
+
+    @patch('plantit.queries.refresh_org_workflow_cache', new_callable=AsyncMock)
+    async def test_next_member_token_tried_when_rate_limited(self, refresh):
+        refresh.side_effect = [RateLimited(60), None]
+        deferred = await q.refresh_orgs_workflow_cache({ORGS[0]: ['member1', 'member2']})
+
+        self.assertEqual({}, deferred)
+        self.assertEqual(['member1_token', 'member2_token'], [call.args[1] for call in refresh.call_args_list])
+
+    @patch('plantit.queries.refresh_org_workflow_cache', new_callable=AsyncMock)
+    async def test_deferred_when_every_member_rate_limited(self, refresh):
+        refresh.side_effect = [RateLimited(60), RateLimited(30)]
+        deferred = await q.refresh_orgs_workflow_cache({ORGS[0]: ['member1', 'member2']})
+
+        self.assertEqual({ORGS[0]: (30, ['member1', 'member2'])}, deferred)
@@ -0,0 +1,59 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+import plantit.metrics as metrics
+import plantit.querycache as querycache
+from plantit.redis import RedisClient
+from plantit.tasks.models import Task
+
+
+def get_querycache_test_calls(user: User, invalidate: bool = False) -> dict:
+    get_querycache_test_calls.calls += 1
+    return {'username': user.username, 'calls': get_querycache_test_calls.calls}
+
+
+class QueryCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='querycache_user')
+        get_querycache_test_calls.calls = 0
+        self.query = get_querycache_test_calls
+        self.cached = querycache.cached('querycache_test/{user.username}', ttl=60, tags=['tasks/{user.username}'])(self.query)
+
+    def tearDown(self):
+        querycache.invalidate_tags('tasks/querycache_user')
+
+    def test_result_cached(self):
+        self.assertEqual(1, self.cached(self.user)['calls'])
+        self.assertEqual(1, self.cached(self.user)['calls'])
+        self.assertEqual(1, self.query.calls)
+
+    def test_redis_tier_used_when_local_missing(self):
+        self.cached(self.user)
+        querycache.evict_local('querycache_test/querycache_user')
+
+        self.assertEqual(1, self.cached(self.user)['calls'])
+        self.assertEqual(1, self.query.calls)
+
+    def test_invalidate_argument_bypasses_cache(self):
+        self.cached(self.user)
+        self.assertEqual(2, self.cached(self.user, invalidate=True)['calls'])
+        self.assertEqual(2, self.cached(self.user)['calls'])
+
+    def test_model_signal_invalidates_tagged_entries(self):
+        self.cached(self.user)
+        Task.objects.create(guid='querycache_task', user=self.user, workflow={})
+
+        self.assertFalse(RedisClient.get().exists('querycache_test/querycache_user'))
+        self.assertEqual(2, self.cached(self.user)['calls'])
+
+    def test_hits_and_misses_counted(self):
+        metrics.flush()
+        RedisClient.get().hdel(metrics.METRICS_KEY, 'query/get_querycache_test_calls/hits', 'query/get_querycache_test_calls/misses')
+        for _ in range(3): self.cached(self.user)
+
+        self.assertEqual({'hits': 2, 'misses': 1, 'hit_rate': 2 / 3}, metrics.get_cache_metrics()['query/get_querycache_test_calls'])
+
+    def test_tag_sets_expire(self):
+        self.cached(self.user)
+        ttl = RedisClient.get().ttl(querycache.get_tag_key('tasks/querycache_user'))
+        self.assertTrue(60 < ttl <= querycache.get_tag_ttl(60))
@@ -0,0 +1,50 @@
+import time
+
+import httpx
+from django.test import TestCase, override_settings
+
+import plantit.ratelimit as ratelimit
+from plantit.redis import RedisClient
+
+TOKEN = 'test_ratelimit_token'
+
+
+def mock_github(remaining: int):
+    reset = int(time.time()) + 3600
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={}, headers={'X-RateLimit-Remaining': str(remaining), 'X-RateLimit-Reset': str(reset)})
+
+    return httpx.AsyncClient(
+        transport=httpx.MockTransport(handler),
+        headers={'Authorization': f"token {TOKEN}"},
+        event_hooks=ratelimit.EVENT_HOOKS)
+
+
+@override_settings(GITHUB_RATE_LIMIT_RESERVE=5, GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS=0)
+class RateLimitTests(TestCase):
+    def tearDown(self):
+        RedisClient.get().delete(ratelimit.get_budget_key(TOKEN))
+
+    async def test_background_requests_are_deferred_at_reserve(self):
+        async with mock_github(remaining=7) as client:
+            await client.get('https://api.github.com/users/owner')
+            with ratelimit.background():
+                await client.get('https://api.github.com/users/owner')  # 7 -> 6
+                await client.get('https://api.github.com/users/owner')  # 6 -> 5
+                with self.assertRaises(ratelimit.RateLimited) as e:
+                    await client.get('https://api.github.com/users/owner')
+        self.assertGreater(e.exception.retry_after, 0)
+
+    async def test_interactive_requests_spend_reserve(self):
+        async with mock_github(remaining=2) as client:
+            await client.get('https://api.github.com/users/owner')
+            await client.get('https://api.github.com/users/owner')  # 2 -> 1
+            await client.get('https://api.github.com/users/owner')  # 1 -> 0
+            with self.assertRaises(ratelimit.RateLimited):
+                await client.get('https://api.github.com/users/owner')
+
+    async def test_raw_content_requests_are_not_counted(self):
+        async with mock_github(remaining=0) as client:
+            await client.get('https://api.github.com/users/owner')
+            await client.get('https://raw.githubusercontent.com/owner/repo/master/plantit.yaml')
@@ -0,0 +1,30 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from django.test import TestCase
+
+from plantit.redis import RedisClient, close_on_shutdown, get_many
+
+
+class RedisTests(TestCase):
+    def tearDown(self):
+        redis = RedisClient.get()
+        for key in redis.scan_iter(match='redis_test/*'): redis.delete(key)
+
+    def test_get_many_preserves_order_and_missing_keys(self):
+        RedisClient.get().mset({'redis_test/a': '{"value": 1}', 'redis_test/b': '[2]'})
+        self.assertEqual([[2], None, {'value': 1}], get_many(['redis_test/b', 'redis_test/missing', 'redis_test/a']))
+        self.assertEqual([], get_many([]))
+
+    def test_async_client_closed_with_its_loop(self):
+        client = MagicMock(close=AsyncMock())
+
+        async def use():
+            closer = close_on_shutdown(client)
+            asyncio.get_running_loop().create_task(closer.__anext__())
+            await asyncio.sleep(0)
+            client.close.assert_not_awaited()
+            return closer
+
+        asyncio.run(use())
+        client.close.assert_awaited_once_with(close_connection_pool=True)
@@ -0,0 +1,44 @@
+import time
+
+import jwt
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+import plantit.queries as q
+import plantit.sessions as sessions
+from plantit.redis import RedisClient
+from plantit.users.models import Profile
+
+
+def token(username: str, expiry: float) -> str:
+    return jwt.encode({'preferred_username': username, 'exp': int(expiry)}, 'test_sessions_signing_key_of_sufficient_length', algorithm='HS256')
+
+
+class SessionIndexTests(TestCase):
+    def setUp(self):
+        now = time.time()
+        for username, expiry in [('online1', now + 3600), ('online2', now + 60), ('offline', now - 60)]:
+            user = User.objects.create(username=username)
+            Profile.objects.create(user=user, cyverse_access_token=token(username, expiry))
+
+    def tearDown(self):
+        RedisClient.get().delete(sessions.SESSIONS_KEY, sessions.SESSIONS_BUILT)
+
+    def test_missing_index_rebuilt_from_tokens(self):
+        RedisClient.get().delete(sessions.SESSIONS_KEY, sessions.SESSIONS_BUILT)
+
+        self.assertEqual(['online1', 'online2'], sorted(sessions.list_online()))
+        self.assertEqual(2, sessions.count_online())
+        self.assertEqual(['online1', 'online2'], sorted([user.username for user in q.list_online_users()]))
+
+    def test_recorded_session_extends_expiry(self):
+        sessions.ensure_index()
+        sessions.record_session('offline', token('offline', time.time() + 3600))
+
+        self.assertEqual(['offline', 'online1', 'online2'], sorted(sessions.list_online()))
+
+    def test_undecodable_token_ignored(self):
+        sessions.ensure_index()
+        sessions.record_session('online1', 'not a token')
+
+        self.assertEqual(2, sessions.count_online())
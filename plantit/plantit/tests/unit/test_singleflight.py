@@ -0,0 +1,85 @@
+import asyncio
+
+from django.test import TestCase
+
+import plantit.singleflight as singleflight
+from plantit.redis import RedisClient
+
+KEY = 'singleflight_test/key'
+
+
+class Computation:
+    def __init__(self, value='fresh'):
+        self.value = value
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return self.value
+
+
+class SingleFlightTests(TestCase):
+    def tearDown(self):
+        RedisClient.get().delete(singleflight.get_lease_key(KEY))
+
+    async def test_concurrent_calls_share_computation(self):
+        compute = Computation()
+        values = await asyncio.gather(*[singleflight.do(KEY, compute) for _ in range(10)])
+
+        self.assertEqual(['fresh'] * 10, values)
+        self.assertEqual(1, compute.calls)
+
+    async def test_waits_on_other_process_then_reloads(self):
+        redis = RedisClient.get()
+        redis.set(singleflight.get_lease_key(KEY), 'other', ex=5)
+        asyncio.get_running_loop().call_later(0.2, redis.delete, singleflight.get_lease_key(KEY))
+
+        compute = Computation()
+        value = await singleflight.do(KEY, compute, reload=lambda: 'theirs')
+
+        self.assertEqual('theirs', value)
+        self.assertEqual(0, compute.calls)
+
+    async def test_stale_value_served_and_revalidated_once(self):
+        compute = Computation()
+        values = [await singleflight.stale_while_revalidate(KEY, lambda: ('stale', 120), compute, max_age=60) for _ in range(10)]
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(['stale'] * 10, values)
+        self.assertEqual(1, compute.calls)
+
+    async def test_fresh_value_not_revalidated(self):
+        compute = Computation()
+        value = await singleflight.stale_while_revalidate(KEY, lambda: ('cached', 30), compute, max_age=60)
+        await asyncio.sleep(0.1)
+
+        self.assertEqual('cached', value)
+        self.assertEqual(0, compute.calls)
+
+    async def test_stale_value_read_asynchronously(self):
+        async def read(): return 'stale', 120
+
+        compute = Computation()
+        value = await singleflight.stale_while_revalidate(KEY, read, compute, max_age=60)
+        await asyncio.sleep(0.1)
+
+        self.assertEqual('stale', value)
+        self.assertEqual(1, compute.calls)
+
+    async def test_missing_value_computed(self):
+        compute = Computation()
+        values = await asyncio.gather(*[singleflight.stale_while_revalidate(KEY, lambda: None, compute, max_age=60) for _ in range(5)])
+
+        self.assertEqual(['fresh'] * 5, values)
+        self.assertEqual(1, compute.calls)
+
+    async def test_no_revalidation_while_other_process_holds_lease(self):
+        RedisClient.get().set(singleflight.get_lease_key(KEY), 'other', ex=5)
+
+        compute = Computation()
+        value = await singleflight.stale_while_revalidate(KEY, lambda: ('stale', 120), compute, max_age=60)
+        await asyncio.sleep(0.1)
+
+        self.assertEqual('stale', value)
+        self.assertEqual(0, compute.calls)
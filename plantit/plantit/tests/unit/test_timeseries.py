@@ -0,0 +1,45 @@
+import numpy as np
+from django.test import TestCase
+
+from plantit.utils.timeseries import count_running
+
+
+def count_running_naive(starts, ends, resolution, window_start=None):
+    first = min(starts) if window_start is None else window_start
+    ticks = list(range(first, max(ends), resolution))
+    return ticks, [len([1 for s, e in zip(starts, ends) if s <= t <= e]) for t in ticks]
+
+
+class CountRunningTests(TestCase):
+    def test_matches_naive_count(self):
+        rng = np.random.default_rng(42)
+        starts = rng.integers(0, 100000, 500)
+        ends = starts + rng.integers(0, 20000, 500)
+
+        for resolution in [1, 60, 600, 7]:
+            ticks, running = count_running(starts, ends, resolution)
+            expected_ticks, expected_running = count_running_naive(starts.tolist(), ends.tolist(), resolution)
+            self.assertEqual(expected_ticks, ticks.tolist())
+            self.assertEqual(expected_running, running.tolist())
+
+    def test_window_counts_intervals_started_before_it(self):
+        starts = [0, 100, 500, 900]
+        ends = [1000, 200, 1000, 950]
+        ticks, running = count_running(starts, ends, 100, window_start=300)
+        expected_ticks, expected_running = count_running_naive(starts, ends, 100, window_start=300)
+        self.assertEqual(expected_ticks, ticks.tolist())
+        self.assertEqual(expected_running, running.tolist())
+
+    def test_boundaries_are_inclusive(self):
+        ticks, running = count_running([0, 10], [10, 20], 10)
+        self.assertEqual([0, 10], ticks.tolist())
+        self.assertEqual([1, 2], running.tolist())
+
+    def test_empty_and_invalid_intervals(self):
+        ticks, running = count_running([], [], 10)
+        self.assertEqual(0, len(ticks))
+        self.assertEqual(0, len(running))
+
+        ticks, running = count_running([0, 50], [100, 40], 10)
+        self.assertEqual(list(range(0, 100, 10)), ticks.tolist())
+        self.assertEqual([1] * 10, running.tolist())
@@ -0,0 +1,41 @@
+import time
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+import plantit.sessions as sessions
+from plantit.celery_tasks import refresh_all_user_cyverse_tokens, refresh_cyverse_tokens
+from plantit.redis import RedisClient
+from plantit.tasks.models import Task, TaskStatus
+from plantit.users.models import Profile
+
+
+class TokenRefreshSchedulingTests(TestCase):
+    def setUp(self):
+        now = time.time()
+        redis = RedisClient.get()
+        redis.set(sessions.SESSIONS_BUILT, 1)
+        for username, expiry, running in [('expiring', now + 60, 3), ('idle', now + 60, 0), ('fresh', now + 86400, 1)]:
+            user = User.objects.create(username=username)
+            Profile.objects.create(user=user)
+            redis.zadd(sessions.SESSIONS_KEY, {username: expiry})
+            for i in range(running): Task.objects.create(guid=f"{username}{i}", user=user, workflow={}, status=TaskStatus.RUNNING)
+
+    def tearDown(self):
+        RedisClient.get().delete(sessions.SESSIONS_KEY, sessions.SESSIONS_BUILT)
+
+    @patch('plantit.celery_tasks.group')
+    def test_each_expiring_user_with_running_tasks_refreshed_once(self, group):
+        refresh_all_user_cyverse_tokens()
+
+        signatures = group.call_args.args[0]
+        self.assertEqual([('expiring',)], [signature.args for signature in signatures])
+
+    @patch('plantit.celery_tasks.refresh_user_cyverse_tokens')
+    def test_already_refreshed_user_skipped(self, refresh):
+        refresh_cyverse_tokens('fresh')
+        refresh.assert_not_called()
+
+        refresh_cyverse_tokens('expiring')
+        self.assertEqual('expiring', refresh.call_args.args[0].username)
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from plantit import usage as usage
+from plantit.agents.models import Agent
+from plantit.queries import get_agents_usage_timeseries, get_agent_usage_timeseries, get_tasks_total_timeseries
+from plantit.tasks.models import Task, TaskUsage
+
+
+def rollups() -> list:
+    return list(TaskUsage.objects.order_by('day', 'workflow_name').values_list('day', 'agent', 'workflow_name', 'workflow_public', 'tasks', 'completed', 'runtime'))
+
+
+class TaskUsageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='usage_rollup_user')
+        self.agent = Agent.objects.create(name='usage_agent', guid='usage_agent', public=True)
+        self.tasks = 0
+        self.now = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    def create_task(self, name: str = 'repo', days_ago: int = 0, agent: Agent = None, public: bool = True) -> Task:
+        self.tasks += 1
+        return Task.objects.create(guid=f"usage_rollup_task_{self.tasks}", user=self.user, agent=agent, created=self.now - timedelta(days=days_ago),
+                                   workflow={'public': public}, workflow_owner='owner', workflow_name=name, workflow_branch='main')
+
+    def test_rollup_follows_task_lifecycle(self):
+        task = self.create_task(agent=self.agent)
+        self.create_task(agent=self.agent)
+        self.assertEqual([(self.now.date(), 'usage_agent', 'repo', True, 2, 0, timedelta(0))], rollups())
+
+        # saves while running don't count, completion does (once)
+        task.status = 'running'
+        task.save()
+        task.completed = task.created + timedelta(minutes=5)
+        task.save()
+        task.save()
+        self.assertEqual([(self.now.date(), 'usage_agent', 'repo', True, 2, 1, timedelta(minutes=5))], rollups())
+
+        task.delete()
+        self.assertEqual([(self.now.date(), 'usage_agent', 'repo', True, 1, 0, timedelta(0))], rollups())
+
+    def test_backfill_matches_incremental_rollups(self):
+        self.create_task('repo', 0, self.agent)
+        self.create_task('repo', 1)
+        self.create_task('other', 1, public=False)
+        completed = self.create_task('repo', 3, self.agent)
+        completed.completed = completed.created + timedelta(hours=1)
+        completed.save()
+        incremental = rollups()
+
+        TaskUsage.objects.all().delete()
+        call_command('backfill_task_usage', stdout=StringIO())
+        self.assertEqual(incremental, rollups())
+
+    def test_usage_timeseries_read_from_rollups(self):
+        private = Agent.objects.create(name='usage_private_agent', guid='usage_private_agent')
+        self.create_task('repo', 0, self.agent)
+        self.create_task('repo', 0, self.agent)
+        self.create_task('repo', 2, private)
+        self.create_task('repo', 2)
+
+        today = datetime.combine(self.now.date(), datetime.min.time()).isoformat()
+        two_days_ago = datetime.combine(self.now.date() - timedelta(days=2), datetime.min.time()).isoformat()
+        self.assertEqual({today: 2}, get_agent_usage_timeseries('usage_agent'))
+        self.assertEqual({'usage_agent': {today: 2}}, get_agents_usage_timeseries())
+        self.assertEqual({'usage_agent': {today: 2}, 'usage_private_agent': {two_days_ago: 1}}, get_agents_usage_timeseries(self.user))
+        self.assertEqual([(two_days_ago, 2), (today, 4)], get_tasks_total_timeseries())
+
+    def test_user_agents_usage_limited_to_recent_tasks(self):
+        for _ in range(3): self.create_task('repo', 5, self.agent)
+        for _ in range(99): self.create_task('repo', 1, self.agent)
+        self.create_task('repo', 0)
+
+        # the user's 100 most recent tasks (one without an agent), so none of the oldest day's
+        yesterday = datetime.combine(self.now.date() - timedelta(days=1), datetime.min.time()).isoformat()
+        five_days_ago = datetime.combine(self.now.date() - timedelta(days=5), datetime.min.time()).isoformat()
+        self.assertEqual({'usage_agent': {yesterday: 99}}, get_agents_usage_timeseries(self.user))
+        self.assertEqual({'usage_agent': {yesterday: 99, five_days_ago: 3}}, get_agents_usage_timeseries())
+
+        # the total series has one cumulative point per day with tasks
+        today = datetime.combine(self.now.date(), datetime.min.time()).isoformat()
+        self.assertEqual([(five_days_ago, 3), (yesterday, 102), (today, 103)], get_tasks_total_timeseries())
+
+    def test_usage_day_is_utc_date(self):
+        self.assertEqual(datetime(2022, 1, 2).date(), usage.get_usage_day(datetime(2022, 1, 2, 1, 0, tzinfo=timezone.utc)))
@@ -0,0 +1,55 @@
+from unittest.mock import patch, AsyncMock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+import plantit.queries as q
+from plantit.redis import RedisClient
+from plantit.users.models import Profile
+
+
+def github_profile(user):
+    return {'login': user.username}
+
+
+class UserDirectoryTests(TestCase):
+    def setUp(self):
+        for username in ['directory1', 'directory2']:
+            user = User.objects.create(username=username, first_name=username)
+            Profile.objects.create(user=user, github_username=username, github_token=f"{username}_token")
+        User.objects.create(username='directory3', first_name='directory3')
+        Profile.objects.create(user=User.objects.get(username='directory3'))
+
+    def tearDown(self):
+        RedisClient.get().delete(q.USERS_KEY, q.USERS_META_KEY, 'users_updated')
+
+    @patch('plantit.queries.get_user_github_organizations', new_callable=AsyncMock, return_value=[])
+    @patch('plantit.queries.get_user_github_profile', new_callable=AsyncMock, side_effect=github_profile)
+    async def test_directory_read_from_hash(self, profile, organizations):
+        await q.refresh_user_cache()
+        users = await sync_to_async(q.list_users)()
+
+        self.assertEqual(['directory1', 'directory2', 'directory3'], sorted([u['username'] for u in users]))
+        self.assertEqual(['directory1', 'directory2'], sorted([u['github_profile']['login'] for u in users if 'github_profile' in u]))
+        self.assertEqual(2, profile.call_count)
+
+    @patch('plantit.queries.get_user_github_organizations', new_callable=AsyncMock, return_value=[])
+    @patch('plantit.queries.get_user_github_profile', new_callable=AsyncMock, side_effect=github_profile)
+    async def test_only_changed_users_refreshed(self, profile, organizations):
+        await q.refresh_user_cache()
+        await sync_to_async(User.objects.filter(username='directory2').update)(first_name='changed')
+        await q.refresh_user_cache()
+
+        self.assertEqual(['directory1', 'directory2', 'directory2'], sorted([call.args[0].username for call in profile.call_args_list]))
+        users = {u['username']: u for u in await sync_to_async(q.list_users)()}
+        self.assertEqual('changed', users['directory2']['first_name'])
+
+    @patch('plantit.queries.get_user_github_organizations', new_callable=AsyncMock, return_value=[])
+    @patch('plantit.queries.get_user_github_profile', new_callable=AsyncMock, side_effect=github_profile)
+    async def test_deleted_users_removed(self, profile, organizations):
+        await q.refresh_user_cache()
+        await sync_to_async(User.objects.filter(username='directory1').delete)()
+        await q.refresh_user_cache()
+
+        self.assertEqual(['directory2', 'directory3'], sorted([u['username'] for u in await sync_to_async(q.list_users)()]))
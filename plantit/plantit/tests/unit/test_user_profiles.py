@@ -0,0 +1,41 @@
+import json
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from plantit.ratelimit import RateLimited
+from plantit.users.models import Profile
+from plantit.users.views import UsersViewSet
+
+ORG = 'Computational-Plant-Science'
+
+
+class GitHubProfileTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='profile_test_user', password='password')
+        Profile.objects.create(user=self.user, github_username='profile_test_user', github_token='token')
+        self.view = UsersViewSet.as_view({'get': 'get_by_username'})
+
+    def get_by_username(self, username):
+        request = APIRequestFactory().get('/apis/v1/users/get_by_username/', {'username': username})
+        force_authenticate(request, user=self.user)
+        return self.view(request)
+
+    @patch('plantit.users.views.get_profile')
+    def test_profile_fetched_through_shared_client(self, get_profile):
+        get_profile.return_value = {'login': ORG}
+        response = self.get_by_username(ORG)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({'login': ORG}, json.loads(response.content)['github_profile'])
+        get_profile.assert_called_once_with(ORG, 'token')
+
+    @patch('plantit.users.views.get_profile')
+    def test_rate_limited(self, get_profile):
+        get_profile.side_effect = RateLimited(60)
+        response = self.get_by_username(ORG)
+
+        self.assertEqual(429, response.status_code)
+        self.assertEqual('60', response['Retry-After'])
@@ -0,0 +1,114 @@
+import threading
+import time
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django_celery_beat.models import IntervalSchedule
+from requests import HTTPError
+
+import plantit.queries as q
+from plantit.miappe.models import Investigation
+from plantit.notifications.models import Notification
+from plantit.tasks.models import DelayedTask
+from plantit.users.models import Profile
+import plantit.querycache as querycache
+from plantit.redis import RedisClient
+
+
+class SlowSection:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self, user):
+        self.calls += 1
+        time.sleep(0.2)
+        return self.value
+
+
+class ConcurrentSection(SlowSection):
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def __call__(self, user):
+        with ConcurrentSection.lock:
+            ConcurrentSection.running += 1
+            ConcurrentSection.peak = max(ConcurrentSection.peak, ConcurrentSection.running)
+        try: return super().__call__(user)
+        finally:
+            with ConcurrentSection.lock: ConcurrentSection.running -= 1
+
+
+class UserSectionsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='sections_user')
+
+    def tearDown(self):
+        redis = RedisClient.get()
+        for key in redis.scan_iter(match='user_sections/sections_user/*'):
+            redis.delete(key)
+            querycache.evict_local(key.decode('utf-8'))
+
+    def test_sections_computed_concurrently(self):
+        sections = {'first': (SlowSection(1), 60, []), 'second': (SlowSection(2), 60, []), 'third': (SlowSection(3), 60, [])}
+        with patch.dict(q.USER_SECTIONS, sections, clear=True):
+            start = time.monotonic()
+            computed = q.get_user_sections(self.user, ['first', 'second', 'third'])
+            elapsed = time.monotonic() - start
+
+        self.assertEqual({'first': 1, 'second': 2, 'third': 3}, computed)
+        self.assertLess(elapsed, 0.5)
+
+    def test_sections_cached_independently(self):
+        first, second = SlowSection(1), SlowSection(2)
+        with patch.dict(q.USER_SECTIONS, {'first': (first, 60, []), 'second': (second, 60, [])}, clear=True):
+            q.get_user_sections(self.user, ['first'])
+            computed = q.get_user_sections(self.user, ['first', 'second'])
+            q.get_user_sections(self.user, ['second'], invalidate=True)
+
+        self.assertEqual({'first': 1, 'second': 2}, computed)
+        self.assertEqual(1, first.calls)
+        self.assertEqual(2, second.calls)
+
+    @override_settings(USER_SECTIONS_CONCURRENCY=2)
+    def test_sections_concurrency_bounded(self):
+        sections = {str(i): (ConcurrentSection(i), 60, []) for i in range(5)}
+        with patch.dict(q.USER_SECTIONS, sections, clear=True):
+            computed = q.get_user_sections(self.user, list(sections.keys()))
+
+        self.assertEqual({str(i): i for i in range(5)}, computed)
+        self.assertEqual(2, ConcurrentSection.peak)
+
+    def test_notifications_invalidated_when_changed(self):
+        notification = Notification.objects.create(guid='sections_notification', user=self.user, message='hello')
+        self.assertFalse(q.get_user_section(self.user, 'notifications')[0]['read'])
+
+        notification.read = True
+        notification.save()
+        self.assertTrue(q.get_user_section(self.user, 'notifications')[0]['read'])
+
+    def test_cyverse_failures_distinguished(self):
+        Profile.objects.create(user=self.user, cyverse_access_token='token')
+        with patch('plantit.queries.get_user_cyverse_profile', side_effect=HTTPError('403 Forbidden')):
+            with self.assertRaises(q.CyVerseProfileUnavailable) as raised:
+                q.get_user_sections(self.user, ['cyverse_profile'])
+        self.assertIsInstance(raised.exception.error, HTTPError)
+
+        # other sections' errors propagate as-is
+        def fail(user): raise ValueError()
+        with patch.dict(q.USER_SECTIONS, {'failing': (fail, 60, [])}, clear=True):
+            with self.assertRaises(ValueError): q.get_user_sections(self.user, ['failing'])
+
+    def test_sections_with_dates_cached(self):
+        eta = timezone.now() + timedelta(days=1)
+        schedule = IntervalSchedule.objects.create(every=10, period=IntervalSchedule.SECONDS)
+        DelayedTask.objects.create(user=self.user, interval=schedule, eta=eta, one_off=True, name='sections_delayed', task='plantit.celery_tasks.create_and_submit_delayed')
+        Investigation.objects.create(owner=self.user, guid='sections_project', title='Project', submission_date=date(2022, 1, 2))
+
+        for _ in range(2):
+            self.assertEqual(eta.isoformat()[:19], q.get_user_section(self.user, 'delayed_tasks')[0]['eta'][:19])
+            self.assertEqual('2022-01-02', q.get_user_section(self.user, 'projects')[0]['submission_date'])
@@ -0,0 +1,85 @@
+from datetime import timedelta
+from unittest.mock import AsyncMock, patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+import plantit.queries as q
+import plantit.querycache as querycache
+from plantit.agents.models import Agent
+from plantit.miappe.models import Investigation
+from plantit.queries import get_user_task_aggregates
+from plantit.redis import RedisClient
+from plantit.tasks.models import Task
+from plantit.users.models import Profile
+
+
+class UserTaskAggregatesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='stats_user')
+        self.other = User.objects.create(username='stats_other')
+        self.agent = Agent.objects.create(name='stats_agent', guid='stats_agent', user=self.user)
+        self.guest_agent = Agent.objects.create(name='stats_guest_agent', guid='stats_guest_agent', user=self.other)
+        self.guest_agent.users_authorized.add(self.user)
+        self.project = Investigation.objects.create(owner=self.user, guid='p1', title='Project 1')
+        self.older_project = Investigation.objects.create(owner=self.user, guid='p2', title='Project 2')
+        self.now = timezone.now()
+        self.tasks = 0
+
+    def create_task(self, workflow: str, minutes_ago: int, agent: Agent = None, project: Investigation = None, status: str = 'created', runtime: int = None):
+        self.tasks += 1
+        created = self.now - timedelta(minutes=minutes_ago)
+        Task.objects.create(
+            guid=f"stats_task_{self.tasks}", user=self.user, agent=agent, project=project, status=status, workflow={},
+            workflow_owner='owner', workflow_name=workflow, workflow_branch='main', created=created,
+            completed=created + timedelta(seconds=runtime) if runtime is not None else None)
+
+    def test_aggregates(self):
+        self.create_task('b', 10, self.agent, self.older_project, 'success', runtime=30)
+        self.create_task('a', 5, self.guest_agent, self.project, 'failure', runtime=90)
+        self.create_task('b', 1, self.agent, self.older_project)
+        self.create_task('b', 20)
+        Task.objects.create(guid='stats_other_task', user=self.other, workflow={}, workflow_owner='owner', workflow_name='c', workflow_branch='main')
+
+        with self.assertNumQueries(7):
+            stats = get_user_task_aggregates(self.user)
+
+        self.assertEqual({
+            'total_tasks': 4,
+            'total_task_seconds': 120.0,
+            'workflow_usage': {'values': [1, 3], 'labels': ['owner/a', 'owner/b']},
+            'agent_usage': {'values': [2, 1], 'labels': ['stats_agent', 'stats_guest_agent']},
+            # in order of their most recent task
+            'project_usage': {'values': [2, 1], 'labels': ['p2 (Project 2)', 'p1 (Project 1)']},
+            # most recent task first
+            'task_status': {'values': [0, 0, 1, 0], 'labels': ['FAILURE', 'FAILURE', 'SUCCESS', 'FAILURE']},
+            'owned_agents': ['stats_agent'],
+            'guest_agents': ['stats_guest_agent'],
+        }, stats)
+
+    def test_aggregates_without_tasks(self):
+        stats = get_user_task_aggregates(self.other)
+        self.assertEqual(0, stats['total_tasks'])
+        self.assertEqual(0, stats['total_task_seconds'])
+        self.assertEqual({'values': [], 'labels': []}, stats['agent_usage'])
+
+
+class UserStatisticsCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='stats_cache_user')
+        Profile.objects.create(user=self.user)
+
+    def tearDown(self):
+        querycache.invalidate_tags('tasks/stats_cache_user')
+
+    def test_statistics_cached_with_ttl_until_tasks_change(self):
+        with patch('plantit.queries.compute_user_statistics', AsyncMock(side_effect=[{'total_tasks': 0}, {'total_tasks': 1}])) as compute:
+            self.assertEqual(0, async_to_sync(q.get_user_statistics)(self.user)['total_tasks'])
+            self.assertEqual(0, async_to_sync(q.get_user_statistics)(self.user)['total_tasks'])
+            self.assertEqual(1, compute.await_count)
+            self.assertTrue(0 < RedisClient.get().ttl('stats/stats_cache_user') <= q.USER_STATISTICS_TTL)
+
+            Task.objects.create(guid='stats_cache_task', user=self.user, workflow={})
+            self.assertEqual(1, async_to_sync(q.get_user_statistics)(self.user)['total_tasks'])
@@ -0,0 +1,73 @@
+from unittest.mock import AsyncMock, patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+import plantit.userstats as userstats
+from plantit.celery_tasks import refresh_all_users_stats, refresh_user_stats
+from plantit.redis import RedisClient
+from plantit.tasks.models import Task, TaskStatus
+
+
+class UserStatsTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username='stats_alice')
+        self.bob = User.objects.create(username='stats_bob')
+        User.objects.create(username='stats_idle')
+        self.tasks = 0
+
+    def tearDown(self):
+        RedisClient.get().delete(userstats.DIRTY_KEY, userstats.CONTRIBUTIONS_KEY, userstats.TOTALS_KEY, userstats.TOTALS_BUILT)
+
+    def create_task(self, user: User, status: str = TaskStatus.RUNNING) -> Task:
+        self.tasks += 1
+        return Task.objects.create(guid=f"userstats_task_{self.tasks}", user=user, workflow={}, status=status)
+
+    def test_task_changes_mark_user_dirty(self):
+        userstats.take_dirty()
+        task = self.create_task(self.alice)
+        self.assertEqual(['stats_alice'], userstats.take_dirty())
+        self.assertEqual([], userstats.take_dirty())
+
+        task.status = TaskStatus.COMPLETED
+        task.save()
+        self.create_task(self.bob)
+        self.assertEqual(['stats_alice', 'stats_bob'], userstats.take_dirty())
+
+    def test_totals_follow_contribution_deltas(self):
+        task = self.create_task(self.alice)
+        self.create_task(self.alice, TaskStatus.COMPLETED)
+        self.create_task(self.bob)
+        self.assertEqual({'tasks': 3, 'running': 2}, userstats.get_totals())
+
+        task.status = TaskStatus.COMPLETED
+        task.save()
+        self.create_task(self.bob)
+        self.assertEqual({'tasks': 3, 'running': 2}, userstats.get_totals())
+
+        userstats.apply_contribution('stats_alice', userstats.count_contribution(self.alice))
+        self.assertEqual({'tasks': 3, 'running': 1}, userstats.get_totals())
+        userstats.apply_contribution('stats_bob', userstats.count_contribution(self.bob))
+        self.assertEqual({'tasks': 4, 'running': 2}, userstats.get_totals())
+
+        userstats.apply_contribution('stats_bob', None)
+        self.assertEqual({'tasks': 2, 'running': 0}, userstats.get_totals())
+
+    @patch('plantit.celery_tasks.q')
+    @patch('plantit.celery_tasks.group')
+    def test_only_dirty_users_refreshed(self, group, q):
+        userstats.take_dirty()
+        refresh_all_users_stats()
+        group.assert_not_called()
+
+        self.create_task(self.alice)
+        refresh_all_users_stats()
+        self.assertEqual([('stats_alice',)], [signature.args for signature in group.call_args.args[0]])
+        self.assertEqual([], userstats.take_dirty())
+
+    @patch('plantit.celery_tasks.q')
+    def test_failed_refresh_marks_user_dirty_again(self, q):
+        userstats.take_dirty()
+        q.get_user_statistics = AsyncMock(side_effect=RuntimeError())
+        with self.assertRaises(RuntimeError): refresh_user_stats('stats_alice')
+        self.assertEqual(['stats_alice'], userstats.take_dirty())
@@ -0,0 +1,72 @@
+import hashlib
+import hmac
+import json
+from unittest.mock import patch
+
+from django.test import TestCase, RequestFactory, override_settings
+
+from plantit.workflows.views import webhook
+
+SECRET = 'secret'
+
+
+def signed_request(event: str, payload: dict, secret: str = SECRET):
+    body = json.dumps(payload).encode('utf-8')
+    signature = 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return RequestFactory().post(
+        '/apis/v1/workflows/webhook/',
+        data=body,
+        content_type='application/json',
+        HTTP_X_GITHUB_EVENT=event,
+        HTTP_X_HUB_SIGNATURE_256=signature)
+
+
+def repository(owner: str = 'owner', name: str = 'repo', owner_type: str = 'User'):
+    return {'name': name, 'owner': {'login': owner, 'type': owner_type}}
+
+
+@override_settings(GITHUB_WEBHOOK_SECRET=SECRET)
+class WebhookTests(TestCase):
+    def test_rejects_bad_signature(self):
+        response = webhook(signed_request('push', {'repository': repository()}, secret='wrong'))
+        self.assertEqual(401, response.status_code)
+
+    @override_settings(GITHUB_WEBHOOK_SECRET='')
+    def test_rejects_when_no_secret_configured(self):
+        response = webhook(signed_request('ping', {}, secret=''))
+        self.assertEqual(401, response.status_code)
+
+    def test_ping(self):
+        self.assertEqual(200, webhook(signed_request('ping', {'zen': 'Keep it logically awesome.'})).status_code)
+
+    @patch('plantit.workflows.views.refresh_workflow')
+    def test_push_refreshes_branch(self, refresh):
+        payload = {'ref': 'refs/heads/master', 'repository': repository(owner_type='Organization'), 'sender': {'login': 'user'}}
+        response = webhook(signed_request('push', payload))
+
+        self.assertEqual(202, response.status_code)
+        refresh.s.assert_called_once_with('owner', 'repo', 'master', True, 'user')
+
+    @patch('plantit.workflows.views.refresh_workflow')
+    def test_push_to_tag_is_ignored(self, refresh):
+        response = webhook(signed_request('push', {'ref': 'refs/tags/v1', 'repository': repository()}))
+
+        self.assertEqual(204, response.status_code)
+        refresh.s.assert_not_called()
+
+    @patch('plantit.workflows.views.remove_workflow')
+    def test_branch_deletion_removes_branch(self, remove):
+        response = webhook(signed_request('delete', {'ref': 'dev', 'ref_type': 'branch', 'repository': repository()}))
+
+        self.assertEqual(202, response.status_code)
+        remove.s.assert_called_once_with('owner', 'repo', 'dev')
+
+    @patch('plantit.workflows.views.refresh_workflow')
+    @patch('plantit.workflows.views.remove_workflow')
+    def test_renamed_repository_moves_workflows(self, remove, refresh):
+        payload = {'action': 'renamed', 'changes': {'repository': {'name': {'from': 'old'}}}, 'repository': repository()}
+        response = webhook(signed_request('repository', payload))
+
+        self.assertEqual(202, response.status_code)
+        remove.s.assert_called_once_with('owner', 'old')
+        refresh.s.assert_called_once_with('owner', 'repo', None, False, None)
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from plantit import querycache as querycache
+from plantit.queries import get_workflow_usage_timeseries, get_workflows_usage_timeseries
+from plantit.tasks.models import Task
+
+
+def day(days_ago: int) -> str:
+    return datetime.combine(timezone.now().date() - timedelta(days=days_ago), datetime.min.time()).isoformat()
+
+
+@override_settings(STATS_WINDOW_WIDTH_DAYS=3)
+class WorkflowUsageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='usage_user')
+        self.tasks = 0
+
+    def tearDown(self):
+        querycache.invalidate_tags('tasks/workflow/owner/repo/main')
+
+    def create_task(self, name: str, days_ago: int, public: bool = True):
+        self.tasks += 1
+        created = timezone.now().replace(hour=12) - timedelta(days=days_ago)
+        Task.objects.create(guid=f"usage_task_{self.tasks}", user=self.user, created=created, workflow={'public': public},
+                            workflow_owner='owner', workflow_name=name, workflow_branch='main')
+
+    def test_workflows_usage_is_zero_filled(self):
+        self.create_task('repo', 0)
+        self.create_task('repo', 0)
+        self.create_task('repo', 2)
+        self.create_task('other', 1, public=False)
+        self.create_task('repo', 10)
+
+        self.assertEqual({'owner/repo/main': {day(3): 0, day(2): 1, day(1): 0, day(0): 2}}, get_workflows_usage_timeseries())
+        self.assertEqual({
+            'owner/repo/main': {day(3): 0, day(2): 1, day(1): 0, day(0): 2},
+            'owner/other/main': {day(3): 0, day(2): 0, day(1): 1, day(0): 0},
+        }, get_workflows_usage_timeseries(self.user))
+
+    def test_workflows_usage_empty(self):
+        self.assertEqual({}, get_workflows_usage_timeseries())
+
+    def test_workflow_usage_counts_every_day_with_tasks(self):
+        self.create_task('repo', 0)
+        self.create_task('repo', 10)
+        self.create_task('repo', 10)
+        self.create_task('other', 0)
+
+        self.assertEqual({day(0): 1, day(10): 2}, get_workflow_usage_timeseries('owner', 'repo', 'main', invalidate=True))
@@ -0,0 +1,85 @@
+import logging
+from datetime import date, timedelta
+from typing import Dict, Tuple
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from plantit.tasks.models import Task, TaskUsage
+
+logger = logging.getLogger(__name__)
+
+
+def get_usage_day(created) -> date:
+    # usage charts have always labeled tasks by their UTC creation date (`task.created.date()`), so days are UTC
+    # (rather than `TIME_ZONE`, which the windowed series used to select days by)
+    return timezone.localtime(created, timezone.utc).date()
+
+
+def get_usage_key(task: Task) -> dict:
+    return {
+        'day': get_usage_day(task.created),
+        'user_id': task.user_id,
+        'agent': task.agent.name if task.agent_id is not None else '',
+        'workflow_owner': task.workflow_owner,
+        'workflow_name': task.workflow_name,
+        'workflow_branch': task.workflow_branch,
+        'workflow_public': bool((task.workflow or {}).get('public', False)),
+    }
+
+
+def get_runtime(task: Task) -> timedelta:
+    return task.completed - task.created if task.completed is not None else timedelta(0)
+
+
+def record(task: Task, tasks: int = 0, completed: int = 0, runtime: timedelta = timedelta(0), create: bool = True):
+    """
+    Adds to the counts (and runtime) of the given task's rollup row, creating it if need be (unless `create` is False).
+
+    Args:
+        task: The task
+        tasks: The change in the number of tasks
+        completed: The change in the number of completed tasks
+        runtime: The change in total runtime
+        create: Whether to create the row if it doesn't exist (it shouldn't be while the task's user is being deleted)
+    """
+
+    key = get_usage_key(task)
+    with transaction.atomic():
+        if create: TaskUsage.objects.get_or_create(**key)
+        TaskUsage.objects.filter(**key).update(
+            tasks=F('tasks') + tasks,
+            completed=F('completed') + completed,
+            runtime=F('runtime') + runtime)
+
+
+def backfill() -> int:
+    """
+    Rebuilds every rollup row from the task table.
+
+    Returns:
+        The number of rows
+    """
+
+    rows: Dict[Tuple, TaskUsage] = dict()
+    tasks = Task.objects.order_by().values_list(
+        'created', 'completed', 'user_id', 'agent__name', 'workflow_owner', 'workflow_name', 'workflow_branch', 'workflow__public')
+    for created, completed, user_id, agent, owner, name, branch, public in tasks.iterator(chunk_size=2000):
+        public = bool(public)
+        key = (get_usage_day(created), user_id, agent or '', owner, name, branch, public)
+        usage = rows.get(key, None)
+        if usage is None:
+            usage = TaskUsage(day=key[0], user_id=user_id, agent=key[2], workflow_owner=owner, workflow_name=name, workflow_branch=branch, workflow_public=public)
+            rows[key] = usage
+        usage.tasks += 1
+        if completed is not None:
+            usage.completed += 1
+            usage.runtime += completed - created
+
+    with transaction.atomic():
+        TaskUsage.objects.all().delete()
+        TaskUsage.objects.bulk_create(rows.values(), batch_size=1000)
+
+    logger.info(f"Backfilled {len(rows)} task usage rollup(s)")
+    return len(rows)
@@ -1,7 +1,6 @@
 import json
 import logging
 import os
-import traceback
 from urllib.parse import parse_qs
 from urllib.parse import urlencode
 
@@ -16,7 +15,6 @@ from django.http import HttpResponseBadRequest, HttpResponse, JsonResponse
 from django.shortcuts import redirect
 from django.utils import timezone
 from github import Github
-from requests import HTTPError
 from requests.auth import HTTPBasicAuth
 from rest_framework import viewsets, mixins
 from rest_framework.decorators import action
@@ -26,10 +24,13 @@ from pycyapi.clients import TerrainClient
 
 import plantit.queries as q
 import plantit.migration as mig
+import plantit.sessions as sessions
+import plantit.querycache as querycache
 from plantit.celery_tasks import start_dirt_migration, Migration
 from plantit.celery_tasks import refresh_user_stats
+from plantit.github import get_profile
 from plantit.keypairs import get_or_create_user_keypair
-from plantit.redis import RedisClient
+from plantit.ratelimit import RateLimited
 from plantit.sns import SnsClient, get_sns_subscription_status
 from plantit.users.models import Profile
 from plantit.users.serializers import UserSerializer
@@ -125,10 +126,10 @@ class IDPViewSet(viewsets.ViewSet):
         user.profile = profile
         profile.save()
         user.save()
+        sessions.record_session(user.username, access_token)
 
         # if user's stats haven't been calculated yet, schedule it
-        redis = RedisClient.get()
-        cached_stats = redis.get(f"stats/{user.username}")
+        cached_stats = querycache.get(f"stats/{user.username}", q.USER_STATISTICS_TTL)
         if cached_stats is None:
             self.logger.info(f"No usage statistics for {user.username}. Scheduling refresh...")
             refresh_user_stats.s(user.username).apply_async()
@@ -267,6 +268,13 @@ class UsersViewSet(viewsets.ModelViewSet, mixins.RetrieveModelMixin):
             migration.uploads = json.dumps({})
             migration.save()
 
+        # sections requiring external calls (CyVerse, GitHub) may be deferred to a follow-up request (see `get_current_sections`)
+        lazy = request.GET.get('lazy', 'false').lower() == 'true'
+        invalidate = request.GET.get('invalidate', 'false').lower() == 'true'
+        sections = [s for s in q.USER_SECTIONS.keys() if not (lazy and s in q.EXTERNAL_USER_SECTIONS)]
+        try: computed = q.get_user_sections(user, sections, invalidate)
+        except q.CyVerseProfileUnavailable as e: return self.__cyverse_logout(request, e.error)
+
         response = {
             'django_profile': {
                 'username': user.username,
@@ -281,63 +289,75 @@ class UsersViewSet(viewsets.ModelViewSet, mixins.RetrieveModelMixin):
                 'first': user.profile.first_login,
             },
             'migration': q.migration_to_dict(migration),
-            'stats': async_to_sync(q.get_user_statistics)(user),
-            'users': q.list_users(),
-            'tasks': q.get_tasks(user, page=1),
-            'delayed_tasks': q.get_delayed_tasks(user),
-            'repeating_tasks': q.get_repeating_tasks(user),
-            'triggered_tasks': q.get_triggered_tasks(user),
-            'notifications': q.get_notifications(user, page=1),
-            'agents': q.get_agents(user),
-            'workflows': {
-                'public': q.list_public_workflows(),
-                'project': q.list_user_project_workflows(user)
-            },
-            'projects': q.get_user_projects(user),
+            **self.__to_response(computed),
         }
-
-        if request.user.profile.cyverse_access_token != '':
-            # if we can't get a profile from CyVerse, log the user out ( sorry :/ )
-            try: response['cyverse_profile'] = q.get_user_cyverse_profile(request.user)
-            except (HTTPError, ValueError) as e:
-                if '403' in str(e) or 'no CyVerse profile' in str(e):
-                    logout(request)
-                    return redirect(
-                        "https://kc.cyverse.org/auth/realms/CyVerse/protocol/openid-connect/logout?redirect_uri=https"
-                        "%3A%2F%2Fkc.cyverse.org%2Fauth%2Frealms%2FCyVerse%2Faccount%2F")
-                else: raise
-
-        profile = Profile.objects.get(user=request.user)
-        if q.has_github_info(profile):
-            try:
-                response['github_profile'] = async_to_sync(q.get_user_github_profile)(user)
-                response['organizations'] = async_to_sync(q.get_user_github_organizations)(user)
-                response['workflows']['user'] = q.list_user_workflows(profile.github_username)
-                response['workflows']['org'] = async_to_sync(q.list_user_org_workflows)(user)
-            except:
-                logger.warning(f"Failed to load Github info for user {request.user.username}: {traceback.format_exc()}")
-                response['github_profile'] = None
-                response['organizations'] = []
-        else:
-            response['github_profile'] = None
-            response['organizations'] = []
+        if lazy: response['deferred'] = q.EXTERNAL_USER_SECTIONS
 
         return JsonResponse(response)
 
+    @action(detail=False, methods=['get'])
+    def get_current_sections(self, request):
+        sections = [s for s in request.GET.get('sections', '').split(',') if s != '']
+        if any(s not in q.USER_SECTIONS for s in sections): return HttpResponseBadRequest()
+
+        invalidate = request.GET.get('invalidate', 'false').lower() == 'true'
+        try: computed = q.get_user_sections(request.user, sections, invalidate)
+        except q.CyVerseProfileUnavailable as e: return self.__cyverse_logout(request, e.error)
+        return JsonResponse(self.__to_response(computed))
+
+    @staticmethod
+    def __to_response(sections: dict) -> dict:
+        response = {k: v for k, v in sections.items() if k not in ['public_workflows', 'project_workflows', 'github']}
+        workflows = dict()
+        if 'public_workflows' in sections: workflows['public'] = sections['public_workflows']
+        if 'project_workflows' in sections: workflows['project'] = sections['project_workflows']
+        if 'github' in sections:
+            github = sections['github']
+            response['github_profile'] = github['github_profile']
+            response['organizations'] = github['organizations']
+            if 'user_workflows' in github: workflows['user'] = github['user_workflows']
+            if 'org_workflows' in github: workflows['org'] = github['org_workflows']
+        if len(workflows) > 0: response['workflows'] = workflows
+        return response
+
+    @staticmethod
+    def __cyverse_logout(request, error):
+        # if we can't get a profile from CyVerse, log the user out ( sorry :/ )
+        if '403' in str(error) or 'no CyVerse profile' in str(error):
+            logout(request)
+            return redirect(
+                "https://kc.cyverse.org/auth/realms/CyVerse/protocol/openid-connect/logout?redirect_uri=https"
+                "%3A%2F%2Fkc.cyverse.org%2Fauth%2Frealms%2FCyVerse%2Faccount%2F")
+        raise error
+
+    @staticmethod
+    def __github_profile(username, token):
+        # goes through the shared client so the request draws on the token's rate limit budget
+        try:
+            return async_to_sync(get_profile)(username, token)
+        except ValueError:
+            logger.warning(f"Failed to retrieve GitHub profile for {username}", exc_info=True)
+            return None
+
     @action(detail=False, methods=['get'])
     def get_by_username(self, request):
+        try:
+            return self.__get_by_username(request)
+        except RateLimited as e:
+            response = HttpResponse('GitHub rate limit exceeded', status=429)
+            response['Retry-After'] = e.retry_after
+            return response
+
+    def __get_by_username(self, request):
         username = request.GET.get('username', None)
 
         # TODO move to configuration file
         if username == 'Computational-Plant-Science' or username == 'van-der-knaap-lab' or username == 'burkelab':
             if request.user.profile.github_token != '':
-                github_response = requests.get(f"https://api.github.com/users/{username}",
-                                               headers={'Authorization':
-                                                            f"Bearer {request.user.profile.github_token}"})
                 return JsonResponse({
                     'django_profile': None,
                     'cyverse_profile': None,
-                    'github_profile': github_response.json()
+                    'github_profile': self.__github_profile(username, request.user.profile.github_token)
                 })
             else:
                 return JsonResponse({
@@ -374,10 +394,7 @@ class UsersViewSet(viewsets.ModelViewSet, mixins.RetrieveModelMixin):
                 else:
                     print(f"No CyVerse profile")
         if request.user.profile.github_token != '' and user.profile.github_username != '':
-            github_response = requests.get(f"https://api.github.com/users/{user.profile.github_username}",
-                                           headers={'Authorization':
-                                                        f"Bearer {request.user.profile.github_token}"})
-            response['github_profile'] = github_response.json()
+            response['github_profile'] = self.__github_profile(user.profile.github_username, request.user.profile.github_token)
         return JsonResponse(response)
 
     @action(detail=False, methods=['get'])
@@ -0,0 +1,93 @@
+import json
+import logging
+from typing import Dict, List
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Q
+
+from plantit import querycache as querycache
+from plantit.redis import RedisClient
+from plantit.tasks.models import Task, TaskStatus
+
+logger = logging.getLogger(__name__)
+
+DIRTY_KEY = 'stats_dirty'
+CONTRIBUTIONS_KEY = 'stats_contributions'  # username -> the user's counts, as of their last refresh
+TOTALS_KEY = 'stats_totals'  # count name -> total over all users
+TOTALS_BUILT = 'stats_totals_built'
+TOTALS_TAG = 'stats_totals'
+
+FINISHED = [TaskStatus.COMPLETED, TaskStatus.FAILURE, TaskStatus.TIMEOUT, TaskStatus.CANCELED]
+
+
+def mark_dirty(*usernames: str):
+    if len(usernames) > 0: RedisClient.get().sadd(DIRTY_KEY, *usernames)
+
+
+def take_dirty() -> List[str]:
+    """
+    Lists (and clears) the users whose statistics need refreshing.
+
+    Returns:
+        The usernames
+    """
+
+    dirty, _ = RedisClient.pipeline().smembers(DIRTY_KEY).delete(DIRTY_KEY).execute()
+    return sorted([username.decode('utf-8') for username in dirty])
+
+
+def count_contribution(user: User) -> Dict[str, int]:
+    return Task.objects.filter(user=user).aggregate(
+        tasks=Count('id'),
+        running=Count('id', filter=~Q(status__in=FINISHED)))
+
+
+def rebuild_totals():
+    contributions = dict()
+    for row in Task.objects.order_by().values('user__username').annotate(tasks=Count('id'), running=Count('id', filter=~Q(status__in=FINISHED))):
+        contributions[row['user__username']] = {'tasks': row['tasks'], 'running': row['running']}
+
+    pipeline = RedisClient.pipeline()
+    pipeline.delete(CONTRIBUTIONS_KEY, TOTALS_KEY)
+    pipeline.hset(TOTALS_KEY, mapping={
+        'tasks': sum([c['tasks'] for c in contributions.values()]),
+        'running': sum([c['running'] for c in contributions.values()])})
+    if len(contributions) > 0: pipeline.hset(CONTRIBUTIONS_KEY, mapping={username: json.dumps(c) for username, c in contributions.items()})
+    pipeline.set(TOTALS_BUILT, 1)
+    pipeline.execute()
+    logger.info(f"Rebuilt statistics totals ({len(contributions)} user(s))")
+
+
+def ensure_totals():
+    if not RedisClient.get().exists(TOTALS_BUILT): rebuild_totals()
+
+
+def apply_contribution(username: str, contribution: Dict[str, int] = None):
+    """
+    Replaces the given user's recorded contribution to the totals, adjusting the totals by the difference.
+
+    Args:
+        username: The user's username
+        contribution: The user's counts (None if they no longer exist)
+    """
+
+    ensure_totals()
+    redis = RedisClient.get()
+    previous = redis.hget(CONTRIBUTIONS_KEY, username)
+    previous = json.loads(previous) if previous is not None else dict()
+    current = contribution if contribution is not None else dict()
+    deltas = {name: current.get(name, 0) - previous.get(name, 0) for name in set(previous.keys()) | set(current.keys())}
+
+    pipeline = redis.pipeline()
+    for name, delta in deltas.items():
+        if delta != 0: pipeline.hincrby(TOTALS_KEY, name, delta)
+    if contribution is not None: pipeline.hset(CONTRIBUTIONS_KEY, username, json.dumps(contribution))
+    else: pipeline.hdel(CONTRIBUTIONS_KEY, username)
+    pipeline.execute()
+
+    if any([delta != 0 for delta in deltas.values()]): querycache.invalidate_tags(TOTALS_TAG)
+
+
+def get_totals() -> Dict[str, int]:
+    ensure_totals()
+    return {name.decode('utf-8'): int(value) for name, value in RedisClient.get().hgetall(TOTALS_KEY).items()}
@@ -0,0 +1,44 @@
+from typing import Tuple
+
+import numpy as np
+
+
+def count_running(
+        starts: np.ndarray,
+        ends: np.ndarray,
+        resolution: int = 600,
+        window_start: int = None,
+        window_end: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Counts how many intervals (e.g., tasks) are running at each tick of an evenly spaced time domain, with a sweep
+    over start (+1) and end (-1) events rather than checking every interval at every tick. An interval counts as
+    running at tick t if it starts at or before t and ends at or after t.
+
+    :param starts: The intervals' start times (UNIX timestamps)
+    :param ends: The intervals' end times (UNIX timestamps)
+    :param resolution: The spacing between ticks, in seconds
+    :param window_start: The first tick (defaults to the earliest start)
+    :param window_end: The time to stop before, exclusive (defaults to the latest end)
+    :return: The ticks and the number of intervals running at each
+    """
+
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+
+    # intervals ending before they start are never running
+    valid = ends >= starts
+    starts, ends = starts[valid], ends[valid]
+    if len(starts) == 0: return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    first = int(starts.min()) if window_start is None else int(window_start)
+    last = int(ends.max()) if window_end is None else int(window_end)
+    ticks = np.arange(first, last, resolution, dtype=np.int64)
+    if len(ticks) == 0: return ticks, np.empty(0, dtype=np.int64)
+
+    # each interval enters at the first tick at or after its start, and leaves at the first tick after its end
+    # (intervals entering before the window count from its first tick, those leaving before it cancel out there)
+    n = len(ticks)
+    enter = np.clip(-((first - starts) // resolution), 0, n)
+    leave = np.clip((ends - first) // resolution + 1, 0, n)
+    events = np.bincount(enter, minlength=n + 1) - np.bincount(leave, minlength=n + 1)
+    return ticks, np.cumsum(events[:n])
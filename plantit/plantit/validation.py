@@ -1,19 +1,20 @@
 import re
-from typing import List
+from typing import Dict, List
 
 from plantit import docker as docker
 from plantit.tokens import TerrainToken
 
 
-def validate_workflow_configuration(config: dict) -> (bool, List[str]):
+def validate_workflow_configuration(config: dict, images: Dict[str, bool] = None) -> (bool, List[str]):
     """
     Verifies that the given configuration is valid.
     Note that this function is IO-bound and makes up to 2 network calls:
-        - checking Docker image availability on Docker Hub
+        - checking Docker image availability on Docker Hub (unless already resolved, see `docker.resolve_images`)
         - making sure Terrain collection or object exists
 
     Args:
         config: The task configuration
+        images: Docker Hub image availability, keyed by image reference (looked up on demand if missing)
 
     Returns: A tuple indicating in the first value whether the configuration is valid, and any errors (in the second value)
 
@@ -39,8 +40,10 @@ def validate_workflow_configuration(config: dict) -> (bool, List[str]):
         errors.append('Attribute \'image\' must be a str')
     else:
         image_owner, image_name, image_tag = docker.parse_image_components(config['image'])
-        if 'docker' in config['image'] and not docker.image_exists(image_name, image_owner, image_tag):
-            errors.append(f"Image '{config['image']}' not found on Docker Hub")
+        if 'docker' in config['image']:
+            if images is not None and config['image'] in images: exists = images[config['image']]
+            else: exists = docker.image_exists(image_name, image_owner, image_tag)
+            if not exists: errors.append(f"Image '{config['image']}' not found on Docker Hub")
 
     # commands (required)
     if 'commands' not in config:
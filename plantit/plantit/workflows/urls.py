@@ -7,6 +7,7 @@ urlpatterns = [
     path(r'u/', views.list_user),
     path(r'o/', views.list_org),
     path(r'p/', views.list_project),
+    path(r'webhook/', views.webhook),
     path(r'<owner>/u/<name>/<branch>/', views.get),
     path(r'<owner>/u/<name>/<branch>/search/', views.search),
     path(r'<owner>/u/<name>/<branch>/refresh/', views.refresh),
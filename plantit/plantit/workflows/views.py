@@ -1,14 +1,21 @@
+import hashlib
+import hmac
 import json
 import logging
 
 from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponseNotFound
+from django.http import JsonResponse, HttpResponseNotFound, HttpResponse, HttpResponseBadRequest
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework.decorators import api_view
 from drf_yasg.utils import swagger_auto_schema
 
 import plantit.queries as q
+from plantit.celery_tasks import refresh_workflow, remove_workflow
 from plantit.github import get_repo, list_repo_branches
+from plantit.ratelimit import RateLimited
 from plantit.users.models import Profile
 
 logger = logging.getLogger(__name__)
@@ -45,13 +52,18 @@ def list_project(request):
 async def get(request, owner, name, branch):
     profile = await sync_to_async(Profile.objects.get)(user=request.user)
     invalidate = request.GET.get('invalidate', False)
-    workflow = await q.get_workflow(
-        owner=owner,
-        name=name,
-        branch=branch,
-        github_token=profile.github_token,
-        cyverse_token=profile.cyverse_access_token,
-        invalidate=bool(invalidate))
+    try:
+        workflow = await q.get_workflow(
+            owner=owner,
+            name=name,
+            branch=branch,
+            github_token=profile.github_token,
+            cyverse_token=profile.cyverse_access_token,
+            invalidate=bool(invalidate))
+    except RateLimited as e:
+        response = HttpResponse('GitHub rate limit exceeded', status=429)
+        response['Retry-After'] = e.retry_after
+        return response
 
     # load the most recent submission config, if one exists
     last = q.get_last_task_config(request.user.username, owner, name, branch)
@@ -88,3 +100,66 @@ async def branches(request, owner, name):
     profile = await q.get_user_django_profile(request.user)
     repo_branches = await list_repo_branches(owner, name, profile.github_token)
     return JsonResponse({'branches': [branch['name'] for branch in repo_branches]})
+
+
+def verify_webhook_signature(request) -> bool:
+    secret = settings.GITHUB_WEBHOOK_SECRET
+    if secret is None or secret == '':
+        logger.warning(f"Received GitHub webhook but no secret is configured, rejecting it")
+        return False
+
+    signature = request.headers.get('X-Hub-Signature-256', '')
+    expected = 'sha256=' + hmac.new(secret.encode('utf-8'), request.body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, expected)
+
+
+@csrf_exempt
+@require_POST
+def webhook(request):
+    if not verify_webhook_signature(request): return HttpResponse('unauthorized', status=401)
+
+    event = request.headers.get('X-GitHub-Event', '')
+    if event == 'ping': return HttpResponse(status=200)
+
+    try:
+        payload = json.loads(request.body)
+        repository = payload['repository']
+        owner = repository['owner']['login']
+        name = repository['name']
+        org = repository['owner'].get('type') == 'Organization'
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest()
+
+    sender = payload.get('sender', {}).get('login', None)
+    logger.info(f"Received GitHub {event} event for {owner}/{name}")
+
+    if event == 'push':
+        ref = payload.get('ref', '')
+        if not ref.startswith('refs/heads/'): return HttpResponse(status=204)
+        branch = ref.replace('refs/heads/', '', 1)
+        if payload.get('deleted', False): remove_workflow.s(owner, name, branch).apply_async()
+        else: refresh_workflow.s(owner, name, branch, org, sender).apply_async()
+    elif event in ('create', 'delete'):
+        if payload.get('ref_type', None) != 'branch': return HttpResponse(status=204)
+        branch = payload['ref']
+        if event == 'delete': remove_workflow.s(owner, name, branch).apply_async()
+        else: refresh_workflow.s(owner, name, branch, org, sender).apply_async()
+    elif event == 'repository':
+        action = payload.get('action', None)
+        if action in ('deleted', 'archived'):
+            remove_workflow.s(owner, name).apply_async()
+        elif action == 'renamed':
+            old_name = payload.get('changes', {}).get('repository', {}).get('name', {}).get('from', None)
+            if old_name is not None: remove_workflow.s(owner, old_name).apply_async()
+            refresh_workflow.s(owner, name, None, org, sender).apply_async()
+        elif action == 'transferred':
+            old_owner = payload.get('changes', {}).get('owner', {}).get('from', {})
+            old_owner = old_owner.get('user', old_owner.get('organization', {})).get('login', None)
+            if old_owner is not None: remove_workflow.s(old_owner, name).apply_async()
+            refresh_workflow.s(owner, name, None, org, sender).apply_async()
+        else:
+            refresh_workflow.s(owner, name, None, org, sender).apply_async()
+    else:
+        return HttpResponse(status=204)
+
+    return HttpResponse(status=202)